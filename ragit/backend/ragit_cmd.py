@@ -4,9 +4,6 @@ import cmd
 import dataclasses
 import functools
 
-
-import nest_asyncio
-
 import ragit.libs.common as common
 import ragit.libs.dbutil as dbutil
 import ragit.libs.rag_mgr as rag_mgr
@@ -16,6 +13,8 @@ l (list): List all available collections.
 s (stats) <name>: Print its stats for the pass in collection.
 p (process): Process the data the passed in collection.
 m (create_markdowns): Creates missing markdowns.
+r (recall) <name>: Print the recall@10 of its (quantized) vector db.
+b (rebuild) <name>: Rebuild its vector db into a new version and switch to it.
 h (help): Prints this help message.
 e (exit): Exit.
 """
@@ -104,6 +103,48 @@ class RAGCollectionTracker(cmd.Cmd):
             count = ragger.update_vector_db(db, verbose=True)
             print(f"Inserted {count} chunks to the vector db.")
 
+    @catch_exceptions
+    def do_recall(self, collection_name):
+        """Shows the recall of the vector db of the passed in collection.
+
+        :param str collection_name: The collection name to use.
+        """
+        ragger = rag_mgr.RagManager(collection_name)
+        recall = ragger.get_vector_db_recall()
+        for field in dataclasses.fields(recall):
+            field_name = field.name
+            field_value = getattr(recall, field_name)
+            name = f"{field_name.replace('_', ' ').ljust(25, '.')}"
+            print(f"{name}: {field_value}")
+
+    def do_r(self, arg):
+        """Alias to the recall command.
+
+        :param str arg: The collection name to use.
+        """
+        self.do_recall(arg)
+
+    @catch_exceptions
+    def do_rebuild(self, collection_name):
+        """Rebuilds the vector db of the passed in collection.
+
+        :param str collection_name: The collection name to use.
+        """
+        conn_str = common.make_local_connection_string(collection_name)
+        dbutil.SimpleSQL.register_connection_string(conn_str)
+        ragger = rag_mgr.RagManager(collection_name)
+
+        with dbutil.SimpleSQL() as db:
+            count = ragger.rebuild_vector_db(db, verbose=True)
+            print(f"Rebuilt the vector db with {count} chunks.")
+
+    def do_b(self, arg):
+        """Alias to the rebuild command.
+
+        :param str arg: The collection name to use.
+        """
+        self.do_rebuild(arg)
+
     @catch_exceptions
     def do_create_markdowns(self, collection_name):
         """Creates the missing markdowns.
@@ -180,6 +221,5 @@ class RAGCollectionTracker(cmd.Cmd):
 
 
 if __name__ == '__main__':
-    nest_asyncio.apply()  # Needed for llama_parse
     common.init_settings()
     RAGCollectionTracker().cmdloop()
@@ -19,9 +19,11 @@ collection_name (str):
     only providing the chatbox interface.
 """
 
+import contextlib
 import dataclasses
 import datetime
 import functools
+import json
 import logging
 import os
 import sys
@@ -35,7 +37,9 @@ import markdown
 
 import ragit.libs.common as common
 import ragit.libs.dbutil as dbutil
+import ragit.libs.executor_pools as executor_pools
 import ragit.libs.rag_mgr as rag_mgr
+import ragit.libs.rag_registry as rag_registry
 import ragit.libs.user_registry as user_registry
 
 _JINJA_ENV = jinja2.Environment(
@@ -56,6 +60,7 @@ logger = logging.getLogger(_CONFIGURATION.settings["web_service"]["name"])
 
 # Aliases.
 UserRegistry = user_registry.UserRegistry
+PoolType = executor_pools.PoolType
 
 
 class AuthenticationError(Exception):
@@ -70,6 +75,9 @@ class Globals:
     once when the service is starting and remains in memory for the rest of
     the lifespan of the program.
 
+    :cvar: RagRegistry rag_registry: Opens the other collections queried by
+    the collection scoped routes (/collections/{collection}/...) on demand.
+
     :cvar: str _secret_key:  The secret key that is used for authentication.
 
     :cvar: bool is_admin: True if the user is an admin; in this case he will
@@ -77,6 +85,7 @@ class Globals:
     the document file storage.
     """
     rag_manager = None
+    rag_registry = None
     _secret_key = str(uuid.uuid4())
     is_admin = False
 
@@ -163,6 +172,79 @@ def _raw_headers_to_dict(raw_headers):
     return d
 
 
+def _read_text(file_path):
+    """Returns the text of the passed in file.
+
+    :param str file_path: The full path to the file.
+
+    :return: The text of the file.
+    :rtype: str
+    """
+    with open(file_path) as fin:
+        return fin.read()
+
+
+def _format_sse(event, data):
+    """Formats a server sent event.
+
+    :param str event: The name of the event.
+    :param dict data: The data of the event (sent as json).
+
+    :return: The encoded event.
+    :rtype: bytes
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@contextlib.asynccontextmanager
+async def _use_rag_manager(request):
+    """Uses the RagManager of the collection of a request.
+
+    :param request: The web request; the collection scoped routes hold the
+    name of the collection, the rest use the collection of the service.
+
+    :yield: The RagManager of the collection.
+
+    :raises: KeyError
+    """
+    name = request.match_info.get("collection")
+    if not name or name == Globals.rag_manager.get_rag_collection_name():
+        yield Globals.rag_manager
+    else:
+        async with Globals.rag_registry.use(name) as manager:
+            yield manager
+
+
+async def _get_collection_name(request):
+    """Returns the name of the collection of a request.
+
+    :param request: The web request; the collection scoped routes hold the
+    name of the collection, the rest use the collection of the service.
+
+    :return: The name of the collection.
+    :rtype: str
+
+    :raises: KeyError
+    """
+    default_name = Globals.rag_manager.get_rag_collection_name()
+    name = request.match_info.get("collection") or default_name
+    if name != default_name and \
+            name not in await Globals.rag_registry.get_names():
+        raise KeyError(f"There is no RAG collection {name}.")
+    return name
+
+
+def _make_not_found_response(ex):
+    """Returns the response to a request for an unknown collection.
+
+    :param KeyError ex: The error naming the unknown collection.
+
+    :return: The 404 response holding the message of the error.
+    :rtype: web.Response
+    """
+    return web.json_response({"error": ex.args[0]}, status=404)
+
+
 def web_handler(handler_func):
     """Wraps a handler function adding standard processing."""
 
@@ -269,12 +351,19 @@ class RagitHandler:
                     "documents",
                     part.filename
                 )
-                with open(fullpath, 'wb') as fout:
+                fout = await executor_pools.run(
+                    PoolType.DATABASE, open, fullpath, 'wb'
+                )
+                try:
                     while True:
                         chunk = await part.read_chunk()
                         if not chunk:
                             break
-                        fout.write(chunk)
+                        await executor_pools.run(
+                            PoolType.DATABASE, fout.write, chunk
+                        )
+                finally:
+                    await executor_pools.run(PoolType.DATABASE, fout.close)
 
         raise web.HTTPFound(location="/admin")
 
@@ -297,7 +386,9 @@ class RagitHandler:
                 host=request.host,
                 collection_name=collection_name,
                 page_name="ADMIN",
-                data=get_metrics(),
+                data=await executor_pools.run(
+                    PoolType.DATABASE, get_metrics
+                ),
                 is_admin=Globals.is_admin
             )
             response = web.Response(
@@ -365,14 +456,24 @@ class RagitHandler:
 
     @web_handler
     async def get_all_queries(self, request):
-        """Returns all the available queries as a json document."""
+        """Returns all the available queries as a json document.
+
+        :param request: The web request; the collection scoped route returns
+        the queries answered by its collection.
+        """
         try:
             auth_token = request.cookies.get('ragit_auth_token')
             user_name = request.cookies.get('user_name')
             Globals.validate_token(auth_token, user_name)
         except AuthenticationError:
             return web.HTTPFound('/login')
-        all_queries = UserRegistry.get_all_queries()
+        try:
+            collection = await _get_collection_name(request)
+        except KeyError as ex:
+            return _make_not_found_response(ex)
+        all_queries = await executor_pools.run(
+            PoolType.DATABASE, UserRegistry.get_all_queries, collection
+        )
         return web.json_response(all_queries)
 
     @web_handler
@@ -381,6 +482,9 @@ class RagitHandler:
 
         Used to load the chatbox with the last conversations that were
         asked; meant to be called every time the use re-visits the chatbox.
+
+        :param request: The web request; the collection scoped route returns
+        the chats answered by its collection.
         """
         try:
             auth_token = request.cookies.get('ragit_auth_token')
@@ -389,8 +493,15 @@ class RagitHandler:
         except AuthenticationError:
             return web.HTTPFound('/login')
 
+        try:
+            collection = await _get_collection_name(request)
+        except KeyError as ex:
+            return _make_not_found_response(ex)
         count = int(request.match_info['count'])
-        recent_chats = UserRegistry.get_recent_chats(user_name, count)
+        recent_chats = await executor_pools.run(
+            PoolType.DATABASE, UserRegistry.get_recent_chats, user_name,
+            count, collection
+        )
         return web.json_response(recent_chats)
 
     @web_handler
@@ -401,7 +512,10 @@ class RagitHandler:
             query_requests = query_requests[1:]
         tokens = query_requests.split("/")[1:]
         msg_id = tokens[-1]
-        file_path = UserRegistry.get_path_to_audio_recoding(msg_id)
+        # Creating the recording calls the remote text to speech service.
+        file_path = await executor_pools.run(
+            PoolType.QUERY, UserRegistry.get_path_to_audio_recoding, msg_id
+        )
         return web.FileResponse(path=file_path, headers={
             'Content-Type': 'audio/mpeg',
         })
@@ -418,7 +532,9 @@ class RagitHandler:
 
         try:
             msg_id = int(request.match_info['msg_id'])
-            UserRegistry.delete_query(msg_id)
+            await executor_pools.run(
+                PoolType.DATABASE, UserRegistry.delete_query, msg_id
+            )
         except:
             return web.json_response(
                 {'message': 'Operation Failed'}, status=404
@@ -438,6 +554,10 @@ class RagitHandler:
             Globals.validate_token(auth_token, user_name)
         except AuthenticationError:
             return web.HTTPFound('/login')
+        try:
+            await _get_collection_name(request)
+        except KeyError as ex:
+            return _make_not_found_response(ex)
         try:
             data = await request.json()
             query = data.get('query')
@@ -445,6 +565,8 @@ class RagitHandler:
             temperature = data.get("temperature")
             max_tokens = data.get("max_tokens")
             matches_count = data.get("matches_count")
+            filters = data.get("filters")
+            format_code = data.get("format_code", True) is not False
 
             if temperature:
                 temperature = float(temperature)
@@ -456,17 +578,23 @@ class RagitHandler:
                 matches_count = int(matches_count)
 
             t1 = datetime.datetime.now()
-            response = Globals.rag_manager.query(
-                query,
-                k=matches_count,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
+            async with _use_rag_manager(request) as manager:
+                response = await manager.query_async(
+                    query,
+                    k=matches_count,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    filters=filters,
+                    format_code=format_code
+                )
+                collection = manager.get_rag_collection_name()
 
             t2 = datetime.datetime.now()
 
-            msg_id = UserRegistry.insert_message(
-                user_name, t1, query, response, t2
+            # Recorded along with the collection that answered it.
+            msg_id = await executor_pools.run(
+                PoolType.DATABASE, UserRegistry.insert_message,
+                user_name, t1, query, response, t2, collection
             )
             return web.json_response(
                 {
@@ -477,6 +605,187 @@ class RagitHandler:
         except Exception as ex:
             return web.json_response({"response": str(ex)})
 
+    @web_handler
+    async def stream_query_handler(self, request):
+        """Streams the answer to a query submitted by the chatbot user.
+
+        The answer is sent as server sent events: a token event holding the
+        text of each generated part, then a done event holding the complete
+        response and its message id (the message is saved to the registry
+        when the answer completes) or an error event.
+
+        :param request: The web request.
+        """
+        try:
+            auth_token = request.cookies.get('ragit_auth_token')
+            user_name = request.cookies.get('user_name')
+            Globals.validate_token(auth_token, user_name)
+        except AuthenticationError:
+            return web.HTTPFound('/login')
+
+        # Checked before the events start as the status can not change then.
+        try:
+            await _get_collection_name(request)
+        except KeyError as ex:
+            return _make_not_found_response(ex)
+
+        data = await request.json()
+        query = data.get('query')
+        temperature = data.get("temperature")
+        max_tokens = data.get("max_tokens")
+        matches_count = data.get("matches_count")
+        filters = data.get("filters")
+        format_code = data.get("format_code", True) is not False
+
+        if temperature:
+            temperature = float(temperature)
+
+        if max_tokens:
+            max_tokens = int(max_tokens)
+
+        if matches_count:
+            matches_count = int(matches_count)
+
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                # Disables the buffering of a reverse proxy (nginx).
+                "X-Accel-Buffering": "no",
+            }
+        )
+        await response.prepare(request)
+
+        try:
+            t1 = datetime.datetime.now()
+            async with _use_rag_manager(request) as manager:
+                await self._stream_answer(
+                    response, manager, user_name, t1, query,
+                    k=matches_count,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    filters=filters,
+                    format_code=format_code
+                )
+        except ConnectionResetError:
+            logger.info("The client disconnected from the answer stream.")
+            return response
+        except KeyError as ex:
+            # The collection was removed after the check.
+            await response.write(
+                _format_sse("error", {"response": ex.args[0]})
+            )
+        except Exception as ex:
+            logger.exception(ex)
+            await response.write(_format_sse("error", {"response": str(ex)}))
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    async def _stream_answer(response, manager, user_name, received_at,
+                             query, **kwargs):
+        """Writes the events of the answer to a query.
+
+        :param web.StreamResponse response: The response to write to.
+        :param RagManager manager: The manager of the collection to query.
+        :param str user_name: The user asking.
+        :param datetime.datetime received_at: When the query was received.
+        :param str query: The question.
+        :param kwargs: The settings of the query (see stream_query_async).
+        """
+        stream = manager.stream_query_async(query, **kwargs)
+        async for part in stream:
+            if isinstance(part, str):
+                await response.write(_format_sse("token", {"text": part}))
+                continue
+            responded_at = datetime.datetime.now()
+            msg_id = await executor_pools.run(
+                PoolType.DATABASE, UserRegistry.insert_message,
+                user_name, received_at, query, part, responded_at,
+                manager.get_rag_collection_name()
+            )
+            await response.write(
+                _format_sse(
+                    "done",
+                    {"response": part.response, "message_id": msg_id}
+                )
+            )
+
+    @web_handler
+    async def collections_handler(self, request):
+        """Returns the available and the open collections."""
+        try:
+            auth_token = request.cookies.get('ragit_auth_token')
+            user_name = request.cookies.get('user_name')
+            Globals.validate_token(auth_token, user_name)
+        except AuthenticationError:
+            return web.HTTPFound('/login')
+        return web.json_response(
+            {
+                "default": Globals.rag_manager.get_rag_collection_name(),
+                "collections": await Globals.rag_registry.get_names(),
+                "open": [
+                    dataclasses.asdict(m)
+                    for m in Globals.rag_registry.get_metrics()
+                ],
+            }
+        )
+
+    @web_handler
+    async def executors_handler(self, request):
+        """Returns the load of the pools running the blocking work."""
+        try:
+            auth_token = request.cookies.get('ragit_auth_token')
+            user_name = request.cookies.get('user_name')
+            Globals.validate_token(auth_token, user_name)
+        except AuthenticationError:
+            return web.HTTPFound('/login')
+        return web.json_response(
+            [dataclasses.asdict(m) for m in executor_pools.get_metrics()]
+        )
+
+    @web_handler
+    async def semantic_cache_handler(self, request):
+        """Returns the usage of the semantic cache of the answers.
+
+        :param request: The web request; the collection scoped route reports
+        the cache of its collection.
+        """
+        try:
+            auth_token = request.cookies.get('ragit_auth_token')
+            user_name = request.cookies.get('user_name')
+            Globals.validate_token(auth_token, user_name)
+        except AuthenticationError:
+            return web.HTTPFound('/login')
+        try:
+            async with _use_rag_manager(request) as manager:
+                metrics = manager.get_semantic_cache_metrics()
+        except KeyError as ex:
+            return _make_not_found_response(ex)
+        return web.json_response(
+            dataclasses.asdict(metrics) if metrics else {}
+        )
+
+    @web_handler
+    async def single_flight_handler(self, request):
+        """Returns the coalescing of the concurrent identical queries.
+
+        :param request: The web request; the collection scoped route reports
+        the queries of its collection.
+        """
+        try:
+            auth_token = request.cookies.get('ragit_auth_token')
+            user_name = request.cookies.get('user_name')
+            Globals.validate_token(auth_token, user_name)
+        except AuthenticationError:
+            return web.HTTPFound('/login')
+        try:
+            async with _use_rag_manager(request) as manager:
+                metrics = manager.get_single_flight_metrics()
+        except KeyError as ex:
+            return _make_not_found_response(ex)
+        return web.json_response(dataclasses.asdict(metrics))
+
     @web_handler
     async def default_handler(self, request):
         """Redirects to login."""
@@ -514,16 +823,20 @@ class RagitHandler:
                 'Content-Type': 'application/pdf',
             })
         elif file_path.endswith(".md"):
-            with open(file_path) as fin:
-                txt = fin.read()
-            md_text = markdown.markdown(txt)
+            txt = await executor_pools.run(
+                PoolType.DATABASE, _read_text, file_path
+            )
+            md_text = await executor_pools.run(
+                PoolType.CPU, markdown.markdown, txt
+            )
             return web.Response(
                 body=md_text,
                 content_type='text/html'
             )
         else:
-            with open(file_path) as fin:
-                txt = fin.read()
+            txt = await executor_pools.run(
+                PoolType.DATABASE, _read_text, file_path
+            )
             return web.Response(text=txt)
 
     @web_handler
@@ -560,7 +873,8 @@ class RagitHandler:
             thumps_up = data.get('thumps_up')
             desired_response = data.get('desired_response')
 
-            UserRegistry.update_user_reaction(
+            await executor_pools.run(
+                PoolType.DATABASE, UserRegistry.update_user_reaction,
                 message_id, thumps_up, desired_response
             )
 
@@ -590,9 +904,14 @@ class RagitHandler:
             vote = data.get('vote')
 
             if vote == 1:
-                UserRegistry.set_thumps_up(message_id)
+                await executor_pools.run(
+                    PoolType.DATABASE, UserRegistry.set_thumps_up, message_id
+                )
             elif vote == 0:
-                UserRegistry.set_thumps_down(message_id)
+                await executor_pools.run(
+                    PoolType.DATABASE, UserRegistry.set_thumps_down,
+                    message_id
+                )
 
             return web.json_response(
                 {
@@ -613,7 +932,11 @@ class RagitHandler:
         password = data.get("password")
         email = data.get("email")
         try:
-            UserRegistry.add_new_user(user_name, email, password)
+            # Hashing the password is CPU bound.
+            await executor_pools.run(
+                PoolType.CPU, UserRegistry.add_new_user,
+                user_name, email, password
+            )
 
         except common.MyGenAIException:
             return web.HTTPFound('/login')
@@ -653,7 +976,10 @@ class RagitHandler:
         password = data.get("password")
 
         try:
-            UserRegistry.validate_password(user_name, password)
+            await executor_pools.run(
+                PoolType.CPU, UserRegistry.validate_password,
+                user_name, password
+            )
             response = aiohttp.web.HTTPFound('/ragit')
             auth_token = Globals.generate_token(user_name)
             response.set_cookie('ragit_auth_token', auth_token)
@@ -696,18 +1022,47 @@ def initialize():
     print(f"Loading vector db, using collection {collection_name}")
     logger.info(f"Loading vector db, using collection {collection_name}")
 
-    Globals.rag_manager = rag_mgr.RagManager(collection_name)
-    response = Globals.rag_manager.query("what is this about?")
-    logger.info("Loading vector db done.. %s", response)
+    Globals.rag_registry = rag_registry.RagRegistry()
+    # The front end serves only async queries, as the registry collections.
+    Globals.rag_manager = rag_mgr.RagManager(
+        collection_name,
+        async_only=True,
+        async_client=Globals.rag_registry.get_async_client()
+    )
+    logger.info("Loading vector db done.")
 
     UserRegistry.set_rag_collection_name(collection_name)
     UserRegistry.create_db_if_needed()
 
 
+async def _warm_up(app):
+    """Prepares the queries when the service starts.
+
+    The vector db is loaded and the connection to the LLM is opened without
+    querying it, so the start up is fast, free and does not depend on the
+    LLM being available.
+
+    :param web.Application app: The starting application.
+    """
+    await Globals.rag_manager.warm_up_async()
+    logger.info("Warming up done.")
+
+
+async def _close_collections(app):
+    """Closes the collections when the service stops.
+
+    :param web.Application app: The stopping application.
+    """
+    await Globals.rag_manager.close_async()
+    await Globals.rag_registry.close()
+
+
 def run():
     """Runs the backend service."""
     initialize()
     app = web.Application()
+    app.on_startup.append(_warm_up)
+    app.on_cleanup.append(_close_collections)
     ragit_handler = RagitHandler()
     ragit_light_handler = RagitLightHandler()
 
@@ -718,6 +1073,12 @@ def run():
             web.post('/login', ragit_handler.login_validate),
             web.get('/ragit', ragit_handler.main_page_handler),
             web.post('/ragit', ragit_handler.query_handler),
+            web.post('/ragit/stream', ragit_handler.stream_query_handler),
+            web.post('/collections/{collection}/ragit',
+                     ragit_handler.query_handler),
+            web.post('/collections/{collection}/ragit/stream',
+                     ragit_handler.stream_query_handler),
+            web.get('/collections', ragit_handler.collections_handler),
             web.get('/signup', ragit_handler.signup_screen),
             web.post('/signup', ragit_handler.signup_new_acount),
             web.post('/vote', ragit_handler.vote),
@@ -730,9 +1091,20 @@ def run():
             web.get('/speechify/{file_path:.*}',
                     ragit_handler.speechify_handler),
             web.get('/recentchats/{count}', ragit_handler.recent_chats_handler),
+            web.get('/collections/{collection}/queries',
+                    ragit_handler.get_all_queries),
+            web.get('/collections/{collection}/recentchats/{count}',
+                    ragit_handler.recent_chats_handler),
             web.put('/updateuserinteraction',
                     ragit_handler.update_user_reaction),
             web.get('/light', ragit_light_handler.main_page_handler),
+            web.get('/executors', ragit_handler.executors_handler),
+            web.get('/semanticcache', ragit_handler.semantic_cache_handler),
+            web.get('/singleflight', ragit_handler.single_flight_handler),
+            web.get('/collections/{collection}/semanticcache',
+                    ragit_handler.semantic_cache_handler),
+            web.get('/collections/{collection}/singleflight',
+                    ragit_handler.single_flight_handler),
         ]
     )
 
@@ -12,10 +12,12 @@ let conversationHistory = [];
 /**
  * Fetches the server's response by sending the user's query.
  *
- * This function triggers an AJAX POST request to the "/ragit" endpoint,
- * sending the user's query and other related parameters. On a successful
- * response, it updates the conversation history and clears the query input. If
- * an error occurs, an alert displays the error message.
+ * This function sends the user's query and other related parameters to the
+ * "/ragit/stream" endpoint and shows the answer while it is generated from
+ * the server sent events of the response; once the answer is completed it
+ * updates the conversation history with the final answer and its message id
+ * and clears the query input. If an error occurs, an alert displays the
+ * error message.
  *
  */
 function make_query() {
@@ -40,40 +42,90 @@ function make_query() {
         matches_count = matches_count_element.value;
     }
 
+    const item = {
+        question: userQuery,
+        answer: "",
+        message_id: null,
+        vote: null
+    };
+    conversationHistory.push(item);
+    update_history_list();
+
     document.body.style.cursor = 'wait';
-    $.ajax({
-        url: "/ragit",
-        type: "POST",
-        data: JSON.stringify(
+    fetch("/ragit/stream", {
+        method: "POST",
+        headers: {"Content-Type": "application/json; charset=utf-8"},
+        body: JSON.stringify(
             {
                 query: userQuery,
                 temperature: temperature,
                 max_tokens: max_tokens,
                 matches_count: matches_count
             }
-        ),
-        dataType: "json",
-        contentType: "application/json; charset=utf-8",
-        success: function (response, status) {
-            conversationHistory.push(
-                {
-                    question: userQuery,
-                    answer: response.response,
-                    message_id: response.message_id,
-                    vote: null
+        )
+    }).then(async function (response) {
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            let separator;
+            while ((separator = buffer.indexOf("\n\n")) >= 0) {
+                const event = parse_server_sent_event(
+                    buffer.slice(0, separator)
+                );
+                buffer = buffer.slice(separator + 2);
+                if (event.name === "token") {
+                    item.answer += event.data.text;
+                    update_history_list();
+                } else if (event.name === "done") {
+                    item.answer = event.data.response;
+                    item.message_id = event.data.message_id;
+                    update_history_list();
+                    document.getElementById("userQuery").value = "";
+                } else if (event.name === "error") {
+                    throw new Error(event.data.response);
                 }
-            );
-            update_history_list();
-            document.getElementById("userQuery").value = "";
-            document.body.style.cursor = 'default';
-        },
-        error: function (request, status, error) {
-            document.body.style.cursor = 'default';
-            alert(request.responseText);
+            }
         }
+        document.body.style.cursor = 'default';
+    }).catch(function (error) {
+        document.body.style.cursor = 'default';
+        conversationHistory = conversationHistory.filter(
+            chat => chat !== item
+        );
+        update_history_list();
+        alert(error.message);
     });
 }
 
+/**
+ * Parses a server sent event.
+ *
+ * @param {string} text - The lines of the event.
+ *
+ * @returns {Object} The name of the event and its (json) data.
+ */
+function parse_server_sent_event(text) {
+    let name = "message";
+    let data = "";
+    for (const line of text.split("\n")) {
+        if (line.startsWith("event:")) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+            data += line.slice(5).trim();
+        }
+    }
+    return {name: name, data: data ? JSON.parse(data) : null};
+}
+
 function load_recent_chats() {
     document.body.style.cursor = 'wait';
     $.ajax({
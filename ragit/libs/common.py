@@ -21,6 +21,8 @@ class VectorDbProviderEnum(enum.Enum):
 
     MILVUS = 1
     CHROMA = 2
+    FAISS = 3
+    NUMPY = 4
 
 
 def make_local_connection_string(db_name=None):
@@ -174,6 +176,10 @@ def get_vector_db_provider():
         return VectorDbProviderEnum.MILVUS
     elif vector_db_provider == "CHROMA":
         return VectorDbProviderEnum.CHROMA
+    elif vector_db_provider == "FAISS":
+        return VectorDbProviderEnum.FAISS
+    elif vector_db_provider == "NUMPY":
+        return VectorDbProviderEnum.NUMPY
     else:
         raise ValueError(
             "VECTOR_DB_PROVIDER is not valid. You need to either place it "
@@ -183,6 +189,32 @@ def get_vector_db_provider():
         )
 
 
+def get_positive_number(name, default, number_type=int):
+    """Returns the positive number of an environment variable.
+
+    :param str name: The name of the environment variable.
+    :param default: The value to use if the variable is not set.
+    :param type number_type: The type of the number (int or float).
+
+    :return: The number.
+
+    :raises: ValueError
+    """
+    value = (os.environ.get(name) or "").strip()
+    if not value:
+        return default
+    try:
+        number = number_type(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        kind = "integer" if number_type is int else "number"
+        raise ValueError(
+            f"{name} is not valid: {value}. It must be a positive {kind}."
+        )
+    return number
+
+
 def get_testing_data_directory():
     """Returns the directory holding the data files to use for samples.
 
@@ -247,6 +279,29 @@ def create_directory_if_not_exists(fullpath):
         os.makedirs(fullpath)
 
 
+def get_disk_size(fullpath):
+    """Returns the bytes of a file or of all the files under a directory.
+
+    :param str fullpath: The full path to the file or directory.
+
+    :return: The size or 0 if the path does not exist.
+    :rtype: int
+    """
+    if not fullpath:
+        return 0
+    if os.path.isfile(fullpath):
+        return os.path.getsize(fullpath)
+    total = 0
+    for dirpath, _, filenames in os.walk(fullpath):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                # Removed while walking.
+                pass
+    return total
+
+
 def running_inside_docker_container():
     """Checks if the application is running insider docker.
 
@@ -266,5 +321,7 @@ _SHARED_DIR = "ragit-data"
 # of the supported providers.
 _SUPPORTED_VECTOR_DB_PROVIDERS = [
     "MILVUS",
-    "CHROME"
+    "CHROMA",
+    "FAISS",
+    "NUMPY"
 ]
@@ -0,0 +1,241 @@
+"""Runs the blocking work of the async front end in bounded thread pools.
+
+The blocking calls of the aiohttp handlers are split to separate pools by
+the kind of the work so a slow call of one kind cannot starve the others:
+
+- QUERY: Calls to remote services (like the LLM or the text to speech).
+- DATABASE: Calls to the user registry (sqlite), the postgres database and
+  the stored documents.
+- CPU: CPU bound work like password hashing and markdown rendering.
+
+The number of threads of each pool is bounded (and can be set by the
+<POOL>_POOL_SIZE environment variable, for example DATABASE_POOL_SIZE); the
+calls waiting for a thread are queued and counted in the metrics of the
+pool.
+"""
+
+import asyncio
+import concurrent.futures
+import dataclasses
+import enum
+import functools
+import logging
+import os
+import threading
+
+import ragit.libs.common as common
+
+# Aliases.
+logger = logging.getLogger(__name__)
+
+
+class PoolType(enum.Enum):
+    """Enumerates the kinds of the blocking work."""
+
+    QUERY = 1
+    DATABASE = 2
+    CPU = 3
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolMetrics:
+    """Represents the load of a pool.
+
+    str name: The name of the pool.
+    int size: The maximum number of threads.
+    int active: The number of calls running.
+    int queued: The number of calls waiting for a thread.
+    int completed: The number of completed calls.
+    """
+
+    name: str
+    size: int
+    active: int
+    queued: int
+    completed: int
+
+
+def get_pool_size(pool_type):
+    """Returns the number of threads of the passed in pool.
+
+    :param PoolType pool_type: The pool.
+
+    :return: The value of the <POOL>_POOL_SIZE environment variable or the
+    default size of the pool.
+    :rtype: int
+
+    :raises: ValueError
+    """
+    return common.get_positive_number(
+        f"{pool_type.name}_POOL_SIZE", _DEFAULT_POOL_SIZES[pool_type]
+    )
+
+
+async def run(pool_type, func, *args, **kwargs):
+    """Runs the passed in function in a pool without blocking the event loop.
+
+    :param PoolType pool_type: The pool to use.
+    :param callable func: The blocking function to run.
+
+    :return: The value returned by the function.
+
+    :raises: Whatever the function raises.
+    """
+    return await _Pools.get(pool_type).run(func, *args, **kwargs)
+
+
+def get_metrics():
+    """Returns the load of the pools that were used.
+
+    :return: The metrics of each pool.
+    :rtype: list[PoolMetrics]
+    """
+    return _Pools.get_metrics()
+
+
+def shutdown():
+    """Waits for the running calls and releases the threads of all pools."""
+    _Pools.shutdown()
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The threads of each pool unless set by the environment.
+_DEFAULT_POOL_SIZES = {
+    PoolType.QUERY: 16,
+    PoolType.DATABASE: 4,
+    PoolType.CPU: os.cpu_count() or 2,
+}
+
+
+class _BoundedPool:
+    """A thread pool counting its running and queued calls.
+
+    :ivar str _name: The name of the pool.
+    :ivar int _size: The maximum number of threads.
+    :ivar concurrent.futures.ThreadPoolExecutor _executor: The threads.
+    :ivar threading.Lock _lock: Guards the counters.
+    :ivar int _submitted: The number of submitted calls.
+    :ivar int _started: The number of started calls.
+    :ivar int _completed: The number of completed calls.
+    """
+
+    def __init__(self, name, size):
+        """Initializer.
+
+        :param str name: The name of the pool.
+        :param int size: The maximum number of threads.
+        """
+        self._name = name
+        self._size = size
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix=f"{name.lower()}-pool"
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+
+    async def run(self, func, *args, **kwargs):
+        """Runs the passed in function in a thread of the pool.
+
+        :param callable func: The blocking function to run.
+
+        :return: The value returned by the function.
+        """
+        with self._lock:
+            self._submitted += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            self._call,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def _call(self, func):
+        """Runs the passed in function counting it.
+
+        :param callable func: The function to run.
+
+        :return: The value returned by the function.
+        """
+        with self._lock:
+            self._started += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._completed += 1
+
+    def get_metrics(self):
+        """Returns the load of the pool.
+
+        :rtype: PoolMetrics
+        """
+        with self._lock:
+            return PoolMetrics(
+                name=self._name,
+                size=self._size,
+                active=self._started - self._completed,
+                queued=self._submitted - self._started,
+                completed=self._completed
+            )
+
+    def shutdown(self):
+        """Waits for the running calls and releases the threads."""
+        self._executor.shutdown(wait=True)
+
+
+class _Pools:
+    """Holds the pools, creating each one when first used.
+
+    :cvar dict[PoolType, _BoundedPool] _pools: The created pools.
+    :cvar threading.Lock _lock: Guards the creation of the pools.
+    """
+
+    _pools = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, pool_type):
+        """Returns the pool for the passed in kind of work.
+
+        :param PoolType pool_type: The kind of the work.
+
+        :rtype: _BoundedPool
+
+        :raises: ValueError
+        """
+        pool = cls._pools.get(pool_type)
+        if pool is None:
+            with cls._lock:
+                pool = cls._pools.get(pool_type)
+                if pool is None:
+                    size = get_pool_size(pool_type)
+                    pool = _BoundedPool(pool_type.name, size)
+                    cls._pools[pool_type] = pool
+                    logger.info(
+                        "Created the %s pool of %d threads.",
+                        pool_type.name, size
+                    )
+        return pool
+
+    @classmethod
+    def get_metrics(cls):
+        """Returns the load of the created pools.
+
+        :rtype: list[PoolMetrics]
+        """
+        with cls._lock:
+            pools = list(cls._pools.values())
+        return [pool.get_metrics() for pool in pools]
+
+    @classmethod
+    def shutdown(cls):
+        """Shuts down all the created pools."""
+        with cls._lock:
+            pools = list(cls._pools.values())
+            cls._pools = {}
+        for pool in pools:
+            pool.shutdown()
@@ -1,5 +1,7 @@
 """Document Manager (Manages the document storage)."""
 
+import collections
+import concurrent.futures
 import datetime
 import json
 import os
@@ -8,6 +10,7 @@ import re
 import ragit.libs.common as common
 import ragit.libs.sanitizer as sanitizer
 import ragit.libs.dbutil as dbutil
+import ragit.libs.impl.doc_catalog as doc_catalog
 import ragit.libs.impl.embeddings_retriever as embeddings_retriever
 import ragit.libs.impl.splitter as splitter
 import ragit.libs.impl.embeddings_info as embeddings_info
@@ -156,6 +159,21 @@ def get_chunk_ids_to_insert_to_vector_db(db):
         yield row[0]
 
 
+@common.handle_exceptions
+def get_vectorized_chunks(db):
+    """Finds the chunks that are already stored in the vector db.
+
+    Used to (re)build the lexical index of the chunks.
+
+    :param SimpleSQL db: The database wrapper to use.
+
+    :yield: The (chunk_id, chunk, source, page) of each vectorized chunk.
+    """
+    for chunk_id, chunk, metadata in db.execute_query(
+            _SQL_FIND_VECTORIZED_CHUNKS):
+        yield chunk_id, chunk, metadata.get("source"), metadata.get("page")
+
+
 def set_vectorized(db, chunk_ids):
     """Updates the psql database setting the stored_in_vdb flag.
 
@@ -172,6 +190,62 @@ def set_vectorized(db, chunk_ids):
     db.execute_non_query(sql)
 
 
+@common.handle_exceptions
+def load_embeddings_batch(db, chunk_ids):
+    """Returns the embeddings of the passed in chunks in a single query.
+
+    :param SimpleSQL db: The database wrapper to use.
+    :param list[int] chunk_ids: The chunk ids to fetch.
+
+    :return: The chunk id and the EmbeddingsInfo of each found chunk.
+    :rtype: list[tuple[int, EmbeddingsInfo]]
+    """
+    if not chunk_ids:
+        return []
+    ids = ', '.join(str(int(chunk_id)) for chunk_id in chunk_ids)
+    sql = _SQL_SELECT_EMBEDDINGS_BATCH.format(chunk_ids=ids)
+    loaded = []
+    for chunk_id, chunk, embeddings, metadata in db.execute_query(sql):
+        loaded.append(
+            (
+                chunk_id,
+                embeddings_info.EmbeddingsInfo(
+                    chunk, embeddings,
+                    metadata.get("source"), metadata.get("page")
+                )
+            )
+        )
+    return loaded
+
+
+def load_embeddings_in_shards(chunk_ids, batch_size=2000, shards=4):
+    """Loads the embeddings of the passed in chunks concurrently.
+
+    The chunks are split to batches which are loaded by a pool of shards,
+    each using its own connection (to the registered connection string);
+    at most two batches per shard are loaded ahead of the consumer.
+
+    :param list[int] chunk_ids: The chunk ids to load.
+    :param int batch_size: The number of chunks of each batch.
+    :param int shards: The number of concurrent loaders.
+
+    :yield: The chunk id and the EmbeddingsInfo of the chunks of each batch,
+    in the order of the batches.
+    """
+    batches = [
+        chunk_ids[start:start + batch_size]
+        for start in range(0, len(chunk_ids), batch_size)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=shards) as pool:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.submit(_load_shard_batch, batch))
+            if len(pending) >= 2 * shards:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 @common.handle_exceptions
 def load_embeddings(db, chunk_id):
     """Returns the embeddings for the passed in chunk_id.
@@ -262,13 +336,10 @@ def find_all_documents(directory):
     :rtype: list[str]
     """
     extensions = splitter.get_supported_doc_extensions()
-    matches = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            for extension in extensions:
-                if file.endswith(extension):
-                    matches.append(os.path.join(root, file))
-    return matches
+    return [
+        file_info.fullpath
+        for file_info in doc_catalog.find_files(directory, extensions)
+    ]
 
 
 @common.handle_exceptions
@@ -314,6 +385,11 @@ _SQL_UPDATE_EMBEDDINGS = """
 UPDATE chunks SET embeddings='{embeddings}' WHERE chunk_id={chunk_id}
 """
 
+_SQL_SELECT_EMBEDDINGS_BATCH = """
+SELECT chunk_id, chunk, embeddings, metadata FROM chunks
+WHERE chunk_id IN ( {chunk_ids} ) ORDER BY chunk_id
+"""
+
 _SQL_FIND_MISSING_EMBEDDINGS = """
 SELECT chunk_id FROM chunks WHERE embeddings IS NULL
 """
@@ -326,8 +402,24 @@ _SQL_FIND_ASSIGNED_EMBEDDINGS_NOT_IN_VECTOR_DB = """
 SELECT chunk_id FROM chunks WHERE embeddings IS NOT NULL and stored_in_vdb=0
 """
 
+_SQL_FIND_VECTORIZED_CHUNKS = """
+SELECT chunk_id, chunk, metadata FROM chunks WHERE stored_in_vdb=1
+"""
+
 _SQL_UPDATE_STORED_IN_VDB = """
 UPDATE chunks
 SET stored_in_vdb = 1
 WHERE chunk_id IN ( {chunk_ids} );
 """
+
+
+def _load_shard_batch(chunk_ids):
+    """Loads a batch of embeddings using a new database connection.
+
+    :param list[int] chunk_ids: The chunk ids to load.
+
+    :return: The chunk id and the EmbeddingsInfo of each found chunk.
+    :rtype: list[tuple[int, EmbeddingsInfo]]
+    """
+    with dbutil.SimpleSQL() as db:
+        return load_embeddings_batch(db, chunk_ids)
@@ -0,0 +1,168 @@
+"""Re-indents the python code of the answers of the LLM locally.
+
+The LLM sometimes returns python code that lost its indentation. Most of it
+can be restored by a few heuristics (a line ending with a colon opens a
+block, a return closes it, else / except open a sibling block, a definition
+following two blank lines starts at the top level and following one blank
+line at the class body, as by PEP 8). The result is accepted only if it is
+valid python, otherwise the caller falls back to the LLM.
+"""
+
+import ast
+import re
+import textwrap
+
+
+def is_valid(code):
+    """Returns True if the passed in code is valid python.
+
+    :param str code: The code to check.
+
+    :rtype: bool
+    """
+    try:
+        ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def format_code(code):
+    """Returns the passed in python code properly indented.
+
+    :param str code: The code to format.
+
+    :return: The valid code (unchanged if it already was valid) or None if
+    it could not be formatted locally.
+    :rtype: str | None
+    """
+    code = textwrap.dedent(code).strip("\n")
+    if not code.strip():
+        return None
+    if is_valid(code):
+        return code
+    reindented = _reindent(code)
+    if is_valid(reindented):
+        return reindented
+    return None
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+_INDENT = " " * 4
+
+# The first words of the lines continuing the previous block.
+_SIBLING_KEYWORDS = frozenset(("elif", "else", "except", "finally"))
+
+# The first words of the lines closing their block.
+_CLOSING_KEYWORDS = frozenset(("return", "raise", "pass", "break", "continue"))
+
+# The first words of the definitions that can start at the top level.
+_DEFINITION_KEYWORDS = frozenset(("def", "async", "class"))
+
+_STRING_REGEX = re.compile(r"'[^']*'|\"[^\"]*\"")
+_FIRST_WORD_REGEX = re.compile(r"[@\w]+")
+
+
+def _reindent(code):
+    """Re-indents the lines of the passed in code.
+
+    :param str code: The code with lost indentation.
+
+    :return: The re-indented code (not necessarily valid).
+    :rtype: str
+    """
+    lines = []
+    level = 0
+    # The levels of the statements opening the enclosing blocks.
+    openers = []
+    brackets = 0
+    in_class = False
+    in_string = False
+    blanks = 2
+    just_closed = False
+    for raw_line in code.splitlines():
+        line = raw_line.strip()
+        if in_string:
+            lines.append(raw_line)
+            in_string = _toggles_string(line, in_string)
+            continue
+        if not line:
+            lines.append("")
+            blanks += 1
+            continue
+        if brackets > 0:
+            # A continuation line of an open bracket.
+            brackets = max(brackets + _count_brackets(_strip(line)), 0)
+            closing = brackets == 0 and line[0] in ")]}"
+            lines.append(_INDENT * (level + (not closing)) + line)
+            in_string = _toggles_string(line, in_string)
+            continue
+
+        match = _FIRST_WORD_REGEX.match(line)
+        first_word = match.group(0) if match else ""
+        if first_word in _SIBLING_KEYWORDS:
+            if not just_closed and openers:
+                level = openers.pop()
+        elif blanks and (
+                first_word in _DEFINITION_KEYWORDS
+                or first_word.startswith("@")):
+            if first_word == "class":
+                level, in_class = 0, True
+            elif blanks >= 2:
+                level, in_class = 0, False
+            else:
+                level = 1 if in_class else 0
+            openers = [opener for opener in openers if opener < level]
+        elif level == 0 and not line.startswith("#"):
+            in_class = False
+
+        lines.append(_INDENT * level + line)
+        # The decorators keep the blank lines preceding them.
+        blanks = blanks if first_word.startswith("@") else 0
+        just_closed = False
+
+        code_part = _strip(line)
+        brackets = max(_count_brackets(code_part), 0)
+        in_string = _toggles_string(line, in_string)
+        if brackets == 0 and code_part.endswith(":"):
+            openers.append(level)
+            level += 1
+        elif first_word in _CLOSING_KEYWORDS and openers:
+            level = openers.pop()
+            just_closed = True
+    return "\n".join(lines)
+
+
+def _strip(line):
+    """Returns the code of a line without its strings and comment.
+
+    :param str line: The line.
+
+    :rtype: str
+    """
+    return _STRING_REGEX.sub("", line).split("#", 1)[0].rstrip()
+
+
+def _count_brackets(line):
+    """Returns the opened minus the closed brackets of a line.
+
+    :param str line: The line without its strings and comments.
+
+    :rtype: int
+    """
+    return sum(line.count(c) for c in "([{") - \
+        sum(line.count(c) for c in ")]}")
+
+
+def _toggles_string(line, in_string):
+    """Returns True if a triple quoted string is open after the line.
+
+    :param str line: The line.
+    :param bool in_string: True if a triple quoted string was open before.
+
+    :rtype: bool
+    """
+    count = line.count('"""') + line.count("'''")
+    return in_string != (count % 2 == 1)
@@ -0,0 +1,188 @@
+"""Packs the retrieved matches into the token budget of the prompt.
+
+The k matches selected by the executor are added to a budget of tokens in
+the order of their relevance, truncating the last one that does not fit and
+dropping the rest. This keeps the size (and so the latency and the cost) of
+the prompts predictable whatever the length of the chunks, while the budget
+never adds matches beyond the k requested.
+
+The budget is set by the CONTEXT_TOKEN_BUDGET environment variable (6000
+tokens by default) and is capped by the context window of the model minus
+the tokens reserved for the rest of the prompt and the response. The tokens
+are counted by tiktoken using the encoding of the model; if the encoding
+cannot be loaded (it is downloaded when first used) the tokens are
+approximated by the characters.
+"""
+
+import functools
+import logging
+
+import tiktoken
+
+import ragit.libs.common as common
+
+# Aliases.
+logger = logging.getLogger(__name__)
+
+
+def get_token_budget():
+    """Returns the maximum number of tokens of the matches of a prompt.
+
+    :return: The CONTEXT_TOKEN_BUDGET environment variable or the default.
+    :rtype: int
+
+    :raises: ValueError
+    """
+    return common.get_positive_number(
+        "CONTEXT_TOKEN_BUDGET", _DEFAULT_TOKEN_BUDGET
+    )
+
+
+def get_context_window(model_name):
+    """Returns the number of tokens the model accepts.
+
+    :param str model_name: The name of the model.
+
+    :return: The context window of the model (or of the models of the same
+    family); the default one for the unknown models.
+    :rtype: int
+    """
+    for prefix, window in _CONTEXT_WINDOWS:
+        if (model_name or "").startswith(prefix):
+            return window
+    return _DEFAULT_CONTEXT_WINDOW
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name):
+    """Returns the encoding counting the tokens of a model.
+
+    :param str model_name: The name of the model.
+
+    :return: The tiktoken encoding of the model or, if it cannot be loaded,
+    an approximation of it.
+    :rtype: tiktoken.Encoding | ApproximateEncoding
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(_DEFAULT_ENCODING)
+    except Exception as ex:
+        logger.warning(
+            "Approximating the tokens of %s since its encoding cannot be "
+            "loaded: %s", model_name, ex
+        )
+        return ApproximateEncoding()
+
+
+class ApproximateEncoding:
+    """Approximates a tokenizer by splitting the text every few characters.
+
+    Has the encode and decode methods of tiktoken.Encoding.
+    """
+
+    def encode(self, text):
+        """Splits the text to the approximate tokens.
+
+        :param str text: The text to split.
+
+        :rtype: list[str]
+        """
+        size = _CHARACTERS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def decode(self, tokens):
+        """Joins the tokens returned by encode.
+
+        :param list[str] tokens: The tokens to join.
+
+        :rtype: str
+        """
+        return "".join(tokens)
+
+
+def count_tokens(text, encoding):
+    """Returns the number of tokens of the passed in text.
+
+    :param str text: The text to count.
+    :param encoding: The encoding to use (see get_encoding).
+
+    :rtype: int
+    """
+    return len(encoding.encode(text or ""))
+
+
+def get_available_tokens(model_name, max_tokens, reserved_tokens):
+    """Returns the tokens the matches of a prompt can use.
+
+    :param str model_name: The name of the model.
+    :param int max_tokens: The tokens reserved for the response.
+    :param int reserved_tokens: The tokens of the rest of the prompt.
+
+    :return: The budget capped by the context window of the model.
+    :rtype: int
+    """
+    available = get_context_window(model_name) - max_tokens - \
+        reserved_tokens
+    return max(min(get_token_budget(), available), 0)
+
+
+def pack_matches(matches, budget, encoding, separator_tokens=0):
+    """Selects the matches filling the token budget.
+
+    :param list[tuple] matches: The (text, score, source, page) of the
+    candidate matches sorted by descending relevance.
+    :param int budget: The number of tokens the matches can use.
+    :param encoding: The encoding counting the tokens (see get_encoding).
+    :param int separator_tokens: The tokens added to the prompt for each
+    match (like its title).
+
+    :return: The matches that fit in the budget in the same order; the text
+    of the last one is truncated if only part of it fits.
+    :rtype: list[tuple]
+    """
+    packed = []
+    remaining = budget
+    for match in matches:
+        available = remaining - separator_tokens
+        if available <= 0:
+            break
+        tokens = encoding.encode(match[0] or "")
+        if len(tokens) <= available:
+            packed.append(match)
+            remaining = available - len(tokens)
+            continue
+        if available >= _MIN_TRUNCATED_TOKENS or not packed:
+            text = encoding.decode(tokens[:available])
+            packed.append((text,) + tuple(match[1:]))
+        break
+    return packed
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The default maximum number of tokens of the matches of a prompt.
+_DEFAULT_TOKEN_BUDGET = 6000
+
+# The context windows of the models by the prefix of their names.
+_CONTEXT_WINDOWS = (
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+    ("o1", 128000),
+)
+
+_DEFAULT_CONTEXT_WINDOW = 8192
+
+# The encoding of the models unknown to tiktoken.
+_DEFAULT_ENCODING = "cl100k_base"
+
+# The average characters of a token of english text.
+_CHARACTERS_PER_TOKEN = 4
+
+# A match is not truncated to fewer tokens than this (unless it is the only
+# one), since such a small part of it is unlikely to be useful.
+_MIN_TRUNCATED_TOKENS = 50
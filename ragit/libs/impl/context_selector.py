@@ -0,0 +1,155 @@
+"""Selects the retrieved matches that are passed to the LLM as context.
+
+Overlapping chunks and duplicated documents make the top matches of a
+question repeat the same text, which costs prompt tokens and latency without
+adding information. The executor over-fetches the matches and this module
+selects the ones to use:
+
+- Near duplicates are removed: two matches are near duplicates when most of
+  the word shingles (sequences of consecutive words) of the shorter one
+  appear in the other one.
+
+- Optionally the remaining matches are re-ranked using maximal marginal
+  relevance (MMR) which balances the relevance of each match against its
+  similarity to the already selected ones. MMR is enabled by setting the
+  MMR_LAMBDA environment variable to the weight of the relevance (between 0
+  and 1, like 0.7).
+"""
+
+import os
+import re
+
+
+def get_mmr_lambda():
+    """Returns the weight of the relevance used by MMR.
+
+    The weight is set by the MMR_LAMBDA environment variable.
+
+    :return: The weight of the relevance or None if MMR is disabled.
+    :rtype: float | None
+
+    :raises: ValueError
+    """
+    value = (os.environ.get("MMR_LAMBDA") or "").strip()
+    if not value:
+        return None
+    try:
+        mmr_lambda = float(value)
+    except ValueError:
+        mmr_lambda = -1.
+    if not 0. <= mmr_lambda <= 1.:
+        raise ValueError(
+            f"MMR_LAMBDA is not valid: {value}. It must be a number "
+            f"between 0 and 1."
+        )
+    return mmr_lambda
+
+
+def get_shingles(text, size=None):
+    """Returns the word shingles of the passed in text.
+
+    :param str text: The text to split.
+    :param int size: The number of words of each shingle.
+
+    :return: The lower case shingles; a text shorter than a shingle is a
+    single shingle.
+    :rtype: frozenset[tuple[str]]
+    """
+    size = size or _SHINGLE_SIZE
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= size:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(
+        tuple(words[i:i + size]) for i in range(len(words) - size + 1)
+    )
+
+
+def get_overlap(shingles1, shingles2):
+    """Returns how much of the smaller set of shingles is in the other.
+
+    :param frozenset shingles1: The shingles of a text.
+    :param frozenset shingles2: The shingles of another text.
+
+    :return: The overlap coefficient (between 0 and 1).
+    :rtype: float
+    """
+    if not shingles1 or not shingles2:
+        return 0.
+    common = len(shingles1 & shingles2)
+    return common / min(len(shingles1), len(shingles2))
+
+
+def select_matches(matches, k, mmr_lambda=None,
+                   duplicate_threshold=None):
+    """Selects the k most relevant matches without near duplicates.
+
+    :param list[tuple] matches: The (text, score, source, page) of the
+    matches sorted by descending relevance.
+    :param int k: The number of matches to select.
+    :param float mmr_lambda: The weight of the relevance for MMR; if None
+    the matches keep their order.
+    :param float duplicate_threshold: The overlap above which a match is a
+    near duplicate of an already selected one.
+
+    :return: The selected matches.
+    :rtype: list[tuple]
+    """
+    if duplicate_threshold is None:
+        duplicate_threshold = _DUPLICATE_THRESHOLD
+    candidates = [(match, get_shingles(match[0])) for match in matches]
+    relevances = _get_relevances(len(candidates))
+
+    selected = []
+    remaining = list(range(len(candidates)))
+    while remaining and len(selected) < k:
+        best = None
+        best_score = None
+        for i in remaining:
+            shingles = candidates[i][1]
+            similarity = max(
+                (get_overlap(shingles, candidates[j][1]) for j in selected),
+                default=0.
+            )
+            if similarity >= duplicate_threshold:
+                continue
+            if mmr_lambda is None:
+                best = i
+                break
+            score = mmr_lambda * relevances[i] - \
+                (1. - mmr_lambda) * similarity
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i][0] for i in selected]
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The number of words of each shingle.
+_SHINGLE_SIZE = 3
+
+# A match is a near duplicate of another when this fraction of its shingles
+# appear in the other one.
+_DUPLICATE_THRESHOLD = 0.8
+
+
+def _get_relevances(count):
+    """Returns the relevance of each match by its rank.
+
+    The ranks are used instead of the scores since the scales of the scores
+    differ between the retrievers (cosine similarities, BM25 scores or
+    fused ranks).
+
+    :param int count: The number of matches.
+
+    :return: The relevances, from 1 for the first match linearly down to 0
+    for the last one.
+    :rtype: list[float]
+    """
+    if count <= 1:
+        return [1.] * count
+    return [1. - i / (count - 1) for i in range(count)]
@@ -0,0 +1,197 @@
+"""Schedules the conversion of pdf files to markdowns.
+
+Converting a pdf is mostly spent waiting on the remote parsing service, so
+the files are converted concurrently from a fixed number of asyncio workers
+sharing the same parser; a backlog of N files using C workers takes roughly
+N / C times the duration of a single conversion.
+
+A failed conversion is retried with an exponential backoff before it is
+reported as failed; a failure never stops the conversion of the other files.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import time
+
+import ragit.libs.impl.pdf_preprocessor as pp
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Aliases.
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class ConversionResult:
+    """Holds the outcome of the conversion of a pdf file.
+
+    str pdf_path: The path to the converted pdf file.
+    bool succeeded: True if the markdowns were created.
+    int attempts: The number of attempts that were made.
+    float duration: The total duration of the attempts in seconds.
+    str error: The last error if the conversion failed.
+    """
+
+    pdf_path: str
+    succeeded: bool
+    attempts: int
+    duration: float
+    error: str = None
+
+
+def convert_pdfs(pdf_paths, parser=None, concurrency=DEFAULT_CONCURRENCY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, progress=None,
+                 local_extraction=True):
+    """Converts the passed in pdf files to markdowns.
+
+    Synchronous wrapper of aconvert_pdfs; must not be called while an event
+    loop is already running.
+
+    :param list[str] pdf_paths: The pdf files to convert.
+    :param parser: The parser to use; if None the default parser is used.
+    :param int concurrency: The maximum number of concurrent conversions.
+    :param int max_attempts: The maximum attempts for each file.
+    :param callable progress: Called with the ConversionResult, the number of
+    completed files and the total number of files after each file completes.
+    :param bool local_extraction: If True the text only pages are extracted
+    locally and only the complex pages are sent to the parser.
+
+    :returns: The results of the conversions in the order of the passed in
+    paths.
+    :rtype: list[ConversionResult]
+    """
+    return asyncio.run(
+        aconvert_pdfs(pdf_paths, parser, concurrency, max_attempts, progress,
+                      local_extraction)
+    )
+
+
+async def aconvert_pdfs(pdf_paths, parser=None,
+                        concurrency=DEFAULT_CONCURRENCY,
+                        max_attempts=DEFAULT_MAX_ATTEMPTS, progress=None,
+                        local_extraction=True):
+    """Converts the passed in pdf files to markdowns concurrently.
+
+    :param list[str] pdf_paths: The pdf files to convert.
+
+    :param parser: The parser to use; if None the default parser is used.
+    See pdf_preprocessor.acreate_markdowns_from_pdf for its interface.
+
+    :param int concurrency: The maximum number of concurrent conversions.
+
+    :param int max_attempts: The maximum attempts for each file.
+
+    :param callable progress: Called with the ConversionResult, the number of
+    completed files and the total number of files after each file completes.
+
+    :param bool local_extraction: If True the text only pages are extracted
+    locally and only the complex pages are sent to the parser.
+
+    :returns: The results of the conversions in the order of the passed in
+    paths.
+    :rtype: list[ConversionResult]
+
+    :raises: ValueError
+    """
+    if concurrency < 1:
+        raise ValueError(f"Invalid concurrency: {concurrency}")
+    if max_attempts < 1:
+        raise ValueError(f"Invalid max attempts: {max_attempts}")
+
+    pdf_paths = list(pdf_paths)
+    if parser is None and not local_extraction:
+        parser = pp.make_default_parser()
+    progress = progress or _print_progress
+
+    queue = asyncio.Queue()
+    for index, pdf_path in enumerate(pdf_paths):
+        queue.put_nowait((index, pdf_path))
+
+    results = [None] * len(pdf_paths)
+    completed = 0
+
+    async def worker():
+        """Converts the queued files one after the other."""
+        nonlocal completed
+        while True:
+            try:
+                index, pdf_path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await _convert(
+                pdf_path, parser, max_attempts, local_extraction
+            )
+            results[index] = result
+            completed += 1
+            try:
+                progress(result, completed, len(pdf_paths))
+            except Exception as ex:
+                logger.exception(ex)
+
+    workers = min(concurrency, len(pdf_paths))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+_RETRY_DELAY_IN_SECONDS = 2.0
+
+
+async def _convert(pdf_path, parser, max_attempts, local_extraction):
+    """Converts a pdf file retrying on failure.
+
+    :param str pdf_path: The pdf file to convert.
+    :param parser: The parser to use.
+    :param int max_attempts: The maximum attempts for the file.
+    :param bool local_extraction: If True extract the text pages locally.
+
+    :returns: The result of the conversion.
+    :rtype: ConversionResult
+    """
+    t1 = time.monotonic()
+    error = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await pp.acreate_markdowns_from_pdf(
+                pdf_path, parser, local_extraction
+            )
+        except Exception as ex:
+            error = str(ex) or type(ex).__name__
+            logger.warning(
+                "Attempt %d/%d to convert %s failed: %s",
+                attempt, max_attempts, pdf_path, error
+            )
+            if attempt < max_attempts:
+                await asyncio.sleep(
+                    _RETRY_DELAY_IN_SECONDS * 2 ** (attempt - 1)
+                )
+        else:
+            return ConversionResult(
+                pdf_path=pdf_path,
+                succeeded=True,
+                attempts=attempt,
+                duration=time.monotonic() - t1
+            )
+    return ConversionResult(
+        pdf_path=pdf_path,
+        succeeded=False,
+        attempts=max_attempts,
+        duration=time.monotonic() - t1,
+        error=error
+    )
+
+
+def _print_progress(result, completed, total):
+    """Prints the progress of the conversion.
+
+    :param ConversionResult result: The result of the completed file.
+    :param int completed: The number of completed files.
+    :param int total: The total number of files.
+    """
+    status = "done" if result.succeeded else f"failed ({result.error})"
+    print(f" {completed}/{total}  {result.pdf_path} {status} after "
+          f"{result.attempts} attempt(s), took {result.duration:.2f} seconds")
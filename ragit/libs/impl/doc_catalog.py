@@ -0,0 +1,277 @@
+"""Exposes a cached catalog of the files stored under a directory tree.
+
+The catalog is shared by all the callers that need to discover the
+documents of a RAG collection (chunking, metrics, pdf conversion etc.) so the
+directory tree is scanned once and then served from memory.
+
+Each directory is scanned using os.scandir and its entries are cached along
+with the modification time of the directory; a subsequent call only needs to
+stat each cached directory and rescans only those that were modified, which
+makes repeated calls nearly free.
+
+Note that the modification time of a directory changes when entries are
+added, removed or renamed in it but not when an existing file is modified in
+place, thus the size and modification time of a file reflect the last time
+its directory was scanned.
+"""
+
+import dataclasses
+import os
+import threading
+
+
+@dataclasses.dataclass(frozen=True)
+class FileInfo:
+    """Holds the information of a file discovered by the catalog.
+
+    str fullpath: The full path to the file.
+    str extension: The extension of the file (without the leading dot).
+    int size: The size of the file in bytes.
+    float mtime: The last modification time of the file.
+    """
+
+    fullpath: str
+    extension: str
+    size: int
+    mtime: float
+
+
+def find_files(directory, extensions=None):
+    """Discovers all the files under the given directory tree.
+
+    :param str directory: The directory to search.
+
+    :param Iterable[str] extensions: The extensions (without the leading dot)
+    of the files to return; if None all the files are returned.
+
+    :return: The information of the discovered files.
+    :rtype: list[FileInfo]
+    """
+    if extensions is not None:
+        extensions = frozenset(extensions)
+    return _Catalog.find_files(directory, extensions)
+
+
+def find_subdirectories(directory):
+    """Returns the names of the directories directly under the given one.
+
+    :param str directory: The directory to search.
+
+    :return: The sorted names of the subdirectories.
+    :rtype: list[str]
+    """
+    return _Catalog.find_subdirectories(directory)
+
+
+def directory_exists(fullpath):
+    """Checks if the passed in directory exists using the catalog.
+
+    :param str fullpath: The full path to the directory to check.
+
+    :return: True if the directory exists.
+    :rtype: bool
+    """
+    return _Catalog.directory_exists(fullpath)
+
+
+def invalidate(directory=None):
+    """Drops the cached entries forcing them to be rescanned.
+
+    :param str directory: The directory tree to drop; if None the whole
+    catalog is dropped.
+    """
+    _Catalog.invalidate(directory)
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+@dataclasses.dataclass(frozen=True)
+class _DirectoryNode:
+    """Holds the cached entries of a directory.
+
+    int mtime_ns: The modification time of the directory when scanned.
+    list[FileInfo] files: The files directly under the directory.
+    list[str] subdirectories: The full paths of the subdirectories to walk.
+    frozenset[str] names: The names of all the subdirectories.
+    """
+
+    mtime_ns: int
+    files: list
+    subdirectories: list
+    names: frozenset
+
+
+class _Catalog:
+    """Caches the scanned directories.
+
+    :cvar dict[str, _DirectoryNode] _nodes: Maps a directory to its entries.
+    :cvar threading.Lock _lock: Guards the cached nodes.
+    """
+
+    _nodes = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def find_files(cls, directory, extensions):
+        """Discovers all the files under the given directory tree.
+
+        :param str directory: The directory to search.
+        :param frozenset[str] extensions: The extensions to match or None.
+
+        :return: The information of the discovered files.
+        :rtype: list[FileInfo]
+        """
+        matches = []
+        with cls._lock:
+            pending = [os.path.abspath(directory)]
+            while pending:
+                node = cls._get_node(pending.pop())
+                if node is None:
+                    continue
+                for file_info in node.files:
+                    if extensions is None or \
+                            file_info.extension in extensions:
+                        matches.append(file_info)
+                pending.extend(reversed(node.subdirectories))
+        return matches
+
+    @classmethod
+    def find_subdirectories(cls, directory):
+        """Returns the names of the directories directly under the given one.
+
+        :param str directory: The directory to search.
+
+        :return: The sorted names of the subdirectories.
+        :rtype: list[str]
+        """
+        with cls._lock:
+            node = cls._get_node(os.path.abspath(directory))
+        if node is None:
+            return []
+        return sorted(node.names)
+
+    @classmethod
+    def directory_exists(cls, fullpath):
+        """Checks if the passed in directory exists.
+
+        :param str fullpath: The full path to the directory to check.
+
+        :return: True if the directory exists.
+        :rtype: bool
+        """
+        fullpath = os.path.abspath(fullpath)
+        parent, name = os.path.split(fullpath)
+        with cls._lock:
+            node = cls._get_node(parent)
+        return node is not None and name in node.names
+
+    @classmethod
+    def invalidate(cls, directory):
+        """Drops the cached entries of the passed in directory tree.
+
+        :param str directory: The directory tree to drop or None for all.
+        """
+        with cls._lock:
+            if directory is None:
+                cls._nodes.clear()
+            else:
+                cls._drop_tree(os.path.abspath(directory))
+
+    @classmethod
+    def _get_node(cls, directory):
+        """Returns the up to date entries of the passed in directory.
+
+        Must be called while holding the lock.
+
+        :param str directory: The absolute path of the directory.
+
+        :return: The entries of the directory or None if it does not exist.
+        :rtype: _DirectoryNode | None
+        """
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            cls._drop_tree(directory)
+            return None
+
+        node = cls._nodes.get(directory)
+        if node is not None and node.mtime_ns == mtime_ns:
+            return node
+
+        node = cls._scan(directory, mtime_ns)
+        if node is None:
+            cls._drop_tree(directory)
+            return None
+
+        # Forget the subdirectories that were removed since the last scan.
+        previous = cls._nodes.get(directory)
+        if previous is not None:
+            for subdirectory in set(previous.subdirectories) - \
+                    set(node.subdirectories):
+                cls._drop_tree(subdirectory)
+
+        cls._nodes[directory] = node
+        return node
+
+    @classmethod
+    def _scan(cls, directory, mtime_ns):
+        """Scans the entries of the passed in directory.
+
+        Symbolic links to directories are reported as directories but are not
+        walked, similarly to os.walk.
+
+        :param str directory: The absolute path of the directory.
+        :param int mtime_ns: The modification time of the directory.
+
+        :return: The entries of the directory or None if it is not readable.
+        :rtype: _DirectoryNode | None
+        """
+        files = []
+        subdirectories = []
+        names = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            names.append(entry.name)
+                            if not entry.is_symlink():
+                                subdirectories.append(entry.path)
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    _, dot, extension = entry.name.rpartition('.')
+                    files.append(
+                        FileInfo(
+                            fullpath=entry.path,
+                            extension=extension if dot else '',
+                            size=stat.st_size,
+                            mtime=stat.st_mtime
+                        )
+                    )
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+
+        files.sort(key=lambda file_info: file_info.fullpath)
+        subdirectories.sort()
+        return _DirectoryNode(
+            mtime_ns=mtime_ns,
+            files=files,
+            subdirectories=subdirectories,
+            names=frozenset(names)
+        )
+
+    @classmethod
+    def _drop_tree(cls, directory):
+        """Drops the cached nodes of the passed in directory tree.
+
+        Must be called while holding the lock.
+
+        :param str directory: The absolute path of the directory.
+        """
+        cls._nodes.pop(directory, None)
+        prefix = directory.rstrip(os.sep) + os.sep
+        for path in [p for p in cls._nodes if p.startswith(prefix)]:
+            del cls._nodes[path]
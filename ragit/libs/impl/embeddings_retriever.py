@@ -2,6 +2,9 @@
 
 import openai
 
+# Appended to each query before retrieving its embeddings.
+QUERY_SUFFIX = " (do not consider upper lower case in the embeddings)"
+
 
 def get_embeddings(txt):
     """Returns the embeddings for the passed in txt.
@@ -15,6 +18,60 @@ def get_embeddings(txt):
     return _LLMWrapper.get_embeddings(txt)
 
 
+def get_embeddings_batch(txts):
+    """Returns the embeddings for each of the passed in texts.
+
+    The texts are sent in as few requests as possible (the embeddings
+    endpoint accepts many inputs per request) instead of one per text.
+
+    :param list[str] txts: The texts to create the embeddings for.
+
+    :return: The embeddings for each text in the order of the texts.
+    :rtype: list[list[float]]
+    """
+    assert all(isinstance(txt, str) for txt in txts), \
+        "get_embeddings_batch expects a list of strings."
+    return _LLMWrapper.get_embeddings_batch(list(txts))
+
+
+def get_query_embeddings(query):
+    """Returns the embeddings to use for searching the passed in query.
+
+    :param str query: The query to create the embeddings for.
+
+    :return: The embeddings for the query.
+    :rtype: list [float]
+    """
+    return get_embeddings(query + QUERY_SUFFIX)
+
+
+def get_query_embeddings_batch(queries):
+    """Returns the embeddings to use for searching the passed in queries.
+
+    :param list[str] queries: The queries to create the embeddings for.
+
+    :return: The embeddings for each query in the order of the queries.
+    :rtype: list[list[float]]
+    """
+    return get_embeddings_batch([query + QUERY_SUFFIX for query in queries])
+
+
+async def get_query_embeddings_async(query, client):
+    """Returns the embeddings to search for the query without blocking.
+
+    :param str query: The query to create the embeddings for.
+    :param openai.AsyncOpenAI client: The client to use.
+
+    :return: The embeddings for the query.
+    :rtype: list [float]
+    """
+    response = await client.embeddings.create(
+        input=query + QUERY_SUFFIX,
+        model=_LLMWrapper._MODEL_NAME
+    )
+    return response.data[0].embedding
+
+
 # Whatever follows this line is private to the module and should not be
 # used from the outside.
 
@@ -27,6 +84,9 @@ class _LLMWrapper:
     _client = None
     _MODEL_NAME = "text-embedding-ada-002"
 
+    # The maximum number of inputs accepted by a single embeddings request.
+    _MAX_BATCH_SIZE = 2048
+
     @classmethod
     def get_embeddings(cls, txt):
         """Returns the embeddings for the passed in txt.
@@ -45,3 +105,25 @@ class _LLMWrapper:
         )
         embeddings = [r.embedding for r in response.data]
         return embeddings[0]
+
+    @classmethod
+    def get_embeddings_batch(cls, txts):
+        """Returns the embeddings for each of the passed in texts.
+
+        :param list[str] txts: The texts to create the embeddings for.
+
+        :return: The embeddings for each text in the order of the texts.
+        :rtype: list[list[float]]
+        """
+        if not cls._client:
+            cls._client = openai.OpenAI()
+
+        embeddings = []
+        for start in range(0, len(txts), cls._MAX_BATCH_SIZE):
+            response = cls._client.embeddings.create(
+                input=txts[start:start + cls._MAX_BATCH_SIZE],
+                model=cls._MODEL_NAME
+            )
+            data = sorted(response.data, key=lambda r: r.index)
+            embeddings.extend(r.embedding for r in data)
+        return embeddings
@@ -0,0 +1,147 @@
+"""Exposes a lexical (BM25) index of the chunks.
+
+The embeddings search misses exact identifiers (like error codes, function
+names or part numbers) that carry little semantic meaning; the lexical index
+complements it by ranking the chunks containing the words of the question
+using BM25.
+
+The index is an sqlite FTS5 table (an inverted index of the words of each
+chunk) stored next to the vector db and updated incrementally each time
+chunks are inserted to the vector db; the id of each chunk is its id in the
+chunks table. The text is tokenized at the non alphanumeric characters, so
+an identifier of the question like get_embeddings_batch is searched as the
+phrase of its parts.
+
+The page and the file type of the original document of each chunk are
+stored next to its source for the filters (see vdb_sidecar).
+"""
+
+import re
+import sqlite3
+import threading
+
+import ragit.libs.impl.vdb_sidecar as vdb_sidecar
+
+
+class LexicalIndex:
+    """Holds the BM25 index of the chunks.
+
+    :ivar sqlite3.Connection _conn: The connection to the sqlite database.
+    :ivar threading.Lock _lock: Serializes the access to the connection.
+    """
+
+    def __init__(self, fullpath):
+        """Opens (creating it if needed) the lexical index.
+
+        :param str fullpath: The full path to the sqlite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fullpath, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SQL_CREATE_CHUNKS)
+
+    def close(self):
+        """Closes the index."""
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def get_number_of_records(self):
+        """Returns the number of chunks in the index.
+
+        :return: The number of chunks in the index.
+        :rtype: int
+        """
+        with self._lock:
+            return self._conn.execute(_SQL_COUNT_CHUNKS).fetchone()[0]
+
+    def insert(self, ids, chunks, sources, pages):
+        """Inserts (or replaces) the passed in chunks.
+
+        :param list[int] ids: The ids of the chunks.
+        :param list[str] chunks: The chunks to insert.
+        :param list[str] sources: The full paths to the documents.
+        :param list[int] pages: The pages holding the chunks.
+        """
+        rows = [
+            (int(chunk_id), chunk, *vdb_sidecar.make_metadata(source, page))
+            for chunk_id, chunk, source, page in zip(
+                ids, chunks, sources, pages
+            )
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(_SQL_DELETE_CHUNK, [(r[0],) for r in rows])
+            self._conn.executemany(_SQL_INSERT_CHUNK, rows)
+
+    def search(self, query, k=3, search_filter=None):
+        """Finds the chunks best matching the words of the query.
+
+        :param str query: The question to find matching chunks for.
+        :param int k: The number of matches to return.
+        :param vdb_abstract_base.SearchFilter search_filter: The validated
+        filter the matches must satisfy or None.
+
+        :return: The (text, score, source, page) of each match sorted by
+        descending BM25 score.
+        :rtype: list[tuple]
+        """
+        match_query = make_match_query(query)
+        if not match_query or k <= 0:
+            return []
+        conditions, values = vdb_sidecar.make_filter_conditions(search_filter)
+        sql = _SQL_SEARCH.format(conditions=conditions)
+        with self._lock:
+            rows = self._conn.execute(
+                sql, [match_query, *values, k]
+            ).fetchall()
+        # FTS5 returns the BM25 score negated so better matches sort first.
+        return [
+            (text, -score, source, page)
+            for text, source, page, score in rows
+        ]
+
+
+def make_match_query(query):
+    """Makes the FTS5 query matching any of the words of the passed in text.
+
+    :param str query: The text to search.
+
+    :return: The FTS5 query or an empty string if the text has no words.
+    :rtype: str
+    """
+    phrases = []
+    for word in re.findall(r"\w+", query or ""):
+        tokens = [token for token in word.split("_") if token]
+        phrase = '"' + " ".join(tokens) + '"'
+        if tokens and phrase not in phrases:
+            phrases.append(phrase)
+    return " OR ".join(phrases)
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+_SQL_CREATE_CHUNKS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    text,
+    source UNINDEXED,
+    page UNINDEXED,
+    file_type UNINDEXED
+)
+"""
+
+_SQL_COUNT_CHUNKS = "SELECT COUNT(*) FROM chunks"
+
+_SQL_DELETE_CHUNK = "DELETE FROM chunks WHERE rowid = ?"
+
+_SQL_INSERT_CHUNK = """
+INSERT INTO chunks (rowid, text, source, page, file_type)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+_SQL_SEARCH = """
+SELECT text, source, page, bm25(chunks) AS score FROM chunks
+WHERE chunks MATCH ? AND {conditions}
+ORDER BY score LIMIT ?
+"""
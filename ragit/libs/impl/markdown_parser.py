@@ -44,213 +44,139 @@ def iter_markdown(filename):
 
     This function reads a markdown file and yields nodes of type Text or Table.
 
+    The file is streamed line by line and each section is yielded as soon as
+    it is complete, so the whole document is never held in memory.
+
     :param str filename: The path to the markdown file.
     :yield: IMarkdownSection instance of type Text or Table.
     :rtype: Generator[Union[Text, Table], None, None]
     """
-    root = _Node(_Node.ROOT_NAME)
     with open(filename, 'r') as fin:
-        for line in fin.readlines():
-            root.add(line)
-    for node in root.get_nodes():
-        if isinstance(node, (_Text, _Table)):
-            yield node
-
+        for section in iter_markdown_lines(fin):
+            yield section
 
-# What follows is an implementation detail that is not meant to be used
-# from client code.
 
-class _Node:
-    """Represents a generic node in the markdown document.
+def iter_markdown_lines(lines):
+    """Iterates over the markdown elements of the passed in lines.
 
-    A Node can be a header (H1, H2, H3), Text, or Table. Each node can
-    have multiple children nodes.
-
-    :param str caption: The caption or header text of the node.
+    :param Iterable[str] lines: The lines of the markdown document.
+    :yield: IMarkdownSection instance of type Text or Table.
+    :rtype: Generator[Union[Text, Table], None, None]
     """
+    parser = _Parser()
+    for line in lines:
+        section = parser.add(line)
+        if section:
+            yield section
+    section = parser.flush()
+    if section:
+        yield section
 
-    ROOT_NAME = "__markdown__root__"
-
-    def __init__(self, caption):
-        """Initializes a Node with the given caption.
-
-        :param str caption: The caption or header text of the node.
-        :raise AssertionError: If caption is empty.
-        """
-        assert caption, "Header caption cannot be empty."
-        self._children = []
-        self._tail = self
-        self._parent = None
-        self._caption = caption
-
-    def _is_root(self):
-        """Checks if the node is the root node.
-
-        :return: True if the node is the root node, False otherwise.
-        :rtype: bool
-        """
-        return self._caption == _Node.ROOT_NAME
 
-    def set_tail(self, new_tail):
-        """Sets the tail node to the given new tail.
-
-        :param _Node new_tail: The new tail node.
-        """
-        if self._is_root():
-            self._tail = new_tail
-        else:
-            self._parent.set_tail(new_tail)
-
-    def headers_path(self):
-        """Returns the path of headers leading to this node.
+# What follows is an implementation detail that is not meant to be used
+# from client code.
 
-        :return: The path of headers.
-        :rtype: str
-        """
-        return ' => '.join(reversed(self.get_header_path()))
+class _Parser:
+    """Streaming state machine that splits markdown lines to sections.
 
-    def get_header_path(self):
-        """Recursively collects the headers path.
+    The parser keeps the stack of the currently open headers along with the
+    headers path of each of them, so every line is processed in constant
+    (amortized) time and a section gets its headers path when it is created.
 
-        :return: List of headers leading to this node.
-        :rtype: list
-        """
-        headers = []
-        if not self._is_root():
-            headers.append(self._caption)
-        if self._parent:
-            headers.extend(self._parent.get_header_path())
-        return headers
+    A header can only be nested under a header of a lower level, thus when a
+    new header arrives all the open headers of the same or a higher level are
+    closed. Consecutive lines of the same kind (text or table) are merged to
+    the same section; a header or a line of a different kind completes it.
 
-    def __repr__(self):
-        """Returns the string representation of the Node.
+    :ivar list[tuple[int, str]] _headers: The stack of the open headers as
+    tuples of their level and the headers path leading to them.
 
-        :return: The string representation of the Node.
-        :rtype: str
-        """
-        return f"{self.__class__.__name__}(caption={self._caption})"
+    :ivar _LineContainer _current: The section that is being filled.
+    """
 
-    def get_nodes(self):
-        """Generates all nodes in the subtree rooted at this node.
+    _HEADER_PREFIXES = (("# ", 1), ("## ", 2), ("### ", 3))
+    _PATH_SEPARATOR = ' => '
 
-        :yield: Nodes in the subtree rooted at this node.
-        :rtype: Generator[Node, None, None]
-        """
-        yield self
-        for node in self._children:
-            if isinstance(node, _Node):
-                for n in node.get_nodes():
-                    yield n
-            else:
-                yield node
+    def __init__(self):
+        """Initializes the parser."""
+        self._headers = []
+        self._current = None
 
     def add(self, line):
-        """Adds a new node based on the given line to the current node.
+        """Adds the passed in line to the document.
 
         :param str line: The line of text to add.
-        """
-        new_node = self._make_node(line)
-        self._add_node(new_node)
 
-    @classmethod
-    def _make_node(cls, line):
-        """Returns the node type for the passed in line.
-
-        :param str line: The line of text to get its node type.
-
-        :return: The node type and the value of the line.
-        :rtype: Tuple
+        :return: The section that was completed by the line, if any.
+        :rtype: _LineContainer | None
         """
         stripped = line.strip()
-        if stripped.startswith("# "):
-            return _H1Node(stripped[2:])
-        elif stripped.startswith("## "):
-            return _H2Node(stripped[3:])
-        elif stripped.startswith("### "):
-            return _H3Node(stripped[4:])
-        elif stripped.startswith("|") and stripped.endswith("|"):
-            return _Table(stripped)
-        else:
-            return _Text(stripped)
 
-    def _add_node(self, other):
-        """Adds a new node to the current node's children.
+        for prefix, level in self._HEADER_PREFIXES:
+            if stripped.startswith(prefix):
+                completed = self.flush()
+                self._open_header(level, stripped[len(prefix):])
+                return completed
 
-        :param _Node |_Table | _Text other: The new node to add.
-        """
-        if self._tail.can_add(other):
-            if isinstance(self._tail, _Table):
-                self._tail.merge(other)
-            elif isinstance(self._tail, _Text):
-                self._tail.merge(other)
-            else:
-                self._tail._children.append(other)
-                other._parent = self._tail
-                self.set_tail(other)
+        if stripped.startswith("|") and stripped.endswith("|"):
+            container_type = _Table
         else:
-            parent = self._tail._parent
-            self.set_tail(parent)
-            parent._add_node(other)
-
-    def can_add(self, other):
-        """Checks if the current node can add the given node.
-
-        :param _Node other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
-        """
-        return isinstance(other, (_H1Node, _H2Node, _H3Node, _Table, _Text))
+            container_type = _Text
 
+        if type(self._current) is container_type:
+            self._current.append(stripped)
+            return None
 
-class _H1Node(_Node):
-    """Represents a first-level header node (H1) in the markdown document."""
+        completed = self.flush()
+        self._current = container_type(stripped, self._get_headers_path())
+        return completed
 
-    def can_add(self, other):
-        """Checks if the current H1Node can add the given node.
+    def flush(self):
+        """Completes the section that is being filled.
 
-        :param _Node other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
+        :return: The completed section, if any.
+        :rtype: _LineContainer | None
         """
-        return isinstance(other, (_H2Node, _H3Node, _Table, _Text))
-
-
-class _H2Node(_Node):
-    """Represents a second-level header node (H2) in the markdown document."""
+        completed = self._current
+        self._current = None
+        return completed
 
-    def can_add(self, other):
-        """Checks if the current H2Node can add the given node.
+    def _open_header(self, level, caption):
+        """Opens a new header closing the ones it cannot be nested under.
 
-        :param _Node other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
+        :param int level: The level of the header (1 for H1 etc).
+        :param str caption: The caption of the header.
         """
-        return isinstance(other, (_H3Node, _Table, _Text))
-
-
-class _H3Node(_Node):
-    """Represents a third-level header node (H3) in the markdown document."""
+        while self._headers and self._headers[-1][0] >= level:
+            self._headers.pop()
+        if self._headers:
+            path = self._headers[-1][1] + self._PATH_SEPARATOR + caption
+        else:
+            path = caption
+        self._headers.append((level, path))
 
-    def can_add(self, other):
-        """Checks if the current H3Node can add the given node.
+    def _get_headers_path(self):
+        """Returns the headers path of the innermost open header.
 
-        :param _Node other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
+        :return: The headers path.
+        :rtype: str
         """
-        return isinstance(other, (_Table, _Text))
+        if self._headers:
+            return self._headers[-1][1]
+        return ""
 
 
 class _LineContainer(IMarkdownSection):
     """Represents a container for lines of text in the markdown document."""
 
-    def __init__(self, line):
+    def __init__(self, line, headers=""):
         """Initializes a LineContainer with the given line.
 
         :param str line: The initial line of text.
+        :param str headers: The headers path leading to the container.
         """
         self._lines = [line]
-        self._parent = None
+        self._headers = headers
 
     def get_headers(self):
         """Returns the headers path leading to this line container.
@@ -258,19 +184,14 @@ class _LineContainer(IMarkdownSection):
         :return: The headers path.
         :rtype: str
         """
-        if isinstance(self._parent, _Node):
-            return self._parent.headers_path()
-        else:
-            return "path in not available."
+        return self._headers
 
-    def merge(self, other):
-        """Merges the given LineContainer with the current one.
+    def append(self, line):
+        """Appends a line to the container.
 
-        :param _LineContainer other: The LineContainer to merge with.
-        :raise AssertionError: If the types of the containers do not match.
+        :param str line: The line to append.
         """
-        assert type(other) is type(self)
-        self._lines.extend(other._lines)
+        self._lines.append(line)
 
     def get_inner_text(self):
         """Returns the inner text of the LineContainer.
@@ -300,15 +221,6 @@ class _LineContainer(IMarkdownSection):
 class _Table(_LineContainer):
     """Represents a table in the markdown document."""
 
-    def can_add(self, other):
-        """Checks if the current Table can add the given node.
-
-        :param _LineContainer other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
-        """
-        return isinstance(other, _Table)
-
     def get_section_type(self):
         """Returns the type of the section.
 
@@ -321,15 +233,6 @@ class _Table(_LineContainer):
 class _Text(_LineContainer):
     """Represents a block of text in the markdown document."""
 
-    def can_add(self, other):
-        """Checks if the current Text can add the given node.
-
-        :param _LineContainer other: The node to check.
-        :return: True if the node can be added, False otherwise.
-        :rtype: bool
-        """
-        return isinstance(other, _Text)
-
     def get_section_type(self):
         """Returns the type of the section.
 
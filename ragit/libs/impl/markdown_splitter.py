@@ -3,60 +3,105 @@
 import bisect
 import re
 
+DEFAULT_SEPARATORS = ('.',)
 
-def get_chunks(txt, chunk_size=800):
+
+def get_chunks(txt, chunk_size=800, separators=DEFAULT_SEPARATORS):
     """Splits a text into chunks based on punctuation or size.
 
+    Each chunk ends at the separator that is closest to chunk_size characters
+    from the start of the chunk; when no separator is left the remaining text
+    is cut in pieces of exactly chunk_size characters.
+
+    The separator positions are computed once for the whole text and the
+    chunks are emitted in a single pass, so the cost is linear in the size of
+    the text regardless of how many chunks it produces.
+
     :param str txt: The text to be split into chunks.
 
     :param int chunk_size: The maximum size of each chunk in characters.
 
+    :param tuple[str] separators: The strings where a chunk can end; a chunk
+    always includes the separator it ends with.
+
     :returns: Yields chunks of the text.
     :rtype: generator.
+
+    :raises: ValueError
     """
+    if chunk_size <= 0:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
 
     txt = txt.strip()
     if not txt:
         return
 
     txt = re.sub(r'\n+', '\n', txt)
-    separator_indexes = []
-
-    for index, c in enumerate(txt):
-        if c in ('.',):
-            separator_indexes.append(index)
-
-    if not separator_indexes:
-        # There are no periods.
-        chunk = txt[:chunk_size]
-        yield chunk
-        for chunk in get_chunks(txt[chunk_size:], chunk_size):
-            yield chunk
-    else:
-        ci = _find_closest_index(separator_indexes, chunk_size)
-        cutoff = separator_indexes[ci] + 1
-        yield txt[:cutoff]
-
-        for c in get_chunks(txt[cutoff:], chunk_size):
-            yield c
+    starts, ends = _find_separators(txt, separators)
+
+    length = len(txt)
+    pos = 0
+    while True:
+        # Skip the whitespace that separates two chunks.
+        while pos < length and txt[pos].isspace():
+            pos += 1
+        if pos >= length:
+            return
+
+        first = bisect.bisect_left(starts, pos)
+        if first == len(starts):
+            # There are no separators left.
+            yield txt[pos:pos + chunk_size]
+            pos += chunk_size
+        else:
+            ci = _find_closest_index(starts, pos + chunk_size, first)
+            yield txt[pos:ends[ci]]
+            pos = ends[ci]
 
 
 # The following are private implementation details.
 
-def _find_closest_index(sorted_list, target):
+def _find_separators(txt, separators):
+    """Finds where each separator occurrence starts and ends in the text.
+
+    :param str txt: The text to search for separators.
+    :param tuple[str] separators: The separators to look for.
+
+    :returns: Two sorted lists holding the start and the end offsets of each
+    separator occurrence.
+    :rtype: tuple[list[int], list[int]]
+    """
+    separators = [s for s in separators if s]
+    if not separators:
+        return [], []
+    # Try the longest separators first so overlapping ones match greedily.
+    pattern = '|'.join(
+        re.escape(s) for s in sorted(separators, key=len, reverse=True)
+    )
+    starts = []
+    ends = []
+    for match in re.finditer(pattern, txt):
+        starts.append(match.start())
+        ends.append(match.end())
+    return starts, ends
+
+
+def _find_closest_index(sorted_list, target, lo=0):
     """Finds the closest index in a sorted list for a given target.
 
     :param List sorted_list: The list within which to find the closest index.
 
     :param int target: The target value to find the closest index for.
 
+    :param int lo: Only the elements from this index onwards are considered.
+
     :returns: The index of the closest element.
     :rtype: int.
     """
-    insert_point = bisect.bisect_left(sorted_list, target)
+    insert_point = bisect.bisect_left(sorted_list, target, lo)
 
-    if insert_point == 0:
-        return 0
+    if insert_point == lo:
+        return lo
     if insert_point == len(sorted_list):
         return len(sorted_list) - 1
 
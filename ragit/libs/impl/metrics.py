@@ -4,6 +4,7 @@ import os
 
 import ragit.libs.common as common
 import ragit.libs.impl.chunks_mgr as chunks_mgr
+import ragit.libs.impl.doc_catalog as doc_catalog
 import ragit.libs.impl.pdf_preprocessor as pdf_processor
 
 
@@ -17,13 +18,7 @@ def get_total_pdf_files(collection_name):
     :rtype: int
     """
     directory = os.path.join(common.get_shared_directory(), collection_name)
-    pdf_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".pdf"):
-                fullpath = os.path.join(root, file)
-                pdf_files.append(fullpath)
-    return len(pdf_files)
+    return len(doc_catalog.find_files(directory, _PDF_EXTENSIONS))
 
 
 @common.handle_exceptions
@@ -37,14 +32,11 @@ def get_pdf_files_missing_markdowns(collection_name):
     :rtype: list[str]
     """
     directory = os.path.join(common.get_shared_directory(), collection_name)
-    pdf_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".pdf"):
-                fullpath = os.path.join(root, file)
-                if pdf_processor.needs_to_create_markdowns(fullpath):
-                    pdf_files.append(fullpath)
-    return pdf_files
+    return [
+        file_info.fullpath
+        for file_info in doc_catalog.find_files(directory, _PDF_EXTENSIONS)
+        if pdf_processor.needs_to_create_markdowns(file_info.fullpath)
+    ]
 
 
 @common.handle_exceptions
@@ -155,6 +147,8 @@ def get_chunks_to_insert_to_vector_db(db):
 # Whatever follows this line is private to the module and should not be
 # used from the outside.
 
+_PDF_EXTENSIONS = ("pdf",)
+
 _SQL_COUNT_CHUNKS = """SELECT count(*) FROM chunks"""
 
 _SQL_COUNT_CHUNKS_IN_VECTOR_DB = """
@@ -0,0 +1,88 @@
+"""Exposes functions to store growing matrices as .npy files.
+
+The rows of a matrix are appended to the end of its .npy file and then the
+header is rewritten in place to the new shape (the .npy header reserves room
+for the shape to grow), thus appending costs only the size of the new rows
+and the file can be memory mapped by readers at any time.
+"""
+
+import io
+import os
+
+import numpy as np
+
+
+def load(fullpath):
+    """Memory maps the matrix stored in the passed in file.
+
+    :param str fullpath: The full path to the .npy file.
+
+    :return: The (read only) matrix or None if the file does not exist or
+    holds no rows.
+    :rtype: numpy.ndarray
+    """
+    if not os.path.isfile(fullpath):
+        return None
+    matrix = np.load(fullpath, mmap_mode='r')
+    if matrix.shape[0] == 0:
+        return None
+    return matrix
+
+
+def save(fullpath, matrix):
+    """Atomically replaces the .npy file with the passed in matrix.
+
+    :param str fullpath: The full path to the .npy file.
+    :param numpy.ndarray matrix: The matrix to store.
+    """
+    temp_path = f"{fullpath}.tmp"
+    with open(temp_path, 'wb') as fout:
+        np.save(fout, matrix)
+    os.replace(temp_path, fullpath)
+
+
+def append(fullpath, count, rows):
+    """Appends the rows to the .npy file.
+
+    The rows are written after the existing ones and then the header is
+    rewritten to the new shape; if the process dies in between, the header
+    still holds the previous shape and the extra bytes are overwritten by the
+    next append.
+
+    :param str fullpath: The full path to the .npy file.
+    :param int count: The number of rows already in the file.
+    :param numpy.ndarray rows: The rows to append; must have the dtype and
+    the number of columns of the stored matrix.
+    """
+    if count == 0 or not os.path.isfile(fullpath):
+        save(fullpath, rows)
+        return
+
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {
+            "descr": np.lib.format.dtype_to_descr(rows.dtype),
+            "fortran_order": False,
+            "shape": (count + rows.shape[0], rows.shape[1])
+        }
+    )
+    header = header.getvalue()
+
+    with open(fullpath, 'r+b') as f:
+        np.lib.format.read_magic(f)
+        np.lib.format.read_array_header_1_0(f)
+        header_size = f.tell()
+        if len(header) == header_size:
+            row_size = rows.shape[1] * rows.itemsize
+            f.truncate(header_size + count * row_size)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(header)
+            return
+
+    # No room left to grow the header in place.
+    save(fullpath, np.vstack([np.load(fullpath, mmap_mode='r')[:count], rows]))
@@ -1,14 +1,23 @@
 """Implements the pdf splitter."""
 
+import asyncio
 import datetime
+import enum
+import logging
 import os
 import pathlib
+import re
 import shutil
 
+import pypdf
 from llama_parse import LlamaParse
 
 import ragit.libs.sanitizer as sanitizer
 
+# Aliases.
+logger = logging.getLogger(__name__)
+
+
 def needs_to_create_markdowns(pdf_path):
     """Checks if the markdowns for the pdf need to be created.
 
@@ -44,13 +53,86 @@ def get_markdown_directory_name(pdf_path):
         return pdf_path[:-4] + '_markdown_'
 
 
-def create_markdowns_from_pdf(pdf_path):
+def make_default_parser():
+    """Returns the remote parser used to convert pdf files to markdowns.
+
+    :returns: The LlamaParse instance to use for the conversion.
+    :rtype: LlamaParse
+    """
+    return LlamaParse(
+        result_type="markdown",
+        auto_mode=True,
+        auto_mode_trigger_on_image_in_page=True,
+        auto_mode_trigger_on_table_in_page=True,
+    )
+
+
+class PageType(enum.IntEnum):
+    """Defines how a pdf page is converted to markdown.
+
+    TEXT pages hold plain text only and are extracted locally while COMPLEX
+    pages (holding images, tables or no extractable text at all) are sent to
+    the remote parser.
+    """
+
+    TEXT = 1
+    COMPLEX = 2
+
+
+def classify_pages(pdf_path):
+    """Classifies each page of the passed in pdf.
+
+    :param str pdf_path: The path to the pdf to classify.
+
+    :returns: The type of each page in page order.
+    :rtype: list[PageType]
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    return [
+        _classify_page(reader, page, page.extract_text())
+        for page in reader.pages
+    ]
+
+
+def create_markdowns_from_pdf(pdf_path, parser=None, local_extraction=True):
+    """Creates the markdown files that correspond to the passed in pdf file.
+
+    Synchronous wrapper of acreate_markdowns_from_pdf; must not be called
+    while an event loop is already running.
+
+    :param str pdf_path: The path to the pdf to break it down.
+
+    :param parser: The parser to use; if None the default parser is used.
+    See acreate_markdowns_from_pdf for its interface.
+
+    :param bool local_extraction: If True the text only pages are extracted
+    locally and only the complex pages are sent to the parser.
+
+    :raises: ValueError
+    """
+    asyncio.run(
+        acreate_markdowns_from_pdf(pdf_path, parser, local_extraction)
+    )
+
+
+async def acreate_markdowns_from_pdf(pdf_path, parser=None,
+                                     local_extraction=True):
     """Creates the markdown files that correspond to the passed in pdf file.
 
     For each page included in the passed in pdf file a new markdown file is
     created. For each pdf a new directory is created (with the name of the pdf
     file without its extension) and the markdowns are copied there.
 
+    When local_extraction is set, the pages holding plain text only are
+    extracted locally using pypdf while the rest of the pages are copied to a
+    temporary pdf which is sent to the parser; the markdown of every page
+    keeps the number of the page in the original pdf.
+
+    The parser can be any object exposing an awaitable aload_data(pdf_path)
+    method that returns a list of documents (one per page) holding the
+    markdown in their text attribute, as LlamaParse does; this allows to
+    use a local stand-in instead of the remote service.
+
      Side effects
      ------------
     - Sanitizes (in place) the passed in path.
@@ -59,6 +141,11 @@ def create_markdowns_from_pdf(pdf_path):
 
     :param str pdf_path: The path to the pdf to break it down.
 
+    :param parser: The parser to use; if None the default parser is used.
+
+    :param bool local_extraction: If True the text only pages are extracted
+    locally and only the complex pages are sent to the parser.
+
     :raises: ValueError
     """
     if not os.path.isfile(pdf_path) or not pdf_path.endswith("pdf"):
@@ -75,23 +162,216 @@ def create_markdowns_from_pdf(pdf_path):
         shutil.rmtree(temp_output_dir)
     os.makedirs(temp_output_dir)
 
-    parser = LlamaParse(
-        result_type="markdown",
-        auto_mode=True,
-        auto_mode_trigger_on_image_in_page=True,
-        auto_mode_trigger_on_table_in_page=True,
-    )
-
     t1 = datetime.datetime.now()
-    documents = parser.load_data(pdf_path)
+    try:
+        pages = None
+        local_count = 0
+        if local_extraction:
+            try:
+                pages = await asyncio.to_thread(_extract_text_pages, pdf_path)
+                local_count = len(pages) - pages.count(None)
+            except pypdf.errors.PdfReadError as ex:
+                # Let the parser deal with pdf files that pypdf cannot read.
+                logger.warning("Cannot extract %s locally: %s", pdf_path, ex)
+        if pages is None or None in pages:
+            pages = await _parse_remaining_pages(
+                pdf_path, pages, parser, temp_output_dir
+            )
+    except BaseException:
+        shutil.rmtree(temp_output_dir, ignore_errors=True)
+        raise
+
     filename_no_ext = pathlib.Path(pdf_path).stem
-    for index, doc in enumerate(documents, start=1):
+    for index, text in enumerate(pages, start=1):
         output_file = os.path.join(temp_output_dir, f"{filename_no_ext}-{index}.md")
         print(f"creating {output_file}")
         with open(output_file, 'w') as fout:
-            fout.write(doc.text)
+            fout.write(text)
 
     # The full pdf was processed, rename the temp directory.
     os.rename(temp_output_dir, output_dir)
     t2 = datetime.datetime.now()
-    print(pdf_path, " Duration:", (t2-t1).total_seconds())
+    print(pdf_path, " Duration:", (t2-t1).total_seconds(),
+          f"Pages: {len(pages)} (locally extracted: {local_count})")
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The minimum number of characters for a page to be considered as text; pages
+# with less text are most likely scanned and need OCR.
+_MIN_TEXT_LENGTH = 20
+
+# The minimum number of drawn rectangles and lines for a page to be
+# considered as holding a (ruled) table.
+_MIN_TABLE_DRAWING_OPERATIONS = 8
+
+# The minimum number of consecutive lines with aligned columns for a page to
+# be considered as holding a (borderless) table.
+_MIN_TABLE_ROWS = 3
+
+_COLUMN_GAP = re.compile(r"\S {3,}(?=\S)")
+
+
+def _extract_text_pages(pdf_path):
+    """Extracts the text of the pages that do not need the remote parser.
+
+    :param str pdf_path: The path to the pdf to extract.
+
+    :returns: The extracted text for each text page or None for each complex
+    page in page order.
+    :rtype: list[str | None]
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    pages = []
+    for page in reader.pages:
+        text = page.extract_text()
+        if _classify_page(reader, page, text) == PageType.TEXT:
+            pages.append(text.strip() + "\n")
+        else:
+            pages.append(None)
+    return pages
+
+
+async def _parse_remaining_pages(pdf_path, pages, parser, temp_output_dir):
+    """Parses the pages that were not extracted locally using the parser.
+
+    :param str pdf_path: The path to the pdf.
+
+    :param list[str | None] pages: The locally extracted pages (None for the
+    pages to parse) or None to parse the whole pdf.
+
+    :param parser: The parser to use; if None the default parser is used.
+
+    :param str temp_output_dir: A directory to hold temporary files.
+
+    :returns: The markdown for each page of the pdf.
+    :rtype: list[str]
+
+    :raises: ValueError
+    """
+    parser = parser or make_default_parser()
+
+    if pages is None:
+        documents = await parser.aload_data(pdf_path)
+        return [doc.text for doc in documents]
+
+    indexes = [index for index, text in enumerate(pages) if text is None]
+    if len(indexes) == len(pages):
+        subset_path = pdf_path
+    else:
+        subset_path = os.path.join(temp_output_dir, "complex-pages.pdf")
+        await asyncio.to_thread(_copy_pages, pdf_path, indexes, subset_path)
+
+    try:
+        documents = await parser.aload_data(subset_path)
+    finally:
+        if subset_path != pdf_path and os.path.isfile(subset_path):
+            os.remove(subset_path)
+
+    if len(documents) != len(indexes):
+        raise ValueError(
+            f"Expected {len(indexes)} parsed pages for {pdf_path} "
+            f"but got {len(documents)}."
+        )
+    pages = list(pages)
+    for index, doc in zip(indexes, documents):
+        pages[index] = doc.text
+    return pages
+
+
+def _copy_pages(pdf_path, indexes, output_path):
+    """Copies the passed in pages of a pdf to a new pdf.
+
+    :param str pdf_path: The path to the source pdf.
+    :param list[int] indexes: The zero based indexes of the pages to copy.
+    :param str output_path: The path to the pdf to create.
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    writer = pypdf.PdfWriter()
+    for index in indexes:
+        writer.add_page(reader.pages[index])
+    with open(output_path, 'wb') as fout:
+        writer.write(fout)
+
+
+def _classify_page(reader, page, text):
+    """Classifies a pdf page.
+
+    :param pypdf.PdfReader reader: The reader holding the page.
+    :param pypdf.PageObject page: The page to classify.
+    :param str text: The text already extracted from the page.
+
+    :returns: The type of the page.
+    :rtype: PageType
+    """
+    if _has_images(page.get("/Resources")):
+        return PageType.COMPLEX
+
+    contents = page.get_contents()
+    operations = []
+    if contents is not None:
+        operations = pypdf.generic.ContentStream(contents, reader).operations
+    drawings = 0
+    for _, operator in operations:
+        if operator == b"BI":
+            # Inline image.
+            return PageType.COMPLEX
+        if operator in (b"re", b"l"):
+            drawings += 1
+    if drawings >= _MIN_TABLE_DRAWING_OPERATIONS:
+        return PageType.COMPLEX
+
+    if len(text.strip()) < _MIN_TEXT_LENGTH:
+        return PageType.COMPLEX
+
+    if _has_aligned_columns(page.extract_text(extraction_mode="layout")):
+        return PageType.COMPLEX
+
+    return PageType.TEXT
+
+
+def _has_images(resources, depth=0):
+    """Checks if the passed in page resources hold any images.
+
+    :param resources: The resources dictionary of a page or form.
+    :param int depth: The nesting level of the forms checked so far.
+
+    :returns: True if there is at least one image.
+    :rtype: bool
+    """
+    if resources is None or depth > 4:
+        return False
+    resources = resources.get_object()
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return False
+    xobjects = xobjects.get_object()
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            return True
+        if subtype == "/Form" and \
+                _has_images(xobject.get("/Resources"), depth + 1):
+            return True
+    return False
+
+
+def _has_aligned_columns(layout_text):
+    """Checks if the passed in text is laid out in columns like a table.
+
+    :param str layout_text: The text of the page extracted in layout mode.
+
+    :returns: True if enough consecutive lines have multiple column gaps.
+    :rtype: bool
+    """
+    rows = 0
+    for line in layout_text.splitlines():
+        if len(_COLUMN_GAP.findall(line.strip())) >= 2:
+            rows += 1
+            if rows >= _MIN_TABLE_ROWS:
+                return True
+        else:
+            rows = 0
+    return False
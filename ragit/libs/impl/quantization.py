@@ -0,0 +1,283 @@
+"""Exposes the quantized representations of the embeddings.
+
+At 1536 float32 dimensions each embedding takes 6 KB of memory; quantizing
+the embeddings trades some recall for a smaller memory footprint and faster
+scans. The supported quantizations are:
+
+- NONE: The full precision float32 vectors.
+- SQ8: Scalar quantization; each dimension is encoded as a single byte using
+  the range of the values of that dimension (4x less memory).
+- PQ: Product quantization; the vector is split to groups of 8 dimensions and
+  each group is encoded as a single byte by a trained codebook (32x less
+  memory). Supported by the FAISS provider only.
+
+The quantization of a collection is selected by the VECTOR_QUANTIZATION
+environment variable when its vector db is created. The full precision
+vectors are kept on disk (but not scanned) so the recall@k of the quantized
+search can be measured against the exact search using recall_at_k.
+"""
+
+import enum
+import os
+
+import numpy as np
+
+
+class QuantizationType(enum.Enum):
+    """Enumerates the supported quantizations of the embeddings."""
+
+    NONE = 1
+    SQ8 = 2
+    PQ = 3
+
+
+def get_quantization_type():
+    """Returns the quantization to use for new vector dbs.
+
+    The quantization is set by the VECTOR_QUANTIZATION environment variable;
+    defaults to NONE.
+
+    :return: The quantization to use.
+    :rtype: QuantizationType
+
+    :raises: ValueError
+    """
+    quantization = os.environ.get("VECTOR_QUANTIZATION") or "NONE"
+    quantization = quantization.strip().upper()
+    try:
+        return QuantizationType[quantization]
+    except KeyError:
+        raise ValueError(
+            f"VECTOR_QUANTIZATION is not valid: {quantization}. The valid "
+            f"values are {[t.name for t in QuantizationType]}"
+        ) from None
+
+
+def search(matrix, vectors, k):
+    """Finds the top k rows of the matrix for each of the vectors.
+
+    This is the exact (full precision) search used as the ground truth.
+
+    :param numpy.ndarray matrix: The normalized embeddings (n x d).
+    :param numpy.ndarray vectors: The normalized queries (m x d).
+    :param int k: The number of matches to return for each query.
+
+    :return: The scores and the row ids of the matches (m x min(k, n)),
+    sorted by descending score.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return _top_k(
+        matrix.shape[0],
+        lambda start, end: vectors @ matrix[start:end].T,
+        k
+    )
+
+
+def recall_at_k(expected_ids, retrieved_ids):
+    """Computes the recall of an approximate search.
+
+    :param numpy.ndarray expected_ids: The ids returned by the exact search
+    for each query (m x k).
+
+    :param numpy.ndarray retrieved_ids: The ids returned by the approximate
+    search for each query (m x k).
+
+    :return: The average fraction of the exact matches that were retrieved.
+    :rtype: float
+    """
+    recalls = [
+        len(set(expected) & set(retrieved)) / len(expected)
+        for expected, retrieved in zip(
+            np.asarray(expected_ids).tolist(),
+            np.asarray(retrieved_ids).tolist()
+        )
+        if len(expected)
+    ]
+    if not recalls:
+        return 1.0
+    return float(np.mean(recalls))
+
+
+def get_bytes_per_vector(quantization, dimension):
+    """Returns the memory taken by each quantized embedding.
+
+    :param QuantizationType quantization: The quantization of the embedding.
+    :param int dimension: The length of the embedding.
+
+    :return: The number of bytes of the embedding.
+    :rtype: int
+    """
+    if quantization == QuantizationType.SQ8:
+        return dimension
+    if quantization == QuantizationType.PQ:
+        return get_pq_codes_count(dimension)
+    return 4 * dimension
+
+
+def get_pq_codes_count(dimension):
+    """Returns the number of bytes of the product quantization of a vector.
+
+    :param int dimension: The length of the vectors.
+
+    :return: The number of sub vectors (each encoded by a byte); it divides
+    the dimension and each sub vector spans about 8 dimensions.
+    :rtype: int
+    """
+    target = max(1, dimension // _PQ_DIMENSIONS_PER_CODE)
+    for count in range(target, 0, -1):
+        if dimension % count == 0:
+            return count
+    return 1
+
+
+class ScalarQuantizer:
+    """Encodes each dimension of a vector as a single byte.
+
+    The range of each dimension is split to 256 equal steps; a value is
+    encoded by its step and decoded to the middle of it. The inner product
+    of a query to an encoded vector is computed directly from the codes:
+
+        q . (mins + (codes + 0.5) * scales)
+            = q . (mins + 0.5 * scales) + codes . (q * scales)
+
+    :ivar numpy.ndarray _mins: The minimum value of each dimension.
+    :ivar numpy.ndarray _scales: The size of a step of each dimension.
+    """
+
+    def __init__(self, mins, scales):
+        """Initializer.
+
+        :param numpy.ndarray mins: The minimum value of each dimension.
+        :param numpy.ndarray scales: The size of a step of each dimension.
+        """
+        self._mins = np.asarray(mins, dtype=np.float32)
+        self._scales = np.asarray(scales, dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors):
+        """Creates a quantizer for the range of the passed in vectors.
+
+        :param numpy.ndarray vectors: The vectors to train on (n x d).
+
+        :return: The trained quantizer.
+        :rtype: ScalarQuantizer
+        """
+        mins = vectors.min(axis=0)
+        maxs = vectors.max(axis=0)
+        scales = (maxs - mins) / 256
+        scales[scales == 0] = 1. / 256
+        return cls(mins, scales)
+
+    @classmethod
+    def load(cls, fullpath):
+        """Loads a quantizer stored by save.
+
+        :param str fullpath: The full path to the .npy file.
+
+        :return: The loaded quantizer or None if the file does not exist.
+        :rtype: ScalarQuantizer
+        """
+        if not os.path.isfile(fullpath):
+            return None
+        params = np.load(fullpath)
+        return cls(params[0], params[1])
+
+    def save(self, fullpath):
+        """Stores the quantizer.
+
+        :param str fullpath: The full path to the .npy file.
+        """
+        temp_path = f"{fullpath}.tmp"
+        with open(temp_path, 'wb') as fout:
+            np.save(fout, np.vstack([self._mins, self._scales]))
+        os.replace(temp_path, fullpath)
+
+    def encode(self, vectors):
+        """Encodes the passed in vectors.
+
+        Values out of the trained range are clipped to it.
+
+        :param numpy.ndarray vectors: The vectors to encode (n x d).
+
+        :return: The codes (n x d).
+        :rtype: numpy.ndarray
+        """
+        codes = np.floor((vectors - self._mins) / self._scales)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        """Decodes the passed in codes to (approximate) vectors.
+
+        :param numpy.ndarray codes: The codes to decode (n x d).
+
+        :return: The decoded vectors (n x d).
+        :rtype: numpy.ndarray
+        """
+        return self._mins + (codes.astype(np.float32) + 0.5) * self._scales
+
+    def search(self, codes, vectors, k):
+        """Finds the top k encoded rows for each of the vectors.
+
+        :param numpy.ndarray codes: The encoded embeddings (n x d).
+        :param numpy.ndarray vectors: The normalized queries (m x d).
+        :param int k: The number of matches to return for each query.
+
+        :return: The approximate scores and the row ids of the matches
+        (m x min(k, n)), sorted by descending score.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        weights = (vectors * self._scales).T
+        offsets = vectors @ (self._mins + 0.5 * self._scales)
+
+        def score(start, end):
+            """Scores a block of encoded rows."""
+            block = codes[start:end].astype(np.float32)
+            return (block @ weights).T + offsets[:, np.newaxis]
+
+        return _top_k(codes.shape[0], score, k)
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The number of rows to score at once, bounding the memory of the scores.
+_BLOCK_ROWS = 65536
+
+# The number of dimensions encoded by each byte of product quantization.
+_PQ_DIMENSIONS_PER_CODE = 8
+
+
+def _top_k(count, score, k):
+    """Finds the top k rows for each query scoring the rows in blocks.
+
+    :param int count: The number of rows.
+
+    :param callable score: Returns the scores of the queries (m x rows) for
+    the rows between the passed in start and end.
+
+    :param int k: The number of matches to return for each query.
+
+    :return: The scores and the row ids of the matches (m x min(k, count)),
+    sorted by descending score.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    best_scores = None
+    best_ids = None
+    for start in range(0, count, _BLOCK_ROWS):
+        end = min(start + _BLOCK_ROWS, count)
+        scores = score(start, end)
+        ids = np.broadcast_to(np.arange(start, end), scores.shape)
+        if best_scores is not None:
+            scores = np.hstack([best_scores, scores])
+            ids = np.hstack([best_ids, ids])
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            ids = np.take_along_axis(ids, top, axis=1)
+        best_scores, best_ids = scores, ids
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best_scores, order, axis=1),
+        np.take_along_axis(best_ids, order, axis=1)
+    )
@@ -1,11 +1,54 @@
-"""Executes a query using the vector database."""
-
+"""Executes a query using the vector database.
+
+The matches of a question are retrieved either by the embeddings search of
+the vector db (VECTOR retrieval mode) or by fusing it with the BM25 search of
+the lexical index (HYBRID retrieval mode) using reciprocal rank fusion. The
+retrieval mode is set by the RETRIEVAL_MODE environment variable; in hybrid
+mode the lexical search runs concurrently with the embeddings retrieval and
+search, so the latency is the slowest of the two instead of their sum.
+
+The retrieval over-fetches the matches so the near duplicates can be dropped
+(and the rest optionally re-ranked by MMR) by the context_selector without
+leaving empty slots in the prompt. The selected matches are then packed by
+the context_packer into the token budget of the prompt, so at most k matches
+are passed to the LLM and fewer (the last one truncated) when they are too
+long for the budget.
+
+The executor is warmed up (see warm_up) when the service starts, without
+paying for an LLM query: the vector db and the lexical index are loaded by
+dummy searches, the token encoding is loaded and a connection to the LLM
+endpoint is opened (and kept alive by the client) by retrieving the model.
+
+A rebuilt vector db is switched to by reload while the queries are running;
+the queries already retrieving from the previous vector db complete with it
+and it is closed after a grace period.
+
+The python code of the answers (that the LLM sometimes returns without its
+indentation) is re-indented locally by the code_formatter; only the code
+blocks it cannot format are sent back to the LLM, concurrently. The
+formatting can be skipped per query (format_code=False).
+"""
+
+import asyncio
+import concurrent.futures
 import dataclasses
+import enum
+import itertools
 import logging
+import httpx
 import openai
+import os
 import re
+import threading
 
 import ragit.libs.common as common
+import ragit.libs.impl.code_formatter as code_formatter
+import ragit.libs.impl.context_packer as context_packer
+import ragit.libs.impl.context_selector as context_selector
+import ragit.libs.impl.embeddings_retriever as embeddings_retriever
+import ragit.libs.impl.lexical_index as lexical_index
+import ragit.libs.impl.rank_fusion as rank_fusion
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
 import ragit.libs.impl.vdb_factory as vector_db
 
 #DEFAULT_MODEL = "o1-preview"
@@ -29,6 +72,7 @@ class QueryResponse:
     str prompt: The prompt used in the query.
     list[str] matches: The list of the matches used in the query.
     str model_name: The name of the model used in the query.
+    int prompt_tokens: The number of the tokens of the prompt.
     """
 
     response: str
@@ -38,17 +82,82 @@ class QueryResponse:
     prompt: str
     matches: list[str]
     model_name: str
+    prompt_tokens: int = 0
+
+
+class RetrievalMode(enum.Enum):
+    """Enumerates the ways to retrieve the matches of a question."""
+
+    VECTOR = 1
+    HYBRID = 2
+
+
+def get_retrieval_mode():
+    """Returns the retrieval mode to use.
+
+    The retrieval mode is set by the RETRIEVAL_MODE environment variable;
+    defaults to VECTOR.
+
+    :return: The retrieval mode to use.
+    :rtype: RetrievalMode
+
+    :raises: ValueError
+    """
+    retrieval_mode = os.environ.get("RETRIEVAL_MODE") or "VECTOR"
+    retrieval_mode = retrieval_mode.strip().upper()
+    try:
+        return RetrievalMode[retrieval_mode]
+    except KeyError:
+        raise ValueError(
+            f"RETRIEVAL_MODE is not valid: {retrieval_mode}. The valid "
+            f"values are {[m.name for m in RetrievalMode]}"
+        ) from None
 
 
 @common.handle_exceptions
-def initialize(fullpath_to_db, collection_name, model_name=DEFAULT_MODEL):
+def initialize(fullpath_to_db, collection_name, model_name=DEFAULT_MODEL,
+               embedder=None, lexical_index_fullpath=None,
+               retrieval_mode=None):
     """Initializes the executor.
 
     :param str fullpath_to_db: The full path to the database file to query.
     :param str collection_name: The name of the collection to query.
     :param str  model_name: The name of the model to use.
+
+    :param callable embedder: Returns the embeddings to search for a
+    question; if None embeddings_retriever.get_query_embeddings is used.
+
+    :param str lexical_index_fullpath: The full path to the lexical index
+    used by the hybrid retrieval; if None the retrieval is always by vector.
+
+    :param RetrievalMode retrieval_mode: The retrieval mode; if None it is
+    read from the environment.
+    """
+    _QueryExecutor.initialize(
+        fullpath_to_db, collection_name, model_name, embedder,
+        lexical_index_fullpath, retrieval_mode
+    )
+
+
+@common.handle_exceptions
+def reload(fullpath_to_db, lexical_index_fullpath=None):
+    """Switches the executor to another vector db without restarting.
+
+    :param str fullpath_to_db: The full path to the database file to query.
+    :param str lexical_index_fullpath: The full path to the lexical index
+    used by the hybrid retrieval; if None the retrieval is always by vector.
     """
-    _QueryExecutor.initialize(fullpath_to_db, collection_name, model_name)
+    _QueryExecutor.reload(fullpath_to_db, lexical_index_fullpath)
+
+
+@common.handle_exceptions
+def warm_up():
+    """Prepares the executor for its first query without querying the LLM.
+
+    The failure to connect to the LLM is logged but not raised so the
+    service can start while the LLM is unavailable.
+    """
+    _QueryExecutor.warm_up()
 
 
 @common.handle_exceptions
@@ -58,13 +167,20 @@ def close():
 
 
 @common.handle_exceptions
-def query(question, k=None, temperature=None, max_tokens=None):
+def query(question, k=None, temperature=None, max_tokens=None,
+          filters=None, embeddings=None, format_code=True):
     """Uses the RAG collection to enhance the LLM to answer the question.
 
     :param str question: The question to answer.
     :param int k: The number of vector matches to use.
     :param float temperature: The temperature to use for the query.
     :param float max_tokens: The max_tokens to use for the query.
+    :param SearchFilter | dict filters: Restricts the matches to the chunks
+    with the matching metadata (see vdb_abstract_base.validate_filters).
+    :param list[float] embeddings: The embeddings of the question; if None
+    they are retrieved.
+    :param bool format_code: If False the python code of the response is
+    not formatted.
 
     :return: An instance of the QueryResponse.
     :rtype: QueryResponse
@@ -73,27 +189,451 @@ def query(question, k=None, temperature=None, max_tokens=None):
         question,
         k=k,
         temperature=temperature,
-        max_tokens=max_tokens
+        max_tokens=max_tokens,
+        filters=filters,
+        embeddings=embeddings,
+        format_code=format_code
+    )
+
+
+@common.handle_exceptions
+def get_query_embeddings(question):
+    """Returns the embeddings to search for the question.
+
+    :param str question: The question to find matches for.
+
+    :return: The embeddings of the question (by the embedder of the
+    executor).
+    :rtype: list[float]
+    """
+    return _QueryExecutor.get_query_embeddings(question)
+
+
+@common.handle_exceptions
+def get_model_name():
+    """Returns the name of the model answering the queries.
+
+    :return: The name of the model of the executor.
+    :rtype: str
+    """
+    return _QueryExecutor.get_model_name()
+
+
+@common.handle_exceptions
+def stream_query(question, k=None, temperature=None, max_tokens=None,
+                 filters=None, embeddings=None, format_code=True):
+    """Uses the RAG collection to stream the answer of the LLM.
+
+    The retrieval runs and the request to the LLM is sent when called, so
+    the returned generator only streams the response.
+
+    :param str question: The question to answer.
+    :param int k: The number of vector matches to use.
+    :param float temperature: The temperature to use for the query.
+    :param float max_tokens: The max_tokens to use for the query.
+    :param SearchFilter | dict filters: Restricts the matches to the chunks
+    with the matching metadata (see vdb_abstract_base.validate_filters).
+    :param list[float] embeddings: The embeddings of the question; if None
+    they are retrieved.
+    :param bool format_code: If False the python code of the response is
+    not formatted.
+
+    :return: A generator yielding the text of the response as it is
+    generated (str) and finally the complete QueryResponse.
+    :rtype: Iterator[str | QueryResponse]
+    """
+    stream = _QueryExecutor.execute_streaming_query(
+        question,
+        k=k,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        filters=filters,
+        embeddings=embeddings,
+        format_code=format_code
+    )
+    first = next(stream)
+    return itertools.chain([first], stream)
+
+
+def make_async_client(max_connections=None):
+    """Creates an async OpenAI client keeping its connections alive.
+
+    :param int max_connections: The maximum (kept alive) connections to the
+    LLM; if None a default is used.
+
+    :rtype: openai.AsyncOpenAI
+    """
+    max_connections = max_connections or _MAX_CONNECTIONS
+    return openai.AsyncOpenAI(
+        http_client=openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
     )
 
 
+class AsyncQueryExecutor:
+    """Executes the queries of a collection without blocking the event loop.
+
+    Unlike the module level functions (which share a single collection per
+    process) each instance owns its vector db and lexical index, so many
+    collections can be queried by the same process. The async OpenAI client
+    (whose connections are kept alive and reused by the concurrent queries)
+    is either owned or shared by the executors of the collections. The
+    embeddings and the chat completions are awaited while the (synchronous)
+    vector db and lexical searches run in threads.
+
+    :ivar vector_db.AbstractVectorDb _vdb: The vector database.
+    :ivar lexical_index.LexicalIndex _lexical_index: The lexical index or
+    None.
+    :ivar openai.AsyncOpenAI _client: The client to the LLM.
+    :ivar bool _owns_client: True if the client is closed by the executor.
+    :ivar str _model_name: The name of the model to use.
+    :ivar callable _embedder: Returns (awaitable) the embeddings of a
+    question.
+    :ivar RetrievalMode _retrieval_mode: The retrieval mode.
+    :ivar float _mmr_lambda: The weight of the relevance for MMR or None.
+    :ivar str _collection_name: The name of the collection to query.
+    """
+
+    def __init__(self, fullpath_to_db, collection_name,
+                 model_name=DEFAULT_MODEL, embedder=None,
+                 lexical_index_fullpath=None, retrieval_mode=None,
+                 max_connections=None, client=None):
+        """Initializer.
+
+        :param str fullpath_to_db: The full path to the database file to query.
+        :param str collection_name: The name of the collection to query.
+        :param str model_name: The name of the model to use.
+
+        :param callable embedder: An async function returning the embeddings
+        to search for a question; if None the embeddings are retrieved by
+        the client of the executor.
+
+        :param str lexical_index_fullpath: The full path to the lexical index
+        used by the hybrid retrieval; if None the retrieval is always by
+        vector.
+
+        :param RetrievalMode retrieval_mode: The retrieval mode; if None it is
+        read from the environment.
+
+        :param int max_connections: The maximum (kept alive) connections to
+        the LLM; if None a default is used.
+
+        :param openai.AsyncOpenAI client: The client to the LLM shared with
+        other executors (see make_async_client), which is not closed by the
+        executor; if None the executor creates its own client.
+        """
+        self._model_name = model_name
+        self._embedder = embedder
+        self._collection_name = collection_name
+        self._retrieval_mode = retrieval_mode or get_retrieval_mode()
+        self._mmr_lambda = context_selector.get_mmr_lambda()
+        self._vdb, self._lexical_index = _open_retrievers(
+            fullpath_to_db, collection_name, lexical_index_fullpath
+        )
+        self._owns_client = client is None
+        try:
+            self._client = client or make_async_client(max_connections)
+        except Exception:
+            self._vdb.close()
+            if self._lexical_index:
+                self._lexical_index.close()
+            raise
+
+    def get_model_name(self):
+        """Returns the name of the model answering the queries.
+
+        :return: The name of the model of the executor.
+        :rtype: str
+        """
+        return self._model_name
+
+    async def get_query_embeddings(self, question):
+        """Returns the embeddings to search for the question.
+
+        :param str question: The question to find matches for.
+
+        :return: The embeddings of the question.
+        :rtype: list[float]
+        """
+        if self._embedder:
+            return await self._embedder(question)
+        return await embeddings_retriever.get_query_embeddings_async(
+            question, self._client
+        )
+
+    async def retrieve(self, question, k, filters=None, embeddings=None):
+        """Retrieves the matches of the question without near duplicates.
+
+        :param str question: The question to find matches for.
+        :param int k: The number of matches to return.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+
+        :return: The (text, score, source, page) of each match.
+        :rtype: list[tuple]
+        """
+        filters = abstract_vector_db.validate_filters(filters)
+        vdb, lexical = self._vdb, self._lexical_index
+        if self._retrieval_mode != RetrievalMode.HYBRID:
+            lexical = None
+        candidates_count = _get_candidates_count(k, lexical)
+        lexical_task = None
+        if lexical is not None:
+            lexical_task = asyncio.create_task(
+                asyncio.to_thread(
+                    lexical.search, question, candidates_count, filters
+                )
+            )
+        try:
+            if embeddings is None:
+                embeddings = await self.get_query_embeddings(question)
+            matches = await asyncio.to_thread(
+                vdb.search_by_vector, embeddings, candidates_count, filters
+            )
+            lexical_matches = None
+            if lexical_task is not None:
+                lexical_matches = await lexical_task
+        finally:
+            if lexical_task is not None:
+                _discard_task(lexical_task)
+        return _select_matches(matches, lexical_matches, k, self._mmr_lambda)
+
+    async def query(self, question, k=None, temperature=None,
+                    max_tokens=None, filters=None, embeddings=None,
+                    format_code=True):
+        """Uses the RAG collection to enhance the LLM to answer the question.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+        :param bool format_code: If False the python code of the response
+        is not formatted.
+
+        :return: An instance of the QueryResponse.
+        :rtype: QueryResponse
+        """
+        k, temperature, max_tokens, matches, user_prompt = \
+            await self._prepare_query(
+                question, k, temperature, max_tokens, filters, embeddings
+            )
+        response = await self._client.chat.completions.create(
+            **_get_completion_args(
+                user_prompt, temperature, max_tokens, self._model_name
+            )
+        )
+        return await self._make_response(
+            response.choices[0].message.content,
+            temperature, max_tokens, k, user_prompt, matches, format_code
+        )
+
+    async def stream_query(self, question, k=None, temperature=None,
+                           max_tokens=None, filters=None, embeddings=None,
+                           format_code=True):
+        """Streams the answer of the LLM to the question as it is generated.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+        :param bool format_code: If False the python code of the response
+        is not formatted.
+
+        :yield: The text of the response as it is generated (str) and finally
+        the complete response (QueryResponse).
+        """
+        k, temperature, max_tokens, matches, user_prompt = \
+            await self._prepare_query(
+                question, k, temperature, max_tokens, filters, embeddings
+            )
+        stream = await self._client.chat.completions.create(
+            stream=True,
+            **_get_completion_args(
+                user_prompt, temperature, max_tokens, self._model_name
+            )
+        )
+        parts = []
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        yield await self._make_response(
+            "".join(parts), temperature, max_tokens, k, user_prompt, matches,
+            format_code
+        )
+
+    async def warm_up(self):
+        """Prepares the executor for its first query without querying the LLM.
+
+        The failure to connect to the LLM is logged but not raised.
+        """
+        await asyncio.to_thread(
+            _warm_up_retrievers, self._vdb, self._lexical_index,
+            self._model_name
+        )
+        try:
+            await self._client.with_options(
+                timeout=_WARM_UP_TIMEOUT, max_retries=0
+            ).models.retrieve(self._model_name)
+        except Exception as ex:
+            logger.warning("Failed to connect to the LLM: %s", ex)
+
+    def reload(self, fullpath_to_db, lexical_index_fullpath=None):
+        """Switches to another vector db and lexical index.
+
+        The replaced ones are closed after a grace period so the queries
+        using them can complete.
+
+        :param str fullpath_to_db: The full path to the database file to query.
+        :param str lexical_index_fullpath: The full path to the lexical index.
+        """
+        vdb, lexical = _open_retrievers(
+            fullpath_to_db, self._collection_name, lexical_index_fullpath
+        )
+        replaced = [r for r in (self._vdb, self._lexical_index) if r]
+        self._vdb, self._lexical_index = vdb, lexical
+        _close_replaced_later(replaced)
+
+    async def _substitute_python_code(self, content):
+        """Formats the python code of the content.
+
+        The code blocks that cannot be formatted locally are formatted by
+        the LLM concurrently.
+
+        :param str content: The content to substitute python code if needed.
+
+        :returns: The content with proper python code formatting.
+        :rtype: str
+        """
+        spans, blocks = _format_python_blocks(content)
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        if missing:
+            formatted = await asyncio.gather(*(
+                self._format_python_code(
+                    _get_internal_python_code(
+                        content[spans[i][0]:spans[i][1]]
+                    )
+                )
+                for i in missing
+            ))
+            for i, block in zip(missing, formatted):
+                blocks[i] = block
+        return _replace_python_blocks(content, spans, blocks)
+
+    async def _format_python_code(self, python_code):
+        """Formats the passed in python code by the LLM.
+
+        :param str python_code: The python code to format.
+
+        :returns: The formatted python code in markdown or an empty string.
+        :rtype: str
+        """
+        response = await self._client.chat.completions.create(
+            **_get_format_args(python_code, self._model_name)
+        )
+        return _get_python_markdown(response.choices[0].message.content)
+
+    async def close(self):
+        """Closes the vector db, the lexical index and the owned client."""
+        if self._owns_client:
+            await self._client.close()
+        self._vdb.close()
+        if self._lexical_index:
+            self._lexical_index.close()
+
+    async def _prepare_query(self, question, k, temperature, max_tokens,
+                             filters, embeddings=None):
+        """Retrieves the matches and builds the prompt of a question.
+
+        :return: The k, temperature and max tokens to use (defaults applied),
+        the matches and the prompt.
+        :rtype: tuple
+        """
+        k, temperature, max_tokens = _get_query_settings(
+            k, temperature, max_tokens
+        )
+        candidates = await self.retrieve(question, k, filters, embeddings)
+        matches = _pack_matches(
+            question, candidates, max_tokens, self._model_name
+        )
+        user_prompt = _make_user_prompt(question, matches)
+        return k, temperature, max_tokens, matches, user_prompt
+
+    async def _make_response(self, response_content, temperature, max_tokens,
+                             k, user_prompt, matches, format_code=True):
+        """Creates the QueryResponse of a completed query.
+
+        :return: The response of the query.
+        :rtype: QueryResponse
+        """
+        if format_code:
+            response_content = await self._substitute_python_code(
+                response_content
+            )
+        return QueryResponse(
+            response=response_content,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            matches_count=len(matches),
+            prompt=user_prompt,
+            matches=matches,
+            model_name=self._model_name,
+            prompt_tokens=context_packer.count_tokens(
+                user_prompt, context_packer.get_encoding(self._model_name)
+            )
+        )
+
+
 # Whatever follows this line is private to the module and should not be
 # used from the outside.
 
+# The retrieval returns this many times the requested matches so the near
+# duplicates can be dropped.
+_OVERFETCH_FACTOR = 2
 
-class _QueryExecutor:
-    """Manages the LLM session to get a RAG response.
+# In hybrid mode each retriever returns this many times the over-fetched
+# matches so the fusion can promote matches ranked low by one of them.
+_HYBRID_CANDIDATES_FACTOR = 2
 
-    :cvar vector_db.AbstractVectorDb _vdb: The vector database.
-    :cvar OpenAI _openai_client: The OpenAI client to use.
-    :cvar str _model_name: The name of the model to use.
-    """
+# The number of lexical searches that can run concurrently.
+_RETRIEVAL_WORKERS_COUNT = 4
 
-    _vdb = None
-    _openai_client = None
-    _model_name = None
+# The default maximum connections of the async client of the LLM.
+_MAX_CONNECTIONS = 100
+
+# The maximum number of the python code blocks formatted concurrently by the
+# LLM.
+_FORMAT_WORKERS_COUNT = 4
+
+# The seconds to wait for the LLM endpoint when warming up.
+_WARM_UP_TIMEOUT = 10.
+
+# The question searched by the lexical index when warming up.
+_WARM_UP_QUERY = "warm up"
+
+# The seconds the replaced retrievers stay open for the running queries.
+_RELOAD_GRACE_SECONDS = 60
 
-    _USER_PROMPT = """
+# The prompt answering a question from its matches.
+_USER_PROMPT = """
         Based on the following documents answer the question that follows.
         You must provide a confidence level as a percentage ranging from 0 for
         most inaccurate to 100 for most accurate answer.  The confidence level
@@ -108,7 +648,8 @@ class _QueryExecutor:
         {context}
     """
 
-    _FORMAT_PYTHON_PROMPT = """
+# The prompt formatting the python code the code_formatter could not.
+_FORMAT_PYTHON_PROMPT = """
     Reformat the passed in the <code> tags python code adding to it the
     proper indentation and return to me the proper code in markdown format:
     <code>
@@ -117,6 +658,285 @@ class _QueryExecutor:
 
     """
 
+
+def _get_candidates_count(k, lexical):
+    """Returns the number of candidates each retriever returns.
+
+    :param int k: The number of matches to return.
+    :param lexical_index.LexicalIndex lexical: The lexical index of the
+    hybrid retrieval or None to retrieve by vector only.
+
+    :return: The number of candidates.
+    :rtype: int
+    """
+    candidates_count = k * _OVERFETCH_FACTOR
+    if lexical is not None:
+        candidates_count *= _HYBRID_CANDIDATES_FACTOR
+    return candidates_count
+
+
+def _discard_task(task):
+    """Cancels a task whose outcome is no longer needed.
+
+    The exception of a task that already failed is marked as retrieved so
+    that it is not reported.
+
+    :param asyncio.Task task: The task to discard.
+    """
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+def _select_matches(matches, lexical_matches, k, mmr_lambda):
+    """Fuses the retrieved matches and drops their near duplicates.
+
+    :param list[tuple] matches: The matches of the vector search.
+    :param list[tuple] lexical_matches: The matches of the lexical search or
+    None to retrieve by vector only.
+    :param int k: The number of matches to return.
+    :param float mmr_lambda: The weight of the relevance for MMR or None.
+
+    :return: The (text, score, source, page) of each match.
+    :rtype: list[tuple]
+    """
+    if lexical_matches is not None:
+        matches = rank_fusion.reciprocal_rank_fusion(
+            [matches, lexical_matches], k * _OVERFETCH_FACTOR
+        )
+    return context_selector.select_matches(matches, k, mmr_lambda)
+
+
+def _get_query_settings(k, temperature, max_tokens):
+    """Applies the defaults to the unassigned settings of a query.
+
+    :param int k: The number of matches to return.
+    :param float temperature: The temperature to use for the query.
+    :param float max_tokens: The max_tokens to use for the query.
+
+    :return: The k, temperature and max tokens to use.
+    :rtype: tuple
+    """
+    if not k:
+        k = _DEFAULT_MATCHES_COUNT
+
+    if not max_tokens:
+        max_tokens = _DEFAULT_MAX_TOKENS
+
+    if not temperature:
+        temperature = _DEFAULT_TEMPERATURE
+
+    return k, temperature, max_tokens
+
+
+def _pack_matches(question, candidates, max_tokens, model_name):
+    """Selects the candidate matches filling the token budget.
+
+    :param str question: The question to ask.
+    :param list[tuple] candidates: The candidate matches sorted by
+    descending relevance.
+    :param int max_tokens: The tokens reserved for the response.
+    :param str model_name: The model answering the question.
+
+    :return: The matches to use as the context (see
+    context_packer.pack_matches).
+    :rtype: list[tuple]
+    """
+    encoding = context_packer.get_encoding(model_name)
+    reserved_tokens = context_packer.count_tokens(
+        _make_user_prompt(question, []), encoding
+    )
+    # The tokens of the title and the separator of each match.
+    separator_tokens = context_packer.count_tokens(
+        _make_user_prompt(question, [("",)]), encoding
+    ) - reserved_tokens
+    budget = context_packer.get_available_tokens(
+        model_name, max_tokens, reserved_tokens
+    )
+    return context_packer.pack_matches(
+        candidates, budget, encoding, separator_tokens
+    )
+
+
+def _make_user_prompt(question, matches):
+    """Builds the prompt of a question from its matches.
+
+    :param str question: The question to ask.
+    :param list[tuple] matches: The matches to use as the context.
+
+    :return: The prompt to send to the LLM.
+    :rtype: str
+    """
+    context_lines = []
+    context_lines.append("")
+    for doc_index, match in enumerate(matches):
+        context_lines.append(f"\n\nDocument {doc_index + 1}.")
+        context_lines.append(f"{match[0]}")
+        context_lines.append("*" * 80)
+    context = '\n'.join(context_lines)
+
+    return _USER_PROMPT.format(context=context, question=question)
+
+
+def _get_completion_args(user_prompt, temperature, max_tokens, model_name):
+    """Returns the arguments of the chat completion for the prompt.
+
+    :param str user_prompt: The prompt to send.
+    :param float temperature: The temperature to use for the query.
+    :param float max_tokens: The max_tokens to use for the query.
+    :param str model_name: The model to use.
+
+    :return: The keyword arguments of chat.completions.create.
+    :rtype: dict
+    """
+    args = {
+        "model": model_name,
+        "messages": [
+            {"role": "user", "content": user_prompt},
+        ],
+    }
+    # Since the openai API differs in the max_completion_tokens
+    # the following is a workaround.
+    if model_name == "o1-preview":
+        args["max_completion_tokens"] = max_tokens
+    else:
+        args["temperature"] = temperature
+        args["max_tokens"] = max_tokens
+    return args
+
+
+def _get_format_args(python_code, model_name):
+    """Returns the arguments of the chat completion formatting code.
+
+    :param str python_code: The python code to format.
+    :param str model_name: The model to use; if None the default model.
+
+    :return: The keyword arguments of chat.completions.create.
+    :rtype: dict
+    """
+    user_prompt = _FORMAT_PYTHON_PROMPT.format(python_code=python_code)
+    return {
+        "model": model_name or DEFAULT_MODEL,
+        "messages": [
+            {"role": "user", "content": user_prompt},
+        ],
+    }
+
+
+def _get_python_markdown(resp):
+    """Returns the python code block of a response of the LLM.
+
+    :param str resp: The response of the LLM.
+
+    :returns: The python code in markdown or an empty string.
+    :rtype: str
+    """
+    match = re.search(r'```python(.*?)```', resp or "", re.DOTALL)
+    if match:
+        return match.group(0).strip()
+    else:
+        return ""
+
+
+def _format_python_blocks(content):
+    """Formats locally the python code blocks of the content.
+
+    :param str content: The content containing the python code.
+
+    :returns: The (start, end) positions of the python code blocks and
+    their formatted markdown (None for the ones that could not be
+    formatted locally).
+    :rtype: tuple[list[tuple[int, int]], list[str | None]]
+    """
+    spans = [
+        (match.start(), match.end())
+        for match in re.finditer(r'```python.*?```', content, re.DOTALL)
+    ]
+    blocks = []
+    for start, end in spans:
+        python_code = code_formatter.format_code(
+            _get_internal_python_code(content[start:end])
+        )
+        if python_code is None:
+            blocks.append(None)
+        else:
+            blocks.append(f"```python\n{python_code}\n```")
+    return spans, blocks
+
+
+def _replace_python_blocks(content, spans, blocks):
+    """Replaces the python code blocks of the content.
+
+    :param str content: The content containing the python code.
+    :param list[tuple[int, int]] spans: The positions of the blocks.
+    :param list[str] blocks: The formatted blocks; the ones that are
+    empty keep the original code.
+
+    :returns: The content with the formatted blocks.
+    :rtype: str
+    """
+    parts = []
+    pos = 0
+    for (start, end), block in zip(spans, blocks):
+        parts.append(content[pos:start])
+        parts.append(block or content[start:end])
+        pos = end
+    parts.append(content[pos:])
+    return "".join(parts)
+
+
+def _get_internal_python_code(txt):
+    """Extracts the pure python code from markdown.
+
+    :param str txt: The passed in text that contains the python code. Note
+    that we expect only one chunk of code to exist in the txt and also
+    this code must be enclosed in markdown tags.
+
+    We expect the txt to be passed as follows:
+
+    ```python
+    def foo()...
+        ....
+    ```
+
+    The objective of this function is to strip the markdown and return
+    the clear python code.
+
+    :returns: The "clear" python code without the tags.
+    :rtype: str
+    """
+    txt = txt.strip()
+    txt = txt.replace("```python", '').replace("```", "")
+    return txt
+
+
+
+class _QueryExecutor:
+    """Manages the LLM session to get a RAG response.
+
+    :cvar vector_db.AbstractVectorDb _vdb: The vector database.
+    :cvar OpenAI _openai_client: The OpenAI client to use.
+    :cvar str _model_name: The name of the model to use.
+    :cvar callable _embedder: Returns the embeddings of a question.
+    :cvar lexical_index.LexicalIndex _lexical_index: The lexical index.
+    :cvar RetrievalMode _retrieval_mode: The retrieval mode.
+    :cvar concurrent.futures.ThreadPoolExecutor _retrieval_pool: Runs the
+    lexical searches of the hybrid retrieval.
+    :cvar float _mmr_lambda: The weight of the relevance for MMR or None.
+    :cvar str _collection_name: The name of the collection to query.
+    """
+
+    _vdb = None
+    _openai_client = None
+    _model_name = None
+    _embedder = None
+    _lexical_index = None
+    _retrieval_mode = RetrievalMode.VECTOR
+    _retrieval_pool = None
+    _mmr_lambda = None
+    _collection_name = None
+
     @classmethod
     def _format_python_code(cls, python_code):
         """Formats the passed in python code.
@@ -144,98 +964,147 @@ class _QueryExecutor:
             return a
         ```
         """
-        user_prompt = cls._FORMAT_PYTHON_PROMPT.format(
-            python_code=python_code
-        )
-
         if not cls._openai_client:
             cls._openai_client = openai.OpenAI()
 
         response = cls._openai_client.chat.completions.create(
-            model=cls._model_name or DEFAULT_MODEL,
-            messages=[
-                {"role": "user", "content": user_prompt},
-            ],
+            **_get_format_args(python_code, cls._model_name)
         )
-
-        resp = response.choices[0].message.content
-        match = re.search(r'```python(.*?)```', resp, re.DOTALL)
-        if match:
-            return match.group(0).strip()
-        else:
-            return ""
+        return _get_python_markdown(response.choices[0].message.content)
 
     @classmethod
-    def _substitute_python_code(cls, content):
+    def _substitute_python_code(cls, content, format_code=True):
         """If the content contains python code reformat it.
 
+        The code blocks are formatted locally; the ones that cannot be
+        formatted locally are formatted by the LLM concurrently.
+
         :param str content: The content to substitute python code if needed.
+        :param bool format_code: If False the content is returned as is.
 
         :returns: The content with proper python code formatting if needed.
         :rtype: str
         """
-        text = content
-        code_blocks = [
-            (match.start(), match.end())
-            for match in re.finditer(r'```python.*?```', text, re.DOTALL)
-        ]
-        formatted_code = []
-        pos = 0
-        surrounding_code = []
-        for (start, end) in code_blocks:
-            surrounding_code.append(content[pos:start])
-            pos = end
-            txt = text[start: end]
-            python_code = cls._get_internal_python_code(txt)
-            python_code = cls._format_python_code(python_code)
-            formatted_code.append(python_code)
-
-        surrounding_code.append(content[pos:-1])
-
-        final_txt = ''
-        for index, c in enumerate(formatted_code):
-            final_txt += surrounding_code[index]
-            final_txt += c
-        final_txt += surrounding_code[-1]
-
-        return final_txt
+        if not format_code:
+            return content
+        spans, blocks = _format_python_blocks(content)
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        if missing:
+            codes = [
+                _get_internal_python_code(
+                    content[spans[i][0]:spans[i][1]]
+                )
+                for i in missing
+            ]
+            workers = min(len(missing), _FORMAT_WORKERS_COUNT)
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix="code-format") as pool:
+                formatted = pool.map(cls._format_python_code, codes)
+                for i, block in zip(missing, formatted):
+                    blocks[i] = block
+        return _replace_python_blocks(content, spans, blocks)
 
     @classmethod
-    def _get_internal_python_code(cls, txt):
-        """Extracts the pure python code from markdown.
+    def execute_query(cls, question, k=None, temperature=0.2, max_tokens=None,
+                      filters=None, embeddings=None, format_code=True):
+        """Executes a query getting a RAG response.
 
-        :param str txt: The passed in text that contains the python code. Note
-        that we expect only one chunk of code to exist in the txt and also
-        this code must be enclosed in markdown tags.
+        :param str question: The question to ask.
+        :param int k: The number of matches to return.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+        :param bool format_code: If False the python code of the response
+        is not formatted.
 
-        We expect the txt to be passed as follows:
+        :return: An instance of the QueryResponse.
+        :rtype: QueryResponse
 
-        ```python
-        def foo()...
-            ....
-        ```
+        :raises ValueError
+        """
+        k, temperature, max_tokens, matches, user_prompt = cls._prepare_query(
+            question, k, temperature, max_tokens, filters, embeddings
+        )
+        response = cls._openai_client.chat.completions.create(
+            **_get_completion_args(
+                user_prompt, temperature, max_tokens, cls._model_name
+            )
+        )
+        response_content = response.choices[0].message.content
+        return cls._make_response(
+            response_content, temperature, max_tokens, k, user_prompt, matches,
+            format_code
+        )
 
-        The objective of this function is to strip the markdown and return
-        the clear python code.
+    @classmethod
+    def execute_streaming_query(cls, question, k=None, temperature=0.2,
+                                max_tokens=None, filters=None,
+                                embeddings=None, format_code=True):
+        """Executes a query streaming the RAG response as it is generated.
 
-        :returns: The "clear" python code without the tags.
-        :rtype: str
+        The matches are retrieved and the prompt is validated before the
+        first item is yielded.
+
+        :param str question: The question to ask.
+        :param int k: The number of matches to return.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+        :param bool format_code: If False the python code of the response
+        is not formatted.
+
+        :yield: The text of the response as it is generated (str) and finally
+        the complete response (QueryResponse).
+
+        :raises ValueError
         """
-        txt = txt.strip()
-        txt = txt.replace("```python", '').replace("```", "")
-        return txt
+        k, temperature, max_tokens, matches, user_prompt = cls._prepare_query(
+            question, k, temperature, max_tokens, filters, embeddings
+        )
+        stream = cls._openai_client.chat.completions.create(
+            stream=True,
+            **_get_completion_args(
+                user_prompt, temperature, max_tokens, cls._model_name
+            )
+        )
+        parts = []
+        with stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        yield cls._make_response(
+            "".join(parts), temperature, max_tokens, k, user_prompt, matches,
+            format_code
+        )
 
     @classmethod
-    def execute_query(cls, question, k=None, temperature=0.2, max_tokens=None):
-        """Executes a query getting a RAG response.
+    def _prepare_query(cls, question, k, temperature, max_tokens, filters,
+                       embeddings=None):
+        """Retrieves the matches and builds the prompt of a question.
 
         :param str question: The question to ask.
         :param int k: The number of matches to return.
         :param float temperature: The temperature to use for the query.
         :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
 
-        :return: An instance of the QueryResponse.
-        :rtype: QueryResponse
+        :return: The k, temperature and max tokens to use (defaults applied),
+        the matches and the prompt.
+        :rtype: tuple
 
         :raises ValueError
         """
@@ -251,82 +1120,121 @@ class _QueryExecutor:
             logger.error("No model name was assigned for the query.")
             raise ValueError("No Model name.")
 
-        if not k:
-            k = _DEFAULT_MATCHES_COUNT
-
-
-        if not max_tokens:
-            max_tokens = _DEFAULT_MAX_TOKENS
-
-        matches = cls._vdb.query(question, k)
-
-        context_lines = []
-        context_lines.append("")
-        for doc_index in range(k):
-            context_lines.append(f"\n\nDocument {doc_index + 1}.")
-            context_lines.append(f"{matches[doc_index][0]}")
-            context_lines.append("*" * 80)
-        context = '\n'.join(context_lines)
-
-        user_prompt = cls._USER_PROMPT.format(
-            context=context, question=question
+        k, temperature, max_tokens = _get_query_settings(
+            k, temperature, max_tokens
         )
+        candidates = cls._retrieve(question, k, filters, embeddings)
+        matches = _pack_matches(
+            question, candidates, max_tokens, cls._model_name
+        )
+        user_prompt = _make_user_prompt(question, matches)
+        return k, temperature, max_tokens, matches, user_prompt
 
-        if not max_tokens:
-            max_tokens = _DEFAULT_MAX_TOKENS
-
-        if not temperature:
-            temperature = _DEFAULT_TEMPERATURE
-
-        # Since the openai API differs in the max_completion_tokens
-        # the following is a workaround.
-        if cls._model_name == "o1-preview":
-            response = cls._openai_client.chat.completions.create(
-                model=cls._model_name,
-                messages=[
-                    {"role": "user", "content": user_prompt},
-                ],
-                max_completion_tokens=max_tokens
-
-            )
-        else:
-            response = cls._openai_client.chat.completions.create(
-                model=cls._model_name,
-                messages=[
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-
-        response_content = response.choices[0].message.content
-
+    @classmethod
+    def _make_response(cls, response_content, temperature, max_tokens, k,
+                       user_prompt, matches, format_code=True):
+        """Creates the QueryResponse of a completed query.
+
+        :param str response_content: The text generated by the LLM.
+        :param float temperature: The temperature used in the query.
+        :param int max_tokens: The max tokens used in the query.
+        :param int k: The number of matches requested.
+        :param str user_prompt: The prompt used in the query.
+        :param list[tuple] matches: The matches used in the query.
+        :param bool format_code: If False the python code of the response is
+        not formatted.
+
+        :return: The response of the query.
+        :rtype: QueryResponse
+        """
         # Make content substitutions (if needed).
-        response_content = cls._substitute_python_code(response_content)
+        response_content = cls._substitute_python_code(
+            response_content, format_code
+        )
 
-        response = QueryResponse(
+        return QueryResponse(
             response=response_content,
             temperature=temperature,
             max_tokens=max_tokens,
-            matches_count=k,
+            matches_count=len(matches),
             prompt=user_prompt,
             matches=matches,
-            model_name=cls._model_name
+            model_name=cls._model_name,
+            prompt_tokens=context_packer.count_tokens(
+                user_prompt, context_packer.get_encoding(cls._model_name)
+            )
         )
 
-        return response
+    @classmethod
+    def _retrieve(cls, question, k, filters, embeddings=None):
+        """Retrieves the matches of the question without near duplicates.
+
+        :param str question: The question to find matches for.
+        :param int k: The number of matches to return.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+        :param list[float] embeddings: The embeddings of the question; if
+        None they are retrieved.
+
+        :return: The (text, score, source, page) of each match.
+        :rtype: list[tuple]
+        """
+        filters = abstract_vector_db.validate_filters(filters)
+        # Kept for the whole retrieval since reload can replace them.
+        vdb, lexical = cls._vdb, cls._lexical_index
+        if cls._retrieval_mode != RetrievalMode.HYBRID:
+            lexical = None
+        candidates_count = _get_candidates_count(k, lexical)
+        lexical_future = None
+        if lexical is not None:
+            lexical_future = cls._retrieval_pool.submit(
+                lexical.search, question, candidates_count, filters
+            )
+        try:
+            # The embeddings are retrieved separately from the search so
+            # they can be cached or computed by an alternative embedder.
+            if embeddings is None:
+                embeddings = cls._embedder(question)
+            matches = vdb.search_by_vector(
+                embeddings, candidates_count, filters
+            )
+            lexical_matches = None
+            if lexical_future is not None:
+                lexical_matches = lexical_future.result()
+        finally:
+            if lexical_future is not None:
+                lexical_future.cancel()
+        return _select_matches(matches, lexical_matches, k, cls._mmr_lambda)
 
     @classmethod
-    def initialize(cls, fullpath_to_db, collection_name, model_name):
+    def initialize(cls, fullpath_to_db, collection_name, model_name,
+                   embedder=None, lexical_index_fullpath=None,
+                   retrieval_mode=None):
         """Initializes the executor.
 
         :param str fullpath_to_db: The full path to the database file to query.
         :param str collection_name: The name of the collection to query.
         :param str model_name: The name of the model to use.
+        :param callable embedder: Returns the embeddings of a question.
+        :param str lexical_index_fullpath: The full path to the lexical index.
+        :param RetrievalMode retrieval_mode: The retrieval mode.
         """
         try:
             cls._model_name = model_name
+            cls._embedder = \
+                embedder or embeddings_retriever.get_query_embeddings
+            cls._retrieval_mode = retrieval_mode or get_retrieval_mode()
+            cls._mmr_lambda = context_selector.get_mmr_lambda()
+            cls._collection_name = collection_name
             cls._vdb = vector_db.get_vector_db(fullpath_to_db, collection_name)
+            if lexical_index_fullpath:
+                cls._lexical_index = lexical_index.LexicalIndex(
+                    lexical_index_fullpath
+                )
+                cls._retrieval_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=_RETRIEVAL_WORKERS_COUNT,
+                    thread_name_prefix="lexical-search"
+                )
             cls._openai_client = openai.OpenAI()
         except Exception as ex:
             logger.exception(ex)
@@ -336,9 +1244,8 @@ class _QueryExecutor:
             )
             cls._model_name = None
             cls._openai_client = None
-            if cls._vdb:
-                cls._vdb.close()
-                cls._vdb = None
+            cls._embedder = None
+            cls._close_retrievers()
             raise
         else:
             logger.info(
@@ -346,11 +1253,146 @@ class _QueryExecutor:
                 fullpath_to_db, collection_name, model_name
             )
 
+    @classmethod
+    def reload(cls, fullpath_to_db, lexical_index_fullpath=None):
+        """Switches to another vector db and lexical index.
+
+        The new retrievers are opened before replacing the current ones; the
+        replaced ones are closed after a grace period so the queries using
+        them can complete.
+
+        :param str fullpath_to_db: The full path to the database file to query.
+        :param str lexical_index_fullpath: The full path to the lexical index.
+        """
+        vdb, lexical = _open_retrievers(
+            fullpath_to_db, cls._collection_name, lexical_index_fullpath
+        )
+        if lexical and not cls._retrieval_pool:
+            cls._retrieval_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_RETRIEVAL_WORKERS_COUNT,
+                thread_name_prefix="lexical-search"
+            )
+        replaced = [r for r in (cls._vdb, cls._lexical_index) if r]
+        cls._vdb, cls._lexical_index = vdb, lexical
+        logger.info("Reloaded vector db: %s", fullpath_to_db)
+
+        _close_replaced_later(replaced)
+
+    @classmethod
+    def warm_up(cls):
+        """Prepares the executor for its first query without querying the LLM.
+
+        :raises ValueError
+        """
+        if not cls._vdb or not cls._openai_client:
+            logger.error("The query executor is not initialized.")
+            raise ValueError("No vector database.")
+        _warm_up_retrievers(cls._vdb, cls._lexical_index, cls._model_name)
+        try:
+            cls._openai_client.with_options(
+                timeout=_WARM_UP_TIMEOUT, max_retries=0
+            ).models.retrieve(cls._model_name)
+        except Exception as ex:
+            logger.warning("Failed to connect to the LLM: %s", ex)
+
     @classmethod
     def close(cls):
         """Closes the vector db and clears the openai client."""
+        cls._close_retrievers()
+        cls._model_name = None
+        cls._openai_client = None
+        cls._embedder = None
+
+    @classmethod
+    def get_query_embeddings(cls, question):
+        """Returns the embeddings to search for the question.
+
+        :param str question: The question to find matches for.
+
+        :return: The embeddings of the question (by the embedder).
+        :rtype: list[float]
+        """
+        return cls._embedder(question)
+
+    @classmethod
+    def get_model_name(cls):
+        """Returns the name of the model answering the queries.
+
+        :return: The name of the model.
+        :rtype: str
+        """
+        return cls._model_name
+
+    @classmethod
+    def _close_retrievers(cls):
+        """Closes the vector db and the lexical index."""
         if cls._vdb:
             cls._vdb.close()
             cls._vdb = None
-        cls._model_name = None
-        cls._openai_client = None
+        if cls._retrieval_pool:
+            cls._retrieval_pool.shutdown(wait=True)
+            cls._retrieval_pool = None
+        if cls._lexical_index:
+            cls._lexical_index.close()
+            cls._lexical_index = None
+
+
+def _warm_up_retrievers(vdb, lexical, model_name):
+    """Loads the retrievers and the token encoding by dummy searches.
+
+    :param vector_db.AbstractVectorDb vdb: The vector db.
+    :param lexical_index.LexicalIndex lexical: The lexical index or None.
+    :param str model_name: The model whose token encoding is loaded.
+    """
+    vdb.warm_up()
+    if lexical:
+        lexical.search(_WARM_UP_QUERY, 1)
+    context_packer.get_encoding(model_name)
+    logger.info("Warmed up the retrievers of %s.", vdb)
+
+
+def _open_retrievers(fullpath_to_db, collection_name, lexical_index_fullpath):
+    """Opens the vector db and the lexical index of a collection.
+
+    :param str fullpath_to_db: The full path to the database file to query.
+    :param str collection_name: The name of the collection to query.
+    :param str lexical_index_fullpath: The full path to the lexical index or
+    None.
+
+    :return: The vector db and the lexical index (or None).
+    :rtype: tuple
+    """
+    vdb = vector_db.get_vector_db(fullpath_to_db, collection_name)
+    try:
+        lexical = None
+        if lexical_index_fullpath:
+            lexical = lexical_index.LexicalIndex(lexical_index_fullpath)
+    except Exception:
+        vdb.close()
+        raise
+    return vdb, lexical
+
+
+def _close_replaced_later(retrievers):
+    """Closes the retrievers replaced by a reload after the grace period.
+
+    :param list retrievers: The vector dbs and lexical indexes to close.
+    """
+    if retrievers:
+        timer = threading.Timer(
+            _RELOAD_GRACE_SECONDS, _close_replaced, args=(retrievers,)
+        )
+        timer.daemon = True
+        timer.start()
+
+
+def _close_replaced(retrievers):
+    """Closes the retrievers replaced by a reload.
+
+    :param list retrievers: The vector dbs and lexical indexes to close.
+    """
+    for retriever in retrievers:
+        try:
+            retriever.close()
+        except Exception as ex:
+            logger.exception(ex)
@@ -0,0 +1,37 @@
+"""Fuses the rankings of different retrievers to a single ranking.
+
+Uses reciprocal rank fusion: each match scores 1 / (RRF_K + rank) in each
+ranking it appears in and the matches are sorted by the sum of their scores.
+Only the ranks are used, so the fusion does not depend on the scales of the
+scores of the retrievers (like cosine similarities and BM25 scores).
+"""
+
+# The constant dampening the weight of the top ranks (as in the original
+# paper of the reciprocal rank fusion).
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Fuses the passed in rankings.
+
+    A match is identified by its text, source and page.
+
+    :param list[list[tuple]] rankings: The (text, score, source, page) of
+    the matches of each retriever sorted by descending relevance.
+    :param int k: The number of matches to return.
+    :param int rrf_k: The constant dampening the weight of the top ranks.
+
+    :return: The (text, fused score, source, page) of the best k matches
+    sorted by descending fused score.
+    :rtype: list[tuple]
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, (text, _, source, page) in enumerate(ranking, start=1):
+            key = (text, source, page)
+            scores[key] = scores.get(key, 0.) + 1. / (rrf_k + rank)
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [
+        (text, score, source, page)
+        for (text, source, page), score in best[:k]
+    ]
@@ -0,0 +1,212 @@
+"""Caches the answers of the questions by their exact (normalized) text.
+
+A question asked again (ignoring the case and the whitespace) with the same
+settings against the same version of the collection is answered from the
+cache without calling the LLM. The answers are kept in a small in memory
+LRU tier in front of a sqlite database, so they survive the restarts and
+are shared by the processes of the same host.
+
+The cache is enabled unless the RESPONSE_CACHE environment variable is set
+to OFF.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def is_enabled():
+    """Returns True if the response cache is enabled.
+
+    The cache is disabled by setting the RESPONSE_CACHE environment variable
+    to OFF.
+
+    :rtype: bool
+
+    :raises: ValueError
+    """
+    value = (os.environ.get("RESPONSE_CACHE") or "ON").strip().upper()
+    if value not in ("ON", "OFF"):
+        raise ValueError(
+            f"RESPONSE_CACHE is not valid: {value}. The valid values are "
+            f"ON and OFF."
+        )
+    return value == "ON"
+
+
+def normalize_question(question):
+    """Returns the passed in question ignoring the case and the whitespace.
+
+    :param str question: The question to normalize.
+
+    :rtype: str
+    """
+    return re.sub(r"\s+", " ", (question or "").strip().lower())
+
+
+def make_key(question, settings):
+    """Returns the key of the answer of a question.
+
+    :param str question: The question.
+    :param tuple settings: The settings the answer must have been created
+    with (their repr must be stable, like numbers, strings and frozen
+    dataclasses).
+
+    :return: The digest of the normalized question and the settings.
+    :rtype: str
+    """
+    text = repr((normalize_question(question),) + tuple(settings))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Holds the answers of the questions.
+
+    :ivar str _fullpath: The full path to the sqlite database.
+    :ivar int _memory_size: The maximum number of answers kept in memory.
+    :ivar int _max_size: The maximum number of answers kept in the database.
+    :ivar collections.OrderedDict _memory: The answers kept in memory, the
+    least recently used first.
+    :ivar sqlite3.Connection _conn: The connection to the database.
+    :ivar threading.Lock _lock: Serializes the access to the cache.
+    :ivar int _hits: The number of answers found in the cache.
+    :ivar int _misses: The number of answers not found in the cache.
+    """
+
+    def __init__(self, fullpath, memory_size=None, max_size=None):
+        """Initializer.
+
+        :param str fullpath: The full path to the sqlite database.
+        :param int memory_size: The maximum number of answers kept in
+        memory; if None the default is used.
+        :param int max_size: The maximum number of answers kept in the
+        database; if None the default is used.
+        """
+        self._fullpath = fullpath
+        self._memory_size = memory_size or _DEFAULT_MEMORY_SIZE
+        self._max_size = max_size or _DEFAULT_MAX_SIZE
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._conn = sqlite3.connect(
+            fullpath, check_same_thread=False, timeout=_BUSY_TIMEOUT
+        )
+        with self._conn:
+            # Allows the processes to read while another one writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SQL_CREATE_TABLE)
+            self._conn.execute(_SQL_CREATE_CREATED_AT_INDEX)
+
+    def __repr__(self):
+        """Returns the string representation of the cache.
+
+        :rtype: str
+        """
+        return f"ResponseCache({self._fullpath})"
+
+    def get(self, key):
+        """Returns the cached answer for the passed in key.
+
+        :param str key: The key of the answer (see make_key).
+
+        :return: The cached answer (as it was put) or None.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return self._memory[key]
+            row = self._conn.execute(_SQL_SELECT, (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        """Caches an answer.
+
+        :param str key: The key of the answer (see make_key).
+        :param value: The answer; must be serializable to json.
+        """
+        # The numeric scalars of numpy are stored as floats.
+        data = json.dumps(value, default=float)
+        with self._lock:
+            self._remember(key, value)
+            with self._conn:
+                self._conn.execute(_SQL_INSERT, (key, data, time.time()))
+                self._conn.execute(_SQL_DELETE_OLDEST, (self._max_size,))
+
+    def get_hit_rate(self):
+        """Returns the fraction of the answers found in the cache.
+
+        :rtype: float
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return round(self._hits / total, 4) if total else 0.
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key, value):
+        """Keeps an answer in memory; the lock must be held.
+
+        :param str key: The key of the answer.
+        :param value: The answer.
+        """
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The default maximum number of answers kept in memory.
+_DEFAULT_MEMORY_SIZE = 1024
+
+# The default maximum number of answers kept in the database.
+_DEFAULT_MAX_SIZE = 100000
+
+# The seconds to wait for a database locked by another process.
+_BUSY_TIMEOUT = 5.
+
+_SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    response   TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+_SQL_CREATE_CREATED_AT_INDEX = """
+CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)
+"""
+
+_SQL_SELECT = "SELECT response FROM responses WHERE key = ?"
+
+_SQL_INSERT = """
+INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)
+"""
+
+# Keeps the newest answers; a replaced answer is as new as its replacement.
+_SQL_DELETE_OLDEST = """
+DELETE FROM responses WHERE created_at <= (
+    SELECT created_at FROM responses ORDER BY created_at DESC LIMIT 1 OFFSET ?
+)
+"""
@@ -0,0 +1,222 @@
+"""Caches the answers of the questions by the similarity of their embeddings.
+
+Users ask the same questions with small wording changes; the answer of a
+question is reused for a later question whose embeddings have a cosine
+similarity of at least the threshold with it, as long as both were asked
+with the same settings (number of matches, temperature, model, filters) and
+against the same version of the collection.
+
+The cache is enabled by setting the SEMANTIC_CACHE_THRESHOLD environment
+variable (a number between 0 and 1, like 0.95); the SEMANTIC_CACHE_TTL (in
+seconds) and SEMANTIC_CACHE_SIZE (the maximum number of answers, evicting
+the least recently used ones) environment variables are optional.
+"""
+
+import collections
+import dataclasses
+import os
+import threading
+import time
+
+import numpy as np
+
+import ragit.libs.common as common
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheMetrics:
+    """Represents the usage of the semantic cache.
+
+    int entries: The number of cached answers.
+    int hits: The number of questions answered from the cache.
+    int misses: The number of questions not found in the cache.
+    float hit_rate: The fraction of the questions answered from the cache.
+    """
+
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+def get_similarity_threshold():
+    """Returns the similarity of the questions answered from the cache.
+
+    The threshold is set by the SEMANTIC_CACHE_THRESHOLD environment variable.
+
+    :return: The minimum cosine similarity or None if the cache is disabled.
+    :rtype: float | None
+
+    :raises: ValueError
+    """
+    value = (os.environ.get("SEMANTIC_CACHE_THRESHOLD") or "").strip()
+    if not value:
+        return None
+    try:
+        threshold = float(value)
+    except ValueError:
+        threshold = -1.
+    if not 0. < threshold <= 1.:
+        raise ValueError(
+            f"SEMANTIC_CACHE_THRESHOLD is not valid: {value}. It must be "
+            f"a number greater than 0 and up to 1."
+        )
+    return threshold
+
+
+def get_ttl():
+    """Returns the seconds an answer is cached.
+
+    :return: The SEMANTIC_CACHE_TTL environment variable or the default.
+    :rtype: float
+
+    :raises: ValueError
+    """
+    return common.get_positive_number(
+        "SEMANTIC_CACHE_TTL", _DEFAULT_TTL, float
+    )
+
+
+def get_max_size():
+    """Returns the maximum number of cached answers.
+
+    :return: The SEMANTIC_CACHE_SIZE environment variable or the default.
+    :rtype: int
+
+    :raises: ValueError
+    """
+    return common.get_positive_number("SEMANTIC_CACHE_SIZE", _DEFAULT_SIZE)
+
+
+class SemanticCache:
+    """Holds the answers of the recent questions.
+
+    :ivar float _threshold: The minimum similarity of a hit.
+    :ivar float _ttl: The seconds an answer is cached.
+    :ivar int _max_size: The maximum number of cached answers.
+    :ivar collections.OrderedDict _entries: The cached (key, vector, answer,
+    expiration) by entry id, the least recently used first.
+    :ivar threading.Lock _lock: Guards the entries and the counters.
+    :ivar int _next_id: The id of the next entry.
+    :ivar int _hits: The number of hits.
+    :ivar int _misses: The number of misses.
+    """
+
+    def __init__(self, threshold, ttl=None, max_size=None):
+        """Initializer.
+
+        :param float threshold: The minimum similarity of a hit.
+        :param float ttl: The seconds an answer is cached; if None the
+        default is used.
+        :param int max_size: The maximum number of cached answers; if None
+        the default is used.
+        """
+        self._threshold = threshold
+        self._ttl = ttl or _DEFAULT_TTL
+        self._max_size = max_size or _DEFAULT_SIZE
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, embeddings, key):
+        """Returns the answer of the most similar cached question.
+
+        :param list[float] embeddings: The embeddings of the question.
+        :param tuple key: The settings the answer must have been created
+        with (must be hashable).
+
+        :return: The cached answer or None.
+        """
+        vector = _normalize(embeddings)
+        now = time.monotonic()
+        with self._lock:
+            self._remove_expired(now)
+            entry_ids = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry[0] == key
+            ]
+            if entry_ids:
+                matrix = np.stack(
+                    [self._entries[entry_id][1] for entry_id in entry_ids]
+                )
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self._threshold:
+                    self._hits += 1
+                    entry_id = entry_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    return self._entries[entry_id][2]
+            self._misses += 1
+            return None
+
+    def insert(self, embeddings, key, answer):
+        """Caches the answer of a question.
+
+        :param list[float] embeddings: The embeddings of the question.
+        :param tuple key: The settings the answer was created with.
+        :param answer: The answer to cache.
+        """
+        vector = _normalize(embeddings)
+        with self._lock:
+            self._entries[self._next_id] = (
+                key, vector, answer, time.monotonic() + self._ttl
+            )
+            self._next_id += 1
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Removes all the cached answers."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        """Returns the usage of the cache.
+
+        :rtype: CacheMetrics
+        """
+        with self._lock:
+            self._remove_expired(time.monotonic())
+            total = self._hits + self._misses
+            return CacheMetrics(
+                entries=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=round(self._hits / total, 4) if total else 0.
+            )
+
+    def _remove_expired(self, now):
+        """Removes the expired answers; the lock must be held.
+
+        :param float now: The current monotonic time.
+        """
+        expired = [
+            entry_id for entry_id, entry in self._entries.items()
+            if entry[3] <= now
+        ]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The default seconds an answer is cached.
+_DEFAULT_TTL = 3600.
+
+# The default maximum number of cached answers.
+_DEFAULT_SIZE = 1000
+
+
+def _normalize(embeddings):
+    """Returns the passed in embeddings as a unit vector.
+
+    :param list[float] embeddings: The embeddings to convert.
+
+    :rtype: numpy.ndarray
+    """
+    vector = np.asarray(embeddings, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
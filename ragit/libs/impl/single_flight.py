@@ -0,0 +1,167 @@
+"""Coalesces the concurrent computations of the same answer.
+
+When many users ask the same question at the same time (for example after a
+link is shared), only the first one (the leader) computes the answer while
+the rest await it instead of running their own retrieval and LLM query.
+
+The computation of run is detached from the leader's request so a leader
+that disconnects does not cancel it for the rest. A computation that the
+leader abandons (like a stream that is closed before it completes) lets the
+waiting requests compute the answer again.
+
+The flights live in the event loop of the front end; they are not shared
+between processes (see response_cache for that).
+"""
+
+import asyncio
+import dataclasses
+import functools
+
+
+@dataclasses.dataclass(frozen=True)
+class FlightMetrics:
+    """Represents the coalescing of the requests.
+
+    int in_flight: The number of computations in progress.
+    int led: The number of computations started.
+    int coalesced: The number of requests that awaited another computation.
+    """
+
+    in_flight: int
+    led: int
+    coalesced: int
+
+
+class SingleFlight:
+    """Holds the computations in progress by their keys.
+
+    Must be used from a single event loop.
+
+    :ivar dict[str, asyncio.Future] _flights: The futures of the
+    computations in progress.
+    :ivar int _led: The number of computations started.
+    :ivar int _coalesced: The number of requests that awaited another
+    computation.
+    """
+
+    def __init__(self):
+        """Initializer."""
+        self._flights = {}
+        self._led = 0
+        self._coalesced = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        """Runs the coroutine function unless the key is already in flight.
+
+        :param str key: The key of the computation.
+        :param callable func: The coroutine function computing the result.
+
+        :return: The result of the computation (which may have been started
+        by another request).
+
+        :raises: Whatever the computation raises.
+        """
+        while key in self._flights:
+            result = await self._join(self._flights[key])
+            if result is not _ABANDONED:
+                return result
+        future = self.lead(key)
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        task.add_done_callback(functools.partial(_copy_outcome, future))
+        return await asyncio.shield(future)
+
+    async def wait(self, key):
+        """Awaits the computation of the key if it is in flight.
+
+        :param str key: The key of the computation.
+
+        :return: The result of the computation or None if it is not in
+        flight (or was abandoned).
+
+        :raises: Whatever the computation raises.
+        """
+        while key in self._flights:
+            result = await self._join(self._flights[key])
+            if result is not _ABANDONED:
+                return result
+        return None
+
+    def lead(self, key):
+        """Registers a computation the caller runs itself.
+
+        The caller must complete the returned future by setting its result
+        or exception, or cancel it to abandon the computation.
+
+        :param str key: The key of the computation; must not be in flight.
+
+        :return: The future of the computation.
+        :rtype: asyncio.Future
+        """
+        assert key not in self._flights, f"{key} is already in flight."
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        self._led += 1
+        future.add_done_callback(functools.partial(self._land, key))
+        return future
+
+    def get_metrics(self):
+        """Returns the coalescing of the requests.
+
+        :rtype: FlightMetrics
+        """
+        return FlightMetrics(
+            in_flight=len(self._flights),
+            led=self._led,
+            coalesced=self._coalesced
+        )
+
+    async def _join(self, future):
+        """Awaits the computation of another request.
+
+        :param asyncio.Future future: The future of the computation.
+
+        :return: The result of the computation or _ABANDONED.
+        """
+        self._coalesced += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # The waiting request was cancelled.
+                raise
+            return _ABANDONED
+
+    def _land(self, key, future):
+        """Removes a completed computation.
+
+        :param str key: The key of the computation.
+        :param asyncio.Future future: The completed future.
+        """
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if not future.cancelled():
+            # Marks the exception as retrieved when nobody awaited it.
+            future.exception()
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The result of an abandoned computation.
+_ABANDONED = object()
+
+
+def _copy_outcome(future, task):
+    """Completes the future of a computation with the outcome of its task.
+
+    :param asyncio.Future future: The future of the computation.
+    :param asyncio.Task task: The completed task.
+    """
+    if future.done():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
@@ -120,7 +120,7 @@ class _MDDocument:
                 self._chunk_contents.append(txt)
                 self._chunk_metadata.append(metadata)
             else:
-                for chunk in markdown_splitter.get_chunks(txt, chunk_size=500):
+                for chunk in markdown_splitter.get_chunks(txt, chunk_size):
                     self._chunk_contents.append(headers + chunk)
                     metadata = {"fullpath": self._fullpath, "page": 'n/a'}
                     self._chunk_metadata.append(metadata)
@@ -0,0 +1,45 @@
+"""Holds the fixtures shared by the vector db tests."""
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.embeddings_retriever as embeddings_retriever
+
+# The length of the embeddings of the vector db tests.
+VECTORS_DIMENSION = 16
+
+
+@pytest.fixture
+def vectors(monkeypatch):
+    """Returns random embeddings and makes each chunk its own query."""
+    rng = np.random.default_rng(7)
+    embeddings = rng.normal(size=(2000, VECTORS_DIMENSION)).tolist()
+    lookup = {f"chunk {i}": e for i, e in enumerate(embeddings)}
+
+    def get_embeddings_batch(txts):
+        """Returns the embeddings of the chunks named in the queries."""
+        return [lookup[txt.split(" (")[0]] for txt in txts]
+
+    monkeypatch.setattr(
+        embeddings_retriever, "get_embeddings_batch", get_embeddings_batch
+    )
+    return embeddings
+
+
+@pytest.fixture
+def insert_chunks():
+    """Returns a function inserting embeddings naming the chunks by position.
+
+    The chunk at position i is named "chunk i" (so it is its own query, see
+    vectors), its source is doc-<i % 5>.pdf and its page is i % 7.
+    """
+
+    def insert(vdb, embeddings, first):
+        """Inserts the passed in embeddings starting at position first."""
+        count = len(embeddings)
+        chunks = [f"chunk {first + i}" for i in range(count)]
+        sources = [f"doc-{(first + i) % 5}.pdf" for i in range(count)]
+        pages = [(first + i) % 7 for i in range(count)]
+        vdb.insert(chunks, embeddings, sources, pages)
+
+    return insert
@@ -0,0 +1,244 @@
+"""Tests the AsyncQueryExecutor of the query executor module."""
+
+import asyncio
+import gc
+import os
+import types
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.query_executor as query_executor
+import ragit.libs.impl.vdb_numpy as vdb_numpy
+
+_DIMENSION = 1536
+_RECORDS_COUNT = 8
+
+
+class _FakeCompletions:
+    """Replaces the chat completions of the async OpenAI client."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    async def create(self, stream=False, **kwargs):
+        self.calls.append(kwargs)
+        if stream:
+            return _FakeStream(self.answer.split(" "))
+        message = types.SimpleNamespace(content=self.answer)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message)]
+        )
+
+
+class _FakeStream:
+    """Replaces the streamed chat completion."""
+
+    def __init__(self, words):
+        self._chunks = [
+            types.SimpleNamespace(
+                choices=[
+                    types.SimpleNamespace(
+                        delta=types.SimpleNamespace(content=f"{word} ")
+                    )
+                ]
+            )
+            for word in words
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+def _make_executor(tmp_path, monkeypatch, answer):
+    """Creates an executor over a numpy vector db with a fake client."""
+    monkeypatch.setenv("VECTOR_DB_PROVIDER", "NUMPY")
+    monkeypatch.setenv("OPENAI_API_KEY", "not-used")
+    fullpath = os.path.join(tmp_path, "vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "chunks", _DIMENSION)
+    vectors = np.eye(_RECORDS_COUNT, _DIMENSION, dtype=np.float32)
+    vdb.insert(
+        [f"chunk {i} is about topic {i}" for i in range(_RECORDS_COUNT)],
+        vectors.tolist(),
+        [f"doc{i}.md" for i in range(_RECORDS_COUNT)],
+        list(range(_RECORDS_COUNT))
+    )
+    vdb.close()
+
+    async def embedder(question):
+        return vectors[int(question.split()[-1])].tolist()
+
+    executor = query_executor.AsyncQueryExecutor(
+        fullpath, "chunks", embedder=embedder,
+        retrieval_mode=query_executor.RetrievalMode.VECTOR
+    )
+    completions = _FakeCompletions(answer)
+    executor._client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=completions),
+        close=_no_op
+    )
+    return executor, completions
+
+
+async def _no_op():
+    """Replaces the closing of the client."""
+
+
+def test_query(tmp_path, monkeypatch):
+    executor, completions = _make_executor(tmp_path, monkeypatch, "It is 3.")
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(executor.query(f"about topic {i}", k=1) for i in range(4))
+            )
+        finally:
+            await executor.close()
+
+    responses = asyncio.run(run())
+    assert len(completions.calls) == 4
+    for i, response in enumerate(responses):
+        assert response.matches[0][0] == f"chunk {i} is about topic {i}"
+        # The budget never adds matches beyond k.
+        assert response.matches_count == len(response.matches) == 1
+        assert response.prompt_tokens > 0
+        assert f"chunk {i} is about topic {i}" in response.prompt
+
+
+def test_stream_query(tmp_path, monkeypatch):
+    executor, _ = _make_executor(tmp_path, monkeypatch, "It is 5.")
+
+    async def run():
+        try:
+            return [
+                part async for part in executor.stream_query("topic 5", k=2)
+            ]
+        finally:
+            await executor.close()
+
+    parts = asyncio.run(run())
+    assert parts[:-1] == ["It ", "is ", "5. "]
+    response = parts[-1]
+    assert isinstance(response, query_executor.QueryResponse)
+    assert response.matches[0][0] == "chunk 5 is about topic 5"
+    assert response.response.startswith("It is 5.")
+
+
+def test_query_formats_python_code(tmp_path, monkeypatch):
+    answer = "Use:\n```python\ndef add(i, j):\nreturn i + j\n```\nDone."
+    executor, completions = _make_executor(tmp_path, monkeypatch, answer)
+
+    async def run():
+        try:
+            formatted = await executor.query("topic 1", k=1)
+            unformatted = await executor.query(
+                "topic 1", k=1, format_code=False
+            )
+            return formatted, unformatted
+        finally:
+            await executor.close()
+
+    formatted, unformatted = asyncio.run(run())
+    # The code is formatted locally without calling the LLM.
+    assert len(completions.calls) == 2
+    assert "def add(i, j):\n    return i + j\n```\nDone." in formatted.response
+    assert unformatted.response == answer
+
+
+def test_query_formats_invalid_code_by_llm(tmp_path, monkeypatch):
+    answer = "```python\ndef foo(:\n```\n```python\nx = (\n```"
+    executor, completions = _make_executor(tmp_path, monkeypatch, answer)
+
+    async def run():
+        try:
+            return await executor.query("topic 1", k=1)
+        finally:
+            await executor.close()
+
+    response = asyncio.run(run())
+    # Each block that cannot be formatted locally is sent to the LLM.
+    assert len(completions.calls) == 3
+    assert "def foo(:" in completions.calls[1]["messages"][0]["content"]
+    assert "x = (" in completions.calls[2]["messages"][0]["content"]
+    assert response.response.count("```python") == 2
+
+
+def test_warm_up(tmp_path, monkeypatch):
+    executor, completions = _make_executor(tmp_path, monkeypatch, "Unused.")
+    retrieved = []
+
+    async def retrieve(model_name):
+        retrieved.append(model_name)
+
+    def with_options(**options):
+        assert options["max_retries"] == 0
+        return types.SimpleNamespace(
+            models=types.SimpleNamespace(retrieve=retrieve)
+        )
+
+    executor._client.with_options = with_options
+
+    async def run():
+        try:
+            await executor.warm_up()
+            # The failure to connect to the LLM is not raised.
+            executor._client.with_options = None
+            await executor.warm_up()
+        finally:
+            await executor.close()
+
+    asyncio.run(run())
+    assert retrieved == [query_executor.DEFAULT_MODEL]
+    assert not completions.calls
+
+
+class _FailingLexicalIndex:
+    """Replaces a lexical index whose searches fail."""
+
+    def search(self, *args):
+        raise RuntimeError("The lexical search failed.")
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("delay", [0., 0.05])
+def test_failed_retrieval_discards_the_lexical_search(
+        tmp_path, monkeypatch, delay):
+    executor, _ = _make_executor(tmp_path, monkeypatch, "Not used.")
+    executor._retrieval_mode = query_executor.RetrievalMode.HYBRID
+    executor._lexical_index = _FailingLexicalIndex()
+    reported = []
+
+    async def embedder(question):
+        # Fails before or after the lexical search completes.
+        await asyncio.sleep(delay)
+        raise ValueError("The embeddings failed.")
+
+    executor._embedder = embedder
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: reported.append(context)
+        )
+        try:
+            with pytest.raises(ValueError):
+                await executor.retrieve("about topic 1", 1)
+        finally:
+            await executor.close()
+        await asyncio.sleep(0.05)
+        gc.collect()
+
+    asyncio.run(run())
+    assert reported == []
@@ -0,0 +1,89 @@
+"""Tests the code_formatter module."""
+
+import ragit.libs.impl.code_formatter as code_formatter
+
+
+def test_valid_code_is_not_changed():
+    """Tests the formatting of valid code."""
+    code = "def get_x(a):\n    return a\n"
+    assert code_formatter.format_code(code) == "def get_x(a):\n    return a"
+
+
+def test_reindent_function():
+    """Tests the re-indentation of a function with comments."""
+    code = (
+        "def get_x(sql_statement):\n"
+        "# Execute the SQL statement.\n"
+        "retrieved_rows = dbutil.execute(sql_statement)\n"
+        "\n"
+        "return retrieved_rows\n"
+    )
+    expected = (
+        "def get_x(sql_statement):\n"
+        "    # Execute the SQL statement.\n"
+        "    retrieved_rows = dbutil.execute(sql_statement)\n"
+        "\n"
+        "    return retrieved_rows"
+    )
+    assert code_formatter.format_code(code) == expected
+
+
+def test_reindent_blocks():
+    """Tests the re-indentation of nested and sibling blocks."""
+    code = (
+        "import os\n"
+        "\n"
+        "class Foo:\n"
+        "def __init__(self, x):\n"
+        "self.x = x\n"
+        "\n"
+        "def get(self, items):\n"
+        "for item in items:\n"
+        "if item > self.x:\n"
+        "return item\n"
+        "else:\n"
+        "continue\n"
+        "\n"
+        "\n"
+        "def main():\n"
+        "values = [\n"
+        "1, 2,\n"
+        "]\n"
+        "try:\n"
+        "print(Foo(1).get(values))\n"
+        "except ValueError:\n"
+        "pass\n"
+    )
+    expected = (
+        "import os\n"
+        "\n"
+        "class Foo:\n"
+        "    def __init__(self, x):\n"
+        "        self.x = x\n"
+        "\n"
+        "    def get(self, items):\n"
+        "        for item in items:\n"
+        "            if item > self.x:\n"
+        "                return item\n"
+        "            else:\n"
+        "                continue\n"
+        "\n"
+        "\n"
+        "def main():\n"
+        "    values = [\n"
+        "        1, 2,\n"
+        "    ]\n"
+        "    try:\n"
+        "        print(Foo(1).get(values))\n"
+        "    except ValueError:\n"
+        "        pass"
+    )
+    formatted = code_formatter.format_code(code)
+    assert formatted == expected
+    assert code_formatter.is_valid(formatted)
+
+
+def test_unformattable_code():
+    """Tests the code that cannot be formatted locally."""
+    assert code_formatter.format_code("def foo(:\nreturn") is None
+    assert code_formatter.format_code("  \n") is None
@@ -0,0 +1,81 @@
+"""Tests the context_packer module."""
+
+import pytest
+
+import ragit.libs.impl.context_packer as context_packer
+
+
+class _WordEncoding:
+    """Counts each word as a token."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def _make_match(words_count, name):
+    """Returns a match of the passed in number of words."""
+    text = " ".join(f"{name}{i}" for i in range(words_count))
+    return text, 1., f"{name}.md", 0
+
+
+def test_pack_matches_in_relevance_order():
+    matches = [_make_match(40, "a"), _make_match(30, "b"), _make_match(5, "c")]
+    packed = context_packer.pack_matches(matches, 100, _WordEncoding(), 2)
+    assert packed == matches
+
+
+def test_pack_matches_truncates_last():
+    matches = [
+        _make_match(40, "a"), _make_match(100, "b"), _make_match(5, "c")
+    ]
+    packed = context_packer.pack_matches(matches, 100, _WordEncoding())
+    assert len(packed) == 2
+    assert packed[0] == matches[0]
+    assert packed[1][0] == " ".join(f"b{i}" for i in range(60))
+    assert packed[1][1:] == matches[1][1:]
+
+
+def test_pack_matches_skips_small_remainder():
+    matches = [_make_match(90, "a"), _make_match(100, "b")]
+    packed = context_packer.pack_matches(matches, 100, _WordEncoding())
+    assert packed == matches[:1]
+
+    # The only match is truncated whatever its length.
+    packed = context_packer.pack_matches(matches[1:], 10, _WordEncoding())
+    assert len(packed[0][0].split()) == 10
+
+    assert context_packer.pack_matches([], 100, _WordEncoding()) == []
+    assert context_packer.pack_matches(matches, 0, _WordEncoding()) == []
+
+
+def test_approximate_encoding():
+    encoding = context_packer.ApproximateEncoding()
+    tokens = encoding.encode("abcdefghij")
+    assert tokens == ["abcd", "efgh", "ij"]
+    assert encoding.decode(tokens[:2]) == "abcdefgh"
+    assert context_packer.count_tokens(None, encoding) == 0
+
+
+def test_token_budget(monkeypatch):
+    monkeypatch.delenv("CONTEXT_TOKEN_BUDGET", raising=False)
+    assert context_packer.get_token_budget() == 6000
+    assert context_packer.get_available_tokens("gpt-4o", 2000, 500) == 6000
+    assert context_packer.get_available_tokens("gpt-4", 2000, 500) == 5692
+    assert context_packer.get_available_tokens("gpt-4", 9000, 0) == 0
+
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "20000")
+    assert context_packer.get_available_tokens("gpt-4o", 2000, 500) == 20000
+
+    for value in ("0", "many"):
+        monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", value)
+        with pytest.raises(ValueError, match=f"not valid: {value}\\."):
+            context_packer.get_token_budget()
+
+
+def test_context_window():
+    assert context_packer.get_context_window("gpt-4o-mini") == 128000
+    assert context_packer.get_context_window("gpt-4-0613") == 8192
+    assert context_packer.get_context_window("unknown") == 8192
@@ -0,0 +1,64 @@
+"""Tests the context_selector module."""
+
+import pytest
+
+import ragit.libs.impl.context_selector as context_selector
+
+_TEXT = (
+    "The pump must be serviced every six months by a certified technician "
+    "using the original spare parts of the manufacturer"
+)
+
+
+def test_get_shingles():
+    """Tests splitting a text to word shingles."""
+    assert context_selector.get_shingles("A b, C d", 3) == \
+        frozenset([("a", "b", "c"), ("b", "c", "d")])
+    assert context_selector.get_shingles("A b", 3) == frozenset([("a", "b")])
+    assert context_selector.get_shingles("", 3) == frozenset()
+
+
+def test_near_duplicates_are_removed():
+    """Tests dropping the matches repeating already selected text."""
+    matches = [
+        (_TEXT, 0.9, "a.pdf", 1),
+        # The same text from a duplicated document.
+        (_TEXT.upper(), 0.89, "copy of a.pdf", 1),
+        # Mostly contained in the first match.
+        (_TEXT[:80], 0.88, "a.pdf", 1),
+        ("The filter of the pump is replaced yearly.", 0.7, "b.pdf", 3),
+        ("Unrelated text about the warranty terms.", 0.6, "c.pdf", 9),
+    ]
+    selected = context_selector.select_matches(matches, 3)
+    assert selected == [matches[0], matches[3], matches[4]]
+    assert context_selector.select_matches(matches, 1) == [matches[0]]
+    assert context_selector.select_matches(matches[:3], 3) == [matches[0]]
+    assert context_selector.select_matches([], 3) == []
+
+
+def test_mmr():
+    """Tests re-ranking the matches by maximal marginal relevance."""
+    first = "alpha beta gamma delta epsilon zeta eta theta"
+    matches = [
+        (first, 0.9, "a.pdf", 1),
+        # Shares half of its shingles with the first match.
+        ("alpha beta gamma delta epsilon other words here", 0.8, "a.pdf", 2),
+        ("completely different words in this one chunk", 0.7, "b.pdf", 1),
+    ]
+    assert context_selector.select_matches(matches, 2) == matches[:2]
+    assert context_selector.select_matches(matches, 2, mmr_lambda=0.3) == \
+        [matches[0], matches[2]]
+    assert context_selector.select_matches(matches, 2, mmr_lambda=1.) == \
+        matches[:2]
+
+
+def test_mmr_lambda_from_environment(monkeypatch):
+    """Tests reading the weight of the relevance from the environment."""
+    monkeypatch.delenv("MMR_LAMBDA", raising=False)
+    assert context_selector.get_mmr_lambda() is None
+    monkeypatch.setenv("MMR_LAMBDA", " 0.7 ")
+    assert context_selector.get_mmr_lambda() == pytest.approx(0.7)
+    for value in ("1.5", "junk"):
+        monkeypatch.setenv("MMR_LAMBDA", value)
+        with pytest.raises(ValueError, match=f"not valid: {value}\\."):
+            context_selector.get_mmr_lambda()
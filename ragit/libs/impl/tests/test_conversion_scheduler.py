@@ -0,0 +1,109 @@
+"""Tests the conversion_scheduler module."""
+
+import asyncio
+import os
+
+import pytest
+
+import ragit.libs.impl.conversion_scheduler as conversion_scheduler
+import ragit.libs.impl.pdf_preprocessor as pp
+
+
+class _Document:
+    """Stands in for a parsed page."""
+
+    def __init__(self, text):
+        """Initializer.
+
+        :param str text: The markdown of the page.
+        """
+        self.text = text
+
+
+class _LocalParser:
+    """Local stand-in of the remote parser.
+
+    :ivar int running: The number of the conversions in progress.
+    :ivar int max_running: The max number of concurrent conversions seen.
+    :ivar dict failures: Maps a filename to the failures to raise.
+    """
+
+    def __init__(self, failures=None):
+        """Initializer.
+
+        :param dict failures: Maps a filename to the failures to raise.
+        """
+        self.running = 0
+        self.max_running = 0
+        self.failures = dict(failures or {})
+
+    async def aload_data(self, pdf_path):
+        """Returns two pages for the passed in pdf.
+
+        :param str pdf_path: The pdf to parse.
+        """
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.05)
+            filename = os.path.basename(pdf_path)
+            if self.failures.get(filename, 0) > 0:
+                self.failures[filename] -= 1
+                raise ConnectionError("service unavailable")
+            return [_Document(f"# {filename} 1"), _Document(f"# {filename} 2")]
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def pdf_paths(tmp_path, monkeypatch):
+    """Creates a few pdf files to convert."""
+    monkeypatch.setattr(conversion_scheduler, "_RETRY_DELAY_IN_SECONDS", 0)
+    paths = []
+    for index in range(10):
+        path = tmp_path / f"doc{index}.pdf"
+        path.write_bytes(b"%PDF")
+        paths.append(str(path))
+    return paths
+
+
+def test_convert_pdfs(pdf_paths):
+    """Tests the concurrency is bounded and all the markdowns are created."""
+    parser = _LocalParser()
+    progress = []
+    results = conversion_scheduler.convert_pdfs(
+        pdf_paths,
+        parser=parser,
+        concurrency=3,
+        progress=lambda result, done, total: progress.append((done, total))
+    )
+    assert parser.max_running == 3
+    assert [r.pdf_path for r in results] == pdf_paths
+    assert all(r.succeeded and r.attempts == 1 for r in results)
+    assert progress == [(i, 10) for i in range(1, 11)]
+    for pdf_path in pdf_paths:
+        assert not pp.needs_to_create_markdowns(pdf_path)
+        markdown_dir = pp.get_markdown_directory_name(pdf_path)
+        assert len(os.listdir(markdown_dir)) == 2
+
+
+def test_convert_pdfs_retries(pdf_paths):
+    """Tests that failures are retried up to the max attempts."""
+    parser = _LocalParser(failures={"doc0.pdf": 1, "doc1.pdf": 5})
+    results = conversion_scheduler.convert_pdfs(
+        pdf_paths, parser=parser, max_attempts=3, progress=lambda *_: None
+    )
+    assert results[0].succeeded and results[0].attempts == 2
+    assert not results[1].succeeded and results[1].attempts == 3
+    assert results[1].error == "service unavailable"
+    assert pp.needs_to_create_markdowns(pdf_paths[1])
+    assert not os.path.exists(
+        pp.get_markdown_directory_name(pdf_paths[1]) + "_temp"
+    )
+    assert all(r.succeeded for r in results[2:])
+
+
+def test_convert_pdfs_invalid_concurrency(pdf_paths):
+    """Tests passing an invalid concurrency."""
+    with pytest.raises(ValueError):
+        conversion_scheduler.convert_pdfs(pdf_paths, _LocalParser(), 0)
@@ -0,0 +1,72 @@
+"""Tests the doc_catalog module."""
+
+import os
+
+import pytest
+
+import ragit.libs.impl.doc_catalog as doc_catalog
+
+
+@pytest.fixture
+def documents(tmp_path):
+    """Creates a directory tree holding a few documents."""
+    nested = tmp_path / "nested" / "nested_2"
+    nested.mkdir(parents=True)
+    (tmp_path / "a.md").write_text("# A")
+    (tmp_path / "b.pdf").write_bytes(b"%PDF")
+    (tmp_path / "nested" / "c.py").write_text("print(1)")
+    (nested / "d.pdf").write_bytes(b"%PDF-1.4")
+    (tmp_path / "README").write_text("no extension")
+    yield tmp_path
+    doc_catalog.invalidate()
+
+
+def test_find_files(documents):
+    """Tests discovering the files by extension."""
+    retrieved = doc_catalog.find_files(documents, ["md", "py"])
+    expected = [
+        os.path.join(documents, "a.md"),
+        os.path.join(documents, "nested", "c.py"),
+    ]
+    assert sorted(f.fullpath for f in retrieved) == expected
+
+    retrieved = doc_catalog.find_files(documents, ["pdf"])
+    sizes = {os.path.basename(f.fullpath): f.size for f in retrieved}
+    assert sizes == {"b.pdf": 4, "d.pdf": 8}
+
+    retrieved = doc_catalog.find_files(documents)
+    assert len(retrieved) == 5
+
+
+def test_find_files_in_subtree(documents):
+    """Tests that a subtree is served from the same catalog."""
+    doc_catalog.find_files(documents)
+    retrieved = doc_catalog.find_files(documents / "nested", ["pdf"])
+    assert [os.path.basename(f.fullpath) for f in retrieved] == ["d.pdf"]
+
+
+def test_invalidation_by_mtime(documents):
+    """Tests that added and removed entries are picked up."""
+    assert len(doc_catalog.find_files(documents, ["md"])) == 1
+
+    nested = documents / "nested" / "nested_2"
+    (nested / "e.md").write_text("# E")
+    os.utime(nested, ns=(0, os.stat(nested).st_mtime_ns + 1))
+    assert len(doc_catalog.find_files(documents, ["md"])) == 2
+
+    (documents / "a.md").unlink()
+    os.utime(documents, ns=(0, os.stat(documents).st_mtime_ns + 1))
+    assert len(doc_catalog.find_files(documents, ["md"])) == 1
+
+
+def test_find_subdirectories(documents):
+    """Tests listing the subdirectories of a directory."""
+    assert doc_catalog.find_subdirectories(documents) == ["nested"]
+    assert doc_catalog.find_subdirectories(documents / "junk") == []
+
+
+def test_directory_exists(documents):
+    """Tests checking for an existing directory."""
+    assert doc_catalog.directory_exists(documents / "nested" / "nested_2")
+    assert not doc_catalog.directory_exists(documents / "a.md")
+    assert not doc_catalog.directory_exists(documents / "junk" / "junk")
@@ -21,3 +21,11 @@ class TestLLMWrapper(unittest.TestCase):
         expected_len = 1536
         self.assertEqual(len(retrieved), expected_len)
 
+    def test_get_embeddings_batch(self):
+        """Tests the get_embeddings_batch function."""
+        txts = ["hello world.", "goodbye world.", "hello world."]
+        retrieved = embeddings_retriever.get_embeddings_batch(txts)
+        self.assertEqual(len(retrieved), len(txts))
+        for embeddings in retrieved:
+            self.assertEqual(len(embeddings), 1536)
+        self.assertEqual(embeddings_retriever.get_embeddings_batch([]), [])
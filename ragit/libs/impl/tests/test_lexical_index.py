@@ -0,0 +1,77 @@
+"""Tests the lexical_index module."""
+
+import ragit.libs.impl.lexical_index as lexical_index
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+
+_CHUNKS = [
+    "The service fails with error code E1234 when the disk is full.",
+    "Call get_embeddings_batch to retrieve many embeddings at once.",
+    "Embeddings are retrieved in batches by the batch retriever.",
+    "Part number PN-778 replaces the older pump of the unit.",
+    "The disk of the unit must be replaced every year.",
+]
+
+
+def _make_index(tmp_path):
+    """Creates a lexical index holding the test chunks."""
+    index = lexical_index.LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    index.insert(
+        [10 + i for i in range(len(_CHUNKS))],
+        _CHUNKS,
+        [f"/docs/{'code' if i % 2 else 'manuals'}/doc-{i}.md"
+         for i in range(len(_CHUNKS))],
+        [i for i in range(len(_CHUNKS))]
+    )
+    return index
+
+
+def test_search_exact_identifiers(tmp_path):
+    """Tests finding chunks by identifiers embeddings tend to miss."""
+    index = _make_index(tmp_path)
+    assert index.get_number_of_records() == len(_CHUNKS)
+
+    matches = index.search("what does E1234 mean?", 3)
+    assert [m[0] for m in matches] == [_CHUNKS[0]]
+    assert matches[0][2:] == ("/docs/manuals/doc-0.md", 0)
+    assert matches[0][1] > 0
+
+    # An identifier is searched as the phrase of its parts.
+    matches = index.search("get_embeddings_batch", 3)
+    assert [m[0] for m in matches] == [_CHUNKS[1]]
+    matches = index.search("embeddings batch", 3)
+    assert {m[0] for m in matches} == {_CHUNKS[1], _CHUNKS[2]}
+
+    assert index.search("PN-778", 3)[0][0] == _CHUNKS[3]
+    assert index.search("?!", 3) == []
+    assert index.search("unknownword", 3) == []
+    index.close()
+
+
+def test_search_with_filter(tmp_path):
+    """Tests restricting the lexical search by the metadata."""
+    index = _make_index(tmp_path)
+    search_filter = abstract_vector_db.SearchFilter(
+        source_prefix="/docs/manuals/", min_page=1
+    )
+    matches = index.search("disk unit", 5, search_filter)
+    assert [m[0] for m in matches] == [_CHUNKS[4]]
+    index.close()
+
+
+def test_insert_replaces_existing_chunks(tmp_path):
+    """Tests that inserting an existing id replaces its chunk."""
+    index = _make_index(tmp_path)
+    index.insert([10], ["The error code is now E999."], ["/docs/a.md"], [1])
+    assert index.get_number_of_records() == len(_CHUNKS)
+    assert index.search("E1234", 3) == []
+    assert index.search("E999", 3)[0][2:] == ("/docs/a.md", 1)
+    index.close()
+
+
+def test_make_match_query():
+    """Tests converting a question to an FTS5 query."""
+    assert lexical_index.make_match_query("Is E1234 an E1234 error?") == \
+        '"Is" OR "E1234" OR "an" OR "error"'
+    assert lexical_index.make_match_query("get_x_ and 'quoted'") == \
+        '"get x" OR "and" OR "quoted"'
+    assert lexical_index.make_match_query("") == ""
@@ -19,4 +19,46 @@ def test_iter_markdown():
         print(txt)
         print(node.get_section_type())
         print("Size: ", len(txt))
-        print("================================")
\ No newline at end of file
+        print("================================")
+
+
+def test_iter_markdown_lines_headers_path():
+    """Tests the headers path assigned to each section."""
+    lines = [
+        "intro text\n",
+        "# H1\n",
+        "first paragraph\n",
+        "| a | b |\n",
+        "| 1 | 2 |\n",
+        "## H2\n",
+        "### H3\n",
+        "nested text\n",
+        "more nested text\n",
+        "## Other H2\n",
+        "other text\n",
+        "# Second H1\n",
+        "last text\n",
+    ]
+    retrieved = [
+        (s.get_headers(), s.get_inner_text(), s.get_section_type())
+        for s in mp.iter_markdown_lines(lines)
+    ]
+    expected = [
+        ("", "intro text", mp.SectionType.TEXT),
+        ("H1", "first paragraph", mp.SectionType.TEXT),
+        ("H1", "| a | b |\n| 1 | 2 |", mp.SectionType.TABLE),
+        ("H1 => H2 => H3", "nested text\nmore nested text",
+         mp.SectionType.TEXT),
+        ("H1 => Other H2", "other text", mp.SectionType.TEXT),
+        ("Second H1", "last text", mp.SectionType.TEXT),
+    ]
+    assert retrieved == expected
+
+
+def test_iter_markdown_lines_large_document():
+    """Tests parsing a large document with many nested headers."""
+    block = ["# H1\n", "## H2\n", "### H3\n", "some text.\n", "| x |\n"]
+    lines = block * 100000
+    sections = list(mp.iter_markdown_lines(lines))
+    assert len(sections) == 200000
+    assert sections[-1].get_headers() == "H1 => H2 => H3"
@@ -33,3 +33,40 @@ def test_split_single_chunk_no_periods():
     for chunk in retrieved:
         print(chunk)
         print("_____________________________________________")
+
+
+def test_split_respects_chunk_size():
+    """Tests that the chunks end at the separator closest to chunk_size."""
+    text = "aaaa. bbbb. cccc. dddd."
+    retrieved = list(ms.get_chunks(text, chunk_size=10))
+    assert retrieved == ["aaaa. bbbb.", "cccc. dddd."]
+
+
+def test_split_custom_separators():
+    """Tests splitting using separators other than the period."""
+    text = "first line; second line! third line"
+    retrieved = list(ms.get_chunks(text, chunk_size=12,
+                                   separators=(';', '!')))
+    assert retrieved == ["first line;", "second line!", "third line"]
+
+
+def test_split_invalid_chunk_size():
+    """Tests passing a non positive chunk size."""
+    with pytest.raises(ValueError):
+        list(ms.get_chunks("some text.", chunk_size=0))
+
+
+@pytest.mark.parametrize("sentence", [
+    "The quick brown fox jumps over the lazy dog. ",
+    "no periods in this text at all ",
+])
+def test_split_multi_mb_text(sentence):
+    """Tests splitting a multi MB text in a single pass.
+
+    The period free text used to recurse once per chunk and hit the
+    recursion limit long before reaching the end of the text.
+    """
+    text = sentence * (4 * 1024 * 1024 // len(sentence))
+    retrieved = list(ms.get_chunks(text, chunk_size=500))
+    assert all(len(chunk) <= 500 + len(sentence) for chunk in retrieved)
+    assert ''.join(retrieved).replace(' ', '') == text.replace(' ', '')
@@ -3,8 +3,11 @@
 
 import os
 import shutil
+import types
 
+import pypdf
 import pytest
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
 
 import ragit.libs.impl.pdf_preprocessor as pp
 import ragit.libs.common as common
@@ -53,3 +56,109 @@ def test_create_markdowns_from_pdf():
     pp.create_markdowns_from_pdf(pdf_path)
 
     assert pp.needs_to_create_markdowns(pdf_path) == False
+
+
+_TEXT_PAGE = "BT /F1 12 Tf 72 720 Td (Plain text page number {page}.) Tj ET"
+_TABLE_PAGE = " ".join(
+    f"72 {600 - row * 20} 200 20 re S" for row in range(10)
+)
+
+
+class _LocalParser:
+    """Local stand-in of the remote parser recording the parsed pages."""
+
+    def __init__(self):
+        """Initializer."""
+        self.parsed_page_counts = []
+
+    async def aload_data(self, pdf_path):
+        """Returns a markdown document for each page of the passed in pdf.
+
+        :param str pdf_path: The pdf to parse.
+        """
+        count = len(pypdf.PdfReader(pdf_path).pages)
+        self.parsed_page_counts.append(count)
+        return [
+            types.SimpleNamespace(text=f"| parsed | {index} |")
+            for index in range(count)
+        ]
+
+
+def _make_pdf(pdf_path, contents):
+    """Creates a pdf holding a page for each of the passed in contents.
+
+    :param str pdf_path: The path to the pdf to create.
+    :param list[str] contents: The content stream of each page.
+    """
+    writer = pypdf.PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for content in contents:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        stream = DecodedStreamObject()
+        stream.set_data(content.encode())
+        page.replace_contents(stream)
+    with open(pdf_path, 'wb') as fout:
+        writer.write(fout)
+
+
+def test_classify_pages(tmp_path):
+    """Tests classifying text, table and empty pages."""
+    pdf_path = str(tmp_path / "mixed.pdf")
+    _make_pdf(pdf_path, [
+        _TEXT_PAGE.format(page=1),
+        _TEXT_PAGE.format(page=2) + " " + _TABLE_PAGE,
+        "",
+    ])
+    assert pp.classify_pages(pdf_path) == [
+        pp.PageType.TEXT, pp.PageType.COMPLEX, pp.PageType.COMPLEX
+    ]
+
+
+def test_create_markdowns_locally(tmp_path):
+    """Tests that only the complex pages are sent to the parser."""
+    pdf_path = str(tmp_path / "manual.pdf")
+    _make_pdf(pdf_path, [
+        _TEXT_PAGE.format(page=1),
+        _TABLE_PAGE,
+        _TEXT_PAGE.format(page=3),
+    ])
+    parser = _LocalParser()
+    pp.create_markdowns_from_pdf(pdf_path, parser=parser)
+
+    assert parser.parsed_page_counts == [1]
+    markdown_dir = pp.get_markdown_directory_name(pdf_path)
+    assert sorted(os.listdir(markdown_dir)) == [
+        "manual-1.md", "manual-2.md", "manual-3.md"
+    ]
+    with open(os.path.join(markdown_dir, "manual-1.md")) as fin:
+        assert "Plain text page number 1." in fin.read()
+    with open(os.path.join(markdown_dir, "manual-2.md")) as fin:
+        assert fin.read() == "| parsed | 0 |"
+
+
+def test_create_markdowns_text_only_skips_parser(tmp_path):
+    """Tests that a text only pdf never reaches the parser."""
+    pdf_path = str(tmp_path / "text.pdf")
+    _make_pdf(pdf_path, [_TEXT_PAGE.format(page=1)])
+    parser = _LocalParser()
+    pp.create_markdowns_from_pdf(pdf_path, parser=parser)
+    assert parser.parsed_page_counts == []
+    assert not pp.needs_to_create_markdowns(pdf_path)
+
+
+def test_create_markdowns_without_local_extraction(tmp_path):
+    """Tests sending the whole pdf to the parser."""
+    pdf_path = str(tmp_path / "remote.pdf")
+    _make_pdf(pdf_path, [_TEXT_PAGE.format(page=1), _TABLE_PAGE])
+    parser = _LocalParser()
+    pp.create_markdowns_from_pdf(
+        pdf_path, parser=parser, local_extraction=False
+    )
+    assert parser.parsed_page_counts == [2]
@@ -0,0 +1,80 @@
+"""Tests the quantization module."""
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.quantization as quantization
+
+
+def _normalized(rows, dimension, seed):
+    """Returns random normalized vectors."""
+    vectors = np.random.default_rng(seed).normal(size=(rows, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def test_quantization_type_from_environment(monkeypatch):
+    """Tests reading the quantization from the environment."""
+    monkeypatch.delenv("VECTOR_QUANTIZATION", raising=False)
+    assert quantization.get_quantization_type() == \
+        quantization.QuantizationType.NONE
+    monkeypatch.setenv("VECTOR_QUANTIZATION", " sq8 ")
+    assert quantization.get_quantization_type() == \
+        quantization.QuantizationType.SQ8
+    monkeypatch.setenv("VECTOR_QUANTIZATION", "junk")
+    with pytest.raises(ValueError):
+        quantization.get_quantization_type()
+
+
+def test_search_is_exact(monkeypatch):
+    """Tests the blocked search against a single argsort."""
+    monkeypatch.setattr(quantization, "_BLOCK_ROWS", 100)
+    matrix = _normalized(1000, 16, 1)
+    queries = _normalized(10, 16, 2)
+    scores, ids = quantization.search(matrix, queries, 5)
+    expected = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+    assert np.array_equal(ids, expected)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    assert quantization.search(matrix[:3], queries, 5)[1].shape == (10, 3)
+
+
+def test_scalar_quantizer(tmp_path):
+    """Tests encoding, storing and searching the codes."""
+    matrix = _normalized(2000, 32, 3)
+    quantizer = quantization.ScalarQuantizer.train(matrix)
+    codes = quantizer.encode(matrix)
+    assert codes.dtype == np.uint8
+    assert np.abs(quantizer.decode(codes) - matrix).max() < 0.01
+
+    path = str(tmp_path / "params.npy")
+    assert quantization.ScalarQuantizer.load(path) is None
+    quantizer.save(path)
+    loaded = quantization.ScalarQuantizer.load(path)
+    assert np.array_equal(loaded.encode(matrix), codes)
+
+    queries = _normalized(50, 32, 4)
+    scores, ids = loaded.search(codes, queries, 10)
+    decoded = quantizer.decode(codes)
+    assert scores[:, 0] == pytest.approx(
+        (queries @ decoded.T).max(axis=1), abs=1e-4
+    )
+    _, expected_ids = quantization.search(matrix, queries, 10)
+    assert quantization.recall_at_k(expected_ids, ids) >= 0.9
+
+
+def test_recall_at_k():
+    """Tests the recall of retrieved against expected ids."""
+    assert quantization.recall_at_k([[1, 2], [3, 4]], [[2, 1], [3, 5]]) == \
+        pytest.approx(0.75)
+    assert quantization.recall_at_k([], []) == 1.0
+
+
+def test_codes_sizes():
+    """Tests the memory taken by each quantized vector."""
+    assert quantization.get_pq_codes_count(1536) == 192
+    assert quantization.get_pq_codes_count(100) == 10
+    assert quantization.get_pq_codes_count(7) == 1
+    none, sq8, pq = list(quantization.QuantizationType)
+    assert quantization.get_bytes_per_vector(none, 1536) == 6144
+    assert quantization.get_bytes_per_vector(sq8, 1536) == 1536
+    assert quantization.get_bytes_per_vector(pq, 1536) == 192
@@ -0,0 +1,33 @@
+"""Tests the rank_fusion module."""
+
+import pytest
+
+import ragit.libs.impl.rank_fusion as rank_fusion
+
+
+def test_reciprocal_rank_fusion():
+    """Tests fusing the rankings of the vector and the lexical search."""
+    vector_matches = [
+        ("a", 0.9, "doc.md", 1),
+        ("b", 0.8, "doc.md", 2),
+        ("c", 0.7, "doc.md", 3),
+    ]
+    lexical_matches = [
+        ("c", 12.5, "doc.md", 3),
+        ("d", 7.1, "doc.md", 4),
+        ("a", 3.2, "doc.md", 1),
+    ]
+    fused = rank_fusion.reciprocal_rank_fusion(
+        [vector_matches, lexical_matches], 3
+    )
+    assert [m[0] for m in fused] == ["a", "c", "b"]
+    assert fused[0] == (
+        "a", pytest.approx(1 / 61 + 1 / 63), "doc.md", 1
+    )
+    assert rank_fusion.reciprocal_rank_fusion([[], []], 3) == []
+
+    # The same text of a different page is a different match.
+    fused = rank_fusion.reciprocal_rank_fusion(
+        [[("a", 1., "doc.md", 1)], [("a", 1., "doc.md", 2)]], 5
+    )
+    assert len(fused) == 2
@@ -0,0 +1,80 @@
+"""Tests the response_cache module."""
+
+import os
+
+import pytest
+
+import ragit.libs.impl.response_cache as response_cache
+
+_SETTINGS = (3, 0.2, 2000, "gpt-4o", None, None, None)
+
+
+def test_is_enabled(monkeypatch):
+    monkeypatch.delenv("RESPONSE_CACHE", raising=False)
+    assert response_cache.is_enabled()
+    monkeypatch.setenv("RESPONSE_CACHE", "off")
+    assert not response_cache.is_enabled()
+    monkeypatch.setenv("RESPONSE_CACHE", "maybe")
+    with pytest.raises(ValueError):
+        response_cache.is_enabled()
+
+
+def test_make_key():
+    key = response_cache.make_key("What is  RAG?\n", _SETTINGS)
+    assert key == response_cache.make_key(" what is rag?", _SETTINGS)
+    assert key != response_cache.make_key("what is a rag?", _SETTINGS)
+    assert key != response_cache.make_key(
+        "what is rag?", _SETTINGS[:-1] + ("updated",)
+    )
+
+
+def test_get_and_put(tmp_path):
+    fullpath = os.path.join(tmp_path, "cache.db")
+    cache = response_cache.ResponseCache(fullpath, memory_size=1)
+    key = response_cache.make_key("what is rag?", _SETTINGS)
+    assert cache.get(key) is None
+    answer = {"response": "Retrieval augmented generation.", "k": 3}
+    cache.put(key, answer)
+    assert cache.get(key) == answer
+
+    # Evicted from memory, found in the database.
+    cache.put("other", {"response": "other"})
+    assert cache.get(key) == answer
+    assert cache.get_hit_rate() == round(2 / 3, 4)
+    cache.close()
+
+
+def test_answers_are_shared_and_persistent(tmp_path):
+    fullpath = os.path.join(tmp_path, "cache.db")
+    first = response_cache.ResponseCache(fullpath)
+    second = response_cache.ResponseCache(fullpath)
+    first.put("key", {"response": "shared"})
+    assert second.get("key") == {"response": "shared"}
+    first.close()
+    second.close()
+
+    reopened = response_cache.ResponseCache(fullpath)
+    assert reopened.get("key") == {"response": "shared"}
+    reopened.close()
+
+
+def test_oldest_answers_are_deleted(tmp_path):
+    fullpath = os.path.join(tmp_path, "cache.db")
+    cache = response_cache.ResponseCache(fullpath, memory_size=1, max_size=2)
+    for i in range(4):
+        cache.put(f"key{i}", i)
+    assert [cache.get(f"key{i}") for i in range(4)] == [None, None, 2, 3]
+    cache.close()
+
+
+def test_replaced_answers_are_not_evicted(tmp_path):
+    fullpath = os.path.join(tmp_path, "cache.db")
+    cache = response_cache.ResponseCache(fullpath, memory_size=1, max_size=5)
+    for i in range(5):
+        cache.put(f"key{i}", i)
+    for i in range(3):
+        cache.put("key0", i)
+    assert [cache.get(f"key{i}") for i in range(5)] == [2, 1, 2, 3, 4]
+    cache.put("key5", 5)
+    assert [cache.get(f"key{i}") for i in range(6)] == [2, None, 2, 3, 4, 5]
+    cache.close()
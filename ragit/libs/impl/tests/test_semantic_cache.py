@@ -0,0 +1,73 @@
+"""Tests the semantic_cache module."""
+
+import pytest
+
+import ragit.libs.impl.semantic_cache as semantic_cache
+
+_KEY = (3, 0.2, 2000, "gpt-4o", None, None, None)
+
+
+def test_get_similarity_threshold(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_THRESHOLD", raising=False)
+    assert semantic_cache.get_similarity_threshold() is None
+    monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", "0.95")
+    assert semantic_cache.get_similarity_threshold() == 0.95
+    for invalid in ("0", "1.5", "high"):
+        monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", invalid)
+        with pytest.raises(ValueError, match=f"not valid: {invalid}\\."):
+            semantic_cache.get_similarity_threshold()
+
+
+def test_get_ttl_and_max_size(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_TTL", raising=False)
+    monkeypatch.setenv("SEMANTIC_CACHE_SIZE", "10")
+    assert semantic_cache.get_ttl() > 0
+    assert semantic_cache.get_max_size() == 10
+    monkeypatch.setenv("SEMANTIC_CACHE_SIZE", "-1")
+    with pytest.raises(ValueError):
+        semantic_cache.get_max_size()
+
+
+def test_lookup_by_similarity():
+    cache = semantic_cache.SemanticCache(0.9)
+    assert cache.lookup([1., 0., 0.], _KEY) is None
+    cache.insert([1., 0., 0.], _KEY, "first")
+    cache.insert([0., 1., 0.], _KEY, "second")
+
+    # Similar enough (cosine 0.995) and scaled embeddings are hits.
+    assert cache.lookup([1., 0.1, 0.], _KEY) == "first"
+    assert cache.lookup([0., 2., 0.], _KEY) == "second"
+    # Not similar enough (cosine 0.707) or with other settings are misses.
+    assert cache.lookup([1., 1., 0.], _KEY) is None
+    assert cache.lookup([1., 0., 0.], _KEY[:-1] + ("updated",)) is None
+
+    metrics = cache.get_metrics()
+    assert (metrics.entries, metrics.hits, metrics.misses) == (2, 2, 3)
+    assert metrics.hit_rate == 0.4
+
+    cache.invalidate()
+    assert cache.lookup([1., 0., 0.], _KEY) is None
+    assert cache.get_metrics().entries == 0
+
+
+def test_least_recently_used_are_evicted():
+    cache = semantic_cache.SemanticCache(0.99, max_size=2)
+    cache.insert([1., 0., 0.], _KEY, "first")
+    cache.insert([0., 1., 0.], _KEY, "second")
+    assert cache.lookup([1., 0., 0.], _KEY) == "first"
+    cache.insert([0., 0., 1.], _KEY, "third")
+    assert cache.lookup([0., 1., 0.], _KEY) is None
+    assert cache.lookup([1., 0., 0.], _KEY) == "first"
+    assert cache.lookup([0., 0., 1.], _KEY) == "third"
+
+
+def test_expired_answers_are_removed(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = semantic_cache.SemanticCache(0.99, ttl=60)
+    cache.insert([1., 0.], _KEY, "answer")
+    now[0] += 59
+    assert cache.lookup([1., 0.], _KEY) == "answer"
+    now[0] += 2
+    assert cache.lookup([1., 0.], _KEY) is None
+    assert cache.get_metrics().entries == 0
@@ -0,0 +1,96 @@
+"""Tests the single_flight module."""
+
+import asyncio
+
+import pytest
+
+import ragit.libs.impl.single_flight as single_flight
+
+
+def test_concurrent_runs_are_coalesced():
+    flights = single_flight.SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def run():
+        results = await asyncio.gather(
+            *(flights.run("a", compute, 1) for _ in range(5)),
+            flights.run("b", compute, 2)
+        )
+        # The completed flights are not reused.
+        results.append(await flights.run("a", compute, 3))
+        return results
+
+    assert asyncio.run(run()) == [2, 2, 2, 2, 2, 4, 6]
+    assert calls == [1, 2, 3]
+    assert flights.get_metrics() == single_flight.FlightMetrics(
+        in_flight=0, led=3, coalesced=4
+    )
+
+
+def test_errors_are_shared():
+    flights = single_flight.SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def run():
+        return await asyncio.gather(
+            flights.run("a", fail), flights.run("a", fail),
+            return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flights.get_metrics().led == 1
+
+
+def test_cancelled_leader_does_not_cancel_the_computation():
+    flights = single_flight.SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        leader = asyncio.ensure_future(flights.run("a", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("a", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_wait_and_lead():
+    flights = single_flight.SingleFlight()
+
+    async def run():
+        assert await flights.wait("a") is None
+        flight = flights.lead("a")
+        waiting = asyncio.ensure_future(flights.wait("a"))
+        await asyncio.sleep(0)
+        flight.set_result("answer")
+        assert await waiting == "answer"
+
+        # An abandoned flight is computed again by the waiting requests.
+        flight = flights.lead("a")
+        waiting = asyncio.ensure_future(flights.run("a", compute))
+        await asyncio.sleep(0)
+        flight.cancel()
+        assert await waiting == "computed"
+        assert await flights.wait("a") is None
+
+    async def compute():
+        return "computed"
+
+    asyncio.run(run())
+    assert flights.get_metrics().led == 3
@@ -0,0 +1,44 @@
+"""Tests the vdb_abstract_base module."""
+
+import pytest
+
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+
+
+def test_validate_filters():
+    """Tests converting the filters to a search filter."""
+    assert abstract_vector_db.validate_filters(None) is None
+    assert abstract_vector_db.validate_filters({}) is None
+    assert abstract_vector_db.validate_filters(
+        abstract_vector_db.SearchFilter()
+    ) is None
+
+    search_filter = abstract_vector_db.validate_filters(
+        {"source": "a.pdf", "page": "3"}
+    )
+    assert search_filter == abstract_vector_db.SearchFilter(
+        source="a.pdf", min_page=3, max_page=3
+    )
+
+    search_filter = abstract_vector_db.validate_filters(
+        {"source_prefix": "/docs/", "file_types": ".PDF, md,"}
+    )
+    assert search_filter.source_prefix == "/docs/"
+    assert search_filter.file_types == ("md", "pdf")
+
+    search_filter = abstract_vector_db.validate_filters(
+        abstract_vector_db.SearchFilter(min_page=1, file_types=["TXT"])
+    )
+    assert search_filter.file_types == ("txt",)
+
+    with pytest.raises(ValueError):
+        abstract_vector_db.validate_filters({"text": "junk"})
+    with pytest.raises(ValueError):
+        abstract_vector_db.validate_filters({"min_page": "first"})
+
+
+def test_get_file_type():
+    """Tests the file type of a document."""
+    assert abstract_vector_db.get_file_type("/docs/Manual.PDF") == "pdf"
+    assert abstract_vector_db.get_file_type("/docs/README") == ""
+    assert abstract_vector_db.get_file_type(None) == ""
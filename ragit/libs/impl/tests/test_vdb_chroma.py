@@ -0,0 +1,66 @@
+"""Tests the vdb_chroma module."""
+
+import random
+
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+import ragit.libs.impl.vdb_chroma as vdb_chroma
+
+_DIMENSION = 16
+
+
+def test_insert_in_batches(tmp_path, monkeypatch):
+    """Tests inserting more records than the client accepts at once."""
+    monkeypatch.setattr(
+        vdb_chroma.ChromaVectorDb, "_get_max_batch_size", lambda self: 7
+    )
+    fullpath = str(tmp_path / "chroma-vector.db")
+    vdb = vdb_chroma.ChromaVectorDb(fullpath, "dummy", _DIMENSION)
+    rnd = random.Random(3)
+    count = 50
+    embeddings = [
+        [rnd.uniform(-1, 1) for _ in range(_DIMENSION)] for _ in range(count)
+    ]
+    chunks = [f"chunk {i}" for i in range(count)]
+    sources = [f"doc-{i % 3}.pdf" for i in range(count)]
+    pages = [i % 4 for i in range(count)]
+    vdb.insert(chunks, embeddings, sources, pages, ids=list(range(count)))
+    assert vdb.get_number_of_records() == count
+
+    matches = vdb.search_by_vector(embeddings[10], 3)
+    assert matches[0][0] == "chunk 10"
+    assert matches[0][2:] == ("doc-1.pdf", 2)
+
+    matches = vdb.search_by_vector(embeddings[10], 3, {"source": "doc-2.pdf"})
+    assert all(m[2] == "doc-2.pdf" for m in matches)
+    vdb.close()
+
+
+def test_make_where():
+    """Tests compiling a search filter to a where clause."""
+    search_filter = abstract_vector_db.SearchFilter(
+        source_prefix="/docs/manuals/", min_page=2, max_page=4,
+        file_types=("pdf",)
+    )
+    assert vdb_chroma._make_where(search_filter) == {
+        "$and": [
+            {"directory_3": "/docs/manuals"},
+            {"file_type": {"$in": ["pdf"]}},
+            {"page": {"$gte": 2}},
+            {"page": {"$lte": 4}},
+        ]
+    }
+    search_filter = abstract_vector_db.SearchFilter(file_types=("md",))
+    assert vdb_chroma._make_where(search_filter) == \
+        {"file_type": {"$in": ["md"]}}
+    assert vdb_chroma._make_where(None) is None
+
+
+def test_get_directories():
+    """Tests the directories stored to match a source prefix."""
+    assert vdb_chroma._get_directories("/docs/manuals/a_markdown_/a-1.md") == {
+        "directory_1": "/",
+        "directory_2": "/docs",
+        "directory_3": "/docs/manuals",
+        "directory_4": "/docs/manuals/a_markdown_",
+    }
+    assert vdb_chroma._get_directories(None) == {}
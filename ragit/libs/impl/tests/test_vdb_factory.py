@@ -96,3 +96,13 @@ class TestVectorDb(unittest.TestCase):
         """Tests creating a VectorDb using milvus."""
         os.environ["VECTOR_DB_PROVIDER"] = "MILVUS"
         self._create_and_query_vector_db("milvus_vector.db")
+
+    def test_creation_using_faiss(self):
+        """Tests creating a VectorDb using faiss."""
+        os.environ["VECTOR_DB_PROVIDER"] = "FAISS"
+        self._create_and_query_vector_db("faiss_vector.db")
+
+    def test_creation_using_numpy(self):
+        """Tests creating a VectorDb using numpy."""
+        os.environ["VECTOR_DB_PROVIDER"] = "NUMPY"
+        self._create_and_query_vector_db("numpy_vector.db")
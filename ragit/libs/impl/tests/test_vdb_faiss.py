@@ -0,0 +1,183 @@
+"""Tests the vdb_faiss module."""
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.quantization as quantization
+import ragit.libs.impl.vdb_faiss as vdb_faiss
+
+# The length of the embeddings (see conftest.vectors).
+_DIMENSION = 16
+
+
+@pytest.mark.parametrize("index_type", list(vdb_faiss.FaissIndexType))
+def test_insert_and_query(tmp_path, vectors, index_type, insert_chunks):
+    """Tests inserting in batches, reopening and querying."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION, index_type)
+    assert vdb.get_number_of_records() == 0
+    assert vdb.query("chunk 0") == []
+
+    insert_chunks(vdb, vectors[:500], 0)
+    assert vdb.get_number_of_records() == 500
+    insert_chunks(vdb, vectors[500:], 500)
+    assert vdb.get_number_of_records() == len(vectors)
+    vdb.close()
+
+    # The index type is read from the existing vector db.
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_index_type() == index_type
+    assert vdb.get_number_of_records() == len(vectors)
+    for i in (0, 777, 1999):
+        matches = vdb.query(f"chunk {i}", 3)
+        assert len(matches) == 3
+        txt, distance, source, page = matches[0]
+        assert txt == f"chunk {i}"
+        assert distance == pytest.approx(1.0, abs=1e-4)
+        assert source == f"doc-{i % 5}.pdf"
+        assert page == i % 7
+    vdb.close()
+
+
+def test_index_is_written_once_per_flush(tmp_path, vectors, insert_chunks):
+    """Tests that the batches are kept in memory until flushed."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    index_path = tmp_path / "faiss-vector.db" / "dummy.faiss"
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION)
+    insert_chunks(vdb, vectors[:500], 0)
+    insert_chunks(vdb, vectors[500:1000], 500)
+    assert not index_path.exists()
+    vdb.flush()
+    assert index_path.exists()
+    insert_chunks(vdb, vectors[1000:], 1000)
+    assert vdb_faiss.faiss.read_index(str(index_path)).ntotal == 1000
+    assert vdb.query("chunk 1999", 1)[0][0] == "chunk 1999"
+
+    # Closing writes the records inserted since the last flush.
+    vdb.close()
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_number_of_records() == len(vectors)
+    assert vdb.query("chunk 1999", 1)[0][0] == "chunk 1999"
+    vdb.close()
+
+
+@pytest.mark.parametrize("index_type", list(vdb_faiss.FaissIndexType))
+def test_search_by_vector_with_filters(tmp_path, vectors, index_type,
+                                      insert_chunks):
+    """Tests searching by vector restricted to some metadata."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION, index_type)
+    insert_chunks(vdb, vectors, 0)
+
+    filters = {"source": "doc-2.pdf", "page": 5}
+    matches = vdb.search_by_vector(vectors[12], 3, filters)
+    assert matches[0][0] == "chunk 12"
+    assert all(m[2:] == ("doc-2.pdf", 5) for m in matches)
+    assert vdb.search_by_vector(vectors[12], 3, {"page": 100}) == []
+    vdb.close()
+
+
+def test_ivf_is_trained_lazily(tmp_path, vectors, insert_chunks):
+    """Tests that the IVF index is trained once enough records exist."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(
+        fullpath, "dummy", _DIMENSION, vdb_faiss.FaissIndexType.IVF
+    )
+    insert_chunks(vdb, vectors[:100], 0)
+    assert not isinstance(vdb._index, vdb_faiss.faiss.IndexIVF)
+    insert_chunks(vdb, vectors[100:], 100)
+    assert isinstance(vdb._index, vdb_faiss.faiss.IndexIVF)
+    assert vdb._index.nlist == 44
+    vdb.close()
+
+
+@pytest.mark.parametrize("index_type", list(vdb_faiss.FaissIndexType))
+def test_scalar_quantization(tmp_path, vectors, index_type, insert_chunks):
+    """Tests storing the embeddings quantized to a byte per dimension."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(
+        fullpath, "dummy", _DIMENSION, index_type,
+        quantization.QuantizationType.SQ8
+    )
+    insert_chunks(vdb, vectors[:1000], 0)
+    insert_chunks(vdb, vectors[1000:], 1000)
+    vdb.close()
+
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_quantization() == quantization.QuantizationType.SQ8
+    expected_class = {
+        vdb_faiss.FaissIndexType.FLAT: vdb_faiss.faiss.IndexScalarQuantizer,
+        vdb_faiss.FaissIndexType.IVF:
+            vdb_faiss.faiss.IndexIVFScalarQuantizer,
+        vdb_faiss.FaissIndexType.HNSW: vdb_faiss.faiss.IndexHNSWSQ,
+    }[index_type]
+    assert isinstance(vdb._index, expected_class)
+    assert vdb.get_number_of_records() == len(vectors)
+    stored = np.load(str(tmp_path / "faiss-vector.db" / "dummy.vectors.npy"))
+    assert stored.shape == (len(vectors), _DIMENSION)
+
+    matches = vdb.query("chunk 1234", 3)
+    assert matches[0][0] == "chunk 1234"
+    assert matches[0][1] == pytest.approx(1.0, abs=0.05)
+    assert vdb.evaluate_recall(10) >= 0.8
+    vdb.close()
+
+
+def test_product_quantization(tmp_path, insert_chunks):
+    """Tests training the product quantizer once enough records exist."""
+    rng = np.random.default_rng(13)
+    embeddings = rng.normal(size=(10000, _DIMENSION))
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(
+        fullpath, "dummy", _DIMENSION, vdb_faiss.FaissIndexType.HNSW,
+        quantization.QuantizationType.PQ
+    )
+    insert_chunks(vdb, embeddings[:5000], 0)
+    assert isinstance(vdb._index, vdb_faiss.faiss.IndexHNSWFlat)
+    assert vdb.evaluate_recall() >= 0.9
+    insert_chunks(vdb, embeddings[5000:], 5000)
+    assert isinstance(vdb._index, vdb_faiss.faiss.IndexHNSWPQ)
+    storage = vdb_faiss.faiss.downcast_index(vdb._index.storage)
+    assert storage.pq.M == quantization.get_pq_codes_count(_DIMENSION)
+
+    # The L2 distances of the index are converted to cosine similarities.
+    matches = vdb.search_by_vector(embeddings[7], 3)
+    assert len(matches) == 3
+    assert -1.0 <= matches[-1][1] <= matches[0][1] <= 1.5
+    assert 0.0 < vdb.evaluate_recall(10) <= 1.0
+    vdb.close()
+
+
+def test_index_type_from_environment(monkeypatch):
+    """Tests reading the index type from the environment."""
+    monkeypatch.delenv("FAISS_INDEX_TYPE", raising=False)
+    assert vdb_faiss.get_index_type() == vdb_faiss.FaissIndexType.FLAT
+    monkeypatch.setenv("FAISS_INDEX_TYPE", " hnsw ")
+    assert vdb_faiss.get_index_type() == vdb_faiss.FaissIndexType.HNSW
+    monkeypatch.setenv("FAISS_INDEX_TYPE", "junk")
+    with pytest.raises(ValueError):
+        vdb_faiss.get_index_type()
+
+
+def test_invalid_dimension(tmp_path, vectors, insert_chunks):
+    """Tests inserting embeddings of the wrong dimension."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION + 1)
+    with pytest.raises(ValueError):
+        insert_chunks(vdb, vectors[:10], 0)
+    vdb.close()
+
+
+@pytest.mark.parametrize("index_type", list(vdb_faiss.FaissIndexType))
+def test_warm_up(tmp_path, vectors, index_type, insert_chunks):
+    """Tests warming up an empty and a memory mapped vector db."""
+    fullpath = str(tmp_path / "faiss-vector.db")
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION, index_type)
+    vdb.warm_up()
+    insert_chunks(vdb, vectors[:100], 0)
+    vdb.close()
+
+    vdb = vdb_faiss.FaissVectorDb(fullpath, "dummy", _DIMENSION)
+    vdb.warm_up()
+    assert vdb.search_by_vector(vectors[7], 1)[0][0] == "chunk 7"
+    vdb.close()
@@ -0,0 +1,91 @@
+"""Tests the search filters on the chunks of a documents tree."""
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.lexical_index as lexical_index
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+import ragit.libs.impl.vdb_faiss as vdb_faiss
+import ragit.libs.impl.vdb_numpy as vdb_numpy
+
+_DIMENSION = 8
+
+
+@pytest.fixture
+def documents(tmp_path):
+    """Creates a documents tree and returns its chunks like the splitter.
+
+    The manual.pdf was converted to the markdown of each of its pages.
+    """
+    manuals = tmp_path / "docs" / "manuals"
+    markdowns = manuals / "manual_markdown_"
+    markdowns.mkdir(parents=True)
+    (manuals / "manual.pdf").write_bytes(b"%PDF")
+    sources = []
+    for page in range(1, 6):
+        path = markdowns / f"manual-{page}.md"
+        path.write_text(f"# Page {page}\nThe disk of page {page}.\n")
+        sources.append(str(path))
+    notes = tmp_path / "docs" / "notes"
+    notes.mkdir()
+    for name in ("notes.md", "setup.docx"):
+        (notes / name).write_text("The disk of the notes.")
+        sources.append(str(notes / name))
+    # The splitter does not know the pages of the markdowns.
+    pages = ["n/a"] * 6 + [2]
+    chunks = [f"chunk {i} disk" for i in range(len(sources))]
+    return tmp_path / "docs", chunks, sources, pages
+
+
+def _make_vdb(provider, fullpath):
+    """Creates the vector db of the passed in provider."""
+    if provider == "NUMPY":
+        return vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    return vdb_faiss.FaissVectorDb(
+        fullpath, "dummy", _DIMENSION, vdb_faiss.FaissIndexType[provider]
+    )
+
+
+def _get_cases(docs):
+    """Returns the filters and the indexes of the chunks they match."""
+    return [
+        ({"file_types": "pdf"}, {0, 1, 2, 3, 4}),
+        ({"min_page": 2}, {1, 2, 3, 4, 6}),
+        ({"max_page": 2}, {0, 1, 5, 6}),
+        ({"min_page": 2, "max_page": 3, "file_types": "pdf"}, {1, 2}),
+        ({"source_prefix": str(docs / "manuals")}, {0, 1, 2, 3, 4}),
+        ({"source_prefix": str(docs / "notes") + "/"}, {5, 6}),
+        # A prefix matches whole directories only.
+        ({"source_prefix": str(docs / "man")}, set()),
+        ({"file_types": ["md"]}, {5}),
+        ({"page": 4}, {3}),
+    ]
+
+
+@pytest.mark.parametrize("provider", ["NUMPY", "FLAT", "IVF", "HNSW"])
+def test_filters_on_markdown_pages(tmp_path, documents, provider):
+    """Tests filtering the markdown pages of a pdf by page and type."""
+    docs, chunks, sources, pages = documents
+    vdb = _make_vdb(provider, str(tmp_path / "vector.db"))
+    rng = np.random.default_rng(5)
+    embeddings = rng.normal(size=(len(chunks), _DIMENSION)).tolist()
+    vdb.insert(chunks, embeddings, sources, pages)
+
+    matches = vdb.search_by_vector(embeddings[2], 1)
+    assert matches[0][2:] == (sources[2], 3)
+    for filters, expected in _get_cases(docs):
+        matches = vdb.search_by_vector(embeddings[0], len(chunks), filters)
+        assert {chunks.index(m[0]) for m in matches} == expected, filters
+    vdb.close()
+
+
+def test_lexical_filters_on_markdown_pages(tmp_path, documents):
+    """Tests filtering the lexical matches of the markdown pages."""
+    docs, chunks, sources, pages = documents
+    index = lexical_index.LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    index.insert(list(range(len(chunks))), chunks, sources, pages)
+    for filters, expected in _get_cases(docs):
+        search_filter = abstract_vector_db.validate_filters(filters)
+        matches = index.search("disk", len(chunks), search_filter)
+        assert {chunks.index(m[0]) for m in matches} == expected, filters
+    index.close()
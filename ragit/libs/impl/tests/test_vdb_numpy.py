@@ -0,0 +1,230 @@
+"""Tests the vdb_numpy module."""
+
+import numpy as np
+import pytest
+
+import ragit.libs.impl.quantization as quantization
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+import ragit.libs.impl.vdb_numpy as vdb_numpy
+
+# The length of the embeddings (see conftest.vectors).
+_DIMENSION = 16
+
+
+def test_insert_and_query(tmp_path, vectors, insert_chunks):
+    """Tests appending in batches, reopening and querying."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_number_of_records() == 0
+    assert vdb.query("chunk 0") == []
+
+    for first in range(0, len(vectors), 300):
+        insert_chunks(vdb, vectors[first:first + 300], first)
+    assert vdb.get_number_of_records() == len(vectors)
+    vdb.close()
+
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_number_of_records() == len(vectors)
+    matrix = np.load(str(tmp_path / "numpy-vector.db" / "dummy.npy"))
+    assert matrix.shape == (len(vectors), _DIMENSION)
+
+    for i in (0, 299, 300, 999):
+        matches = vdb.query(f"chunk {i}", 3)
+        assert len(matches) == 3
+        txt, distance, source, page = matches[0]
+        assert txt == f"chunk {i}"
+        assert distance == pytest.approx(1.0, abs=1e-5)
+        assert source == f"doc-{i % 5}.pdf"
+        assert page == i % 7
+        assert matches[0][1] >= matches[1][1] >= matches[2][1]
+    vdb.close()
+
+
+def test_query_vectors_is_exact(tmp_path, vectors, monkeypatch, insert_chunks):
+    """Tests the batched queries against a brute force search."""
+    monkeypatch.setattr(quantization, "_BLOCK_ROWS", 128)
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    insert_chunks(vdb, vectors, 0)
+
+    rng = np.random.default_rng(3)
+    queries = rng.normal(size=(20, _DIMENSION))
+    all_matches = vdb.query_vectors(queries.tolist(), 5)
+    assert len(all_matches) == len(queries)
+
+    matrix = np.array(vectors)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+    for matches, ids in zip(all_matches, expected):
+        assert [m[0] for m in matches] == [f"chunk {i}" for i in ids]
+    vdb.close()
+
+
+def test_query_batch(tmp_path, vectors, insert_chunks):
+    """Tests that a batch of queries matches the queries one by one."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    insert_chunks(vdb, vectors, 0)
+    queries = [f"chunk {i}" for i in (5, 50, 500)]
+    retrieved = vdb.query_batch(queries, 4)
+    for matches, query in zip(retrieved, queries):
+        expected = vdb.query(query, 4)
+        assert [m[0] for m in matches] == [m[0] for m in expected]
+        assert [m[1] for m in matches] == \
+            pytest.approx([m[1] for m in expected], abs=1e-6)
+    assert [matches[0][0] for matches in retrieved] == queries
+    assert vdb.query_batch([]) == []
+    assert vdb.query_vectors([]) == []
+    vdb.close()
+
+
+def test_search_by_vector_with_filters(tmp_path, vectors, insert_chunks):
+    """Tests searching by vector restricted to some metadata."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    insert_chunks(vdb, vectors, 0)
+
+    matches = vdb.search_by_vector(vectors[12], 5, {"source": "doc-2.pdf"})
+    assert matches[0][0] == "chunk 12"
+    assert len(matches) == 5
+    assert all(m[2] == "doc-2.pdf" for m in matches)
+
+    filters = {"source": "doc-3.pdf", "page": 1}
+    matches = vdb.search_by_vector(vectors[12], 500, filters)
+    assert len(matches) == len(
+        [i for i in range(len(vectors)) if i % 5 == 3 and i % 7 == 1]
+    )
+    assert all(m[2:] == ("doc-3.pdf", 1) for m in matches)
+
+    assert vdb.search_by_vector(vectors[12], 5, {"source": "junk"}) == []
+    with pytest.raises(ValueError):
+        vdb.search_by_vector(vectors[12], 5, {"text": "chunk 12"})
+    vdb.close()
+
+
+def test_scalar_quantization(tmp_path, vectors, insert_chunks):
+    """Tests storing the embeddings quantized to a byte per dimension."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(
+        fullpath, "dummy", _DIMENSION, quantization.QuantizationType.SQ8
+    )
+    # The quantizer is trained by the first insert and retrained when the
+    # records quadruple.
+    insert_chunks(vdb, vectors[:200], 0)
+    assert vdb._trained_count == 200
+    insert_chunks(vdb, vectors[200:500], 200)
+    assert vdb._trained_count == 200
+    insert_chunks(vdb, vectors[500:], 500)
+    assert vdb._trained_count == len(vectors)
+    vdb.close()
+
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb.get_quantization() == quantization.QuantizationType.SQ8
+    assert vdb._codes.dtype == np.uint8
+    assert vdb._codes.shape == (len(vectors), _DIMENSION)
+    assert sorted(p.name for p in (tmp_path / "numpy-vector.db").iterdir()) \
+        == ["dummy.npy", f"dummy.sq8-{len(vectors)}-params.npy",
+            f"dummy.sq8-{len(vectors)}.npy", "dummy.sqlite"]
+
+    for i in (0, 444, 999):
+        matches = vdb.query(f"chunk {i}", 3)
+        assert matches[0][0] == f"chunk {i}"
+        assert matches[0][1] == pytest.approx(1.0, abs=0.05)
+    matches = vdb.search_by_vector(vectors[12], 5, {"source": "doc-2.pdf"})
+    assert matches[0][0] == "chunk 12"
+    assert all(m[2] == "doc-2.pdf" for m in matches)
+    assert vdb.evaluate_recall(10) >= 0.9
+    vdb.close()
+
+
+def test_missing_codes_are_encoded(tmp_path, vectors, insert_chunks):
+    """Tests recovering from an insertion interrupted before its codes."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(
+        fullpath, "dummy", _DIMENSION, quantization.QuantizationType.SQ8
+    )
+    insert_chunks(vdb, vectors[:100], 0)
+    vdb.close()
+    codes_path = str(tmp_path / "numpy-vector.db" / "dummy.sq8-100.npy")
+    codes = np.load(codes_path)
+    np.save(codes_path, codes[:60])
+
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    assert vdb._codes.shape == (100, _DIMENSION)
+    assert np.array_equal(vdb._codes, codes)
+    insert_chunks(vdb, vectors[100:300], 100)
+    assert vdb._codes.shape == (300, _DIMENSION)
+    assert vdb.query("chunk 250")[0][0] == "chunk 250"
+    vdb.close()
+
+
+def test_product_quantization_is_not_supported(tmp_path):
+    """Tests that product quantization is left to the FAISS vector db."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    with pytest.raises(ValueError):
+        vdb_numpy.NumpyVectorDb(
+            fullpath, "dummy", _DIMENSION, quantization.QuantizationType.PQ
+        )
+
+
+def test_full_precision_recall(tmp_path, vectors, insert_chunks):
+    """Tests that the exact search has perfect recall."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(
+        fullpath, "dummy", _DIMENSION, quantization.QuantizationType.NONE
+    )
+    assert vdb.evaluate_recall() == 1.0
+    insert_chunks(vdb, vectors, 0)
+    assert vdb.evaluate_recall() == 1.0
+    vdb.close()
+
+
+def test_search_filter_is_pushed_down(tmp_path, vectors):
+    """Tests filtering by source prefix, page range and file type."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(fullpath, "dummy", _DIMENSION)
+    count = len(vectors)
+    chunks = [f"chunk {i}" for i in range(count)]
+    sources = [
+        f"/docs/{'manuals' if i % 2 else 'notes'}/doc-{i % 5}."
+        f"{'PDF' if i % 3 else 'md'}"
+        for i in range(count)
+    ]
+    pages = [i % 7 for i in range(count)]
+    vdb.insert(chunks, vectors, sources, pages)
+
+    search_filter = abstract_vector_db.SearchFilter(
+        source_prefix="/docs/manuals/", min_page=2, max_page=4,
+        file_types=("pdf",)
+    )
+    expected = {
+        f"chunk {i}" for i in range(count)
+        if i % 2 and 2 <= i % 7 <= 4 and i % 3
+    }
+    matches = vdb.search_by_vector(vectors[11], count, search_filter)
+    assert {m[0] for m in matches} == expected
+    assert matches[0][0] == "chunk 11"
+
+    matches = vdb.search_by_vector(
+        vectors[0], count, {"source_prefix": "/docs/notes", "file_types": "md"}
+    )
+    assert {m[0] for m in matches} == \
+        {f"chunk {i}" for i in range(count) if i % 2 == 0 and i % 3 == 0}
+    assert vdb.search_by_vector(
+        vectors[0], 3, {"source_prefix": "/docs/notes%"}
+    ) == []
+    vdb.close()
+
+
+def test_warm_up(tmp_path, vectors, insert_chunks):
+    """Tests warming up an empty and a quantized vector db."""
+    fullpath = str(tmp_path / "numpy-vector.db")
+    vdb = vdb_numpy.NumpyVectorDb(
+        fullpath, "dummy", _DIMENSION, quantization.QuantizationType.SQ8
+    )
+    vdb.warm_up()
+    insert_chunks(vdb, vectors[:100], 0)
+    vdb.warm_up()
+    assert vdb.search_by_vector(vectors[7], 1)[0][0] == "chunk 7"
+    vdb.close()
@@ -0,0 +1,65 @@
+"""Tests the vdb_versions module."""
+
+import os
+
+import pytest
+
+import ragit.libs.impl.vdb_versions as vdb_versions
+
+
+def test_unversioned_vector_db(tmp_path):
+    directory = str(tmp_path)
+    assert vdb_versions.get_current_version(directory) is None
+    assert vdb_versions.get_version_dir(directory, None) == directory
+    assert vdb_versions.get_versions(directory) == []
+
+
+def test_set_current_version(tmp_path):
+    directory = str(tmp_path)
+    version = vdb_versions.make_version()
+    with pytest.raises(NotADirectoryError):
+        vdb_versions.set_current_version(directory, version)
+
+    version_dir = vdb_versions.get_version_dir(directory, version)
+    os.makedirs(version_dir)
+    vdb_versions.set_current_version(directory, version)
+    assert vdb_versions.get_current_version(directory) == version
+    assert version_dir.startswith(os.path.join(directory, "versions"))
+    assert not os.path.exists(os.path.join(directory, "CURRENT.tmp"))
+
+
+def test_remove_old_versions(tmp_path):
+    directory = str(tmp_path)
+    versions = [f"2024010100000{i}" for i in range(4)]
+    for version in versions:
+        os.makedirs(vdb_versions.get_version_dir(directory, version))
+    assert vdb_versions.get_versions(directory) == versions
+
+    # The current version is never removed even when it is not the latest.
+    vdb_versions.set_current_version(directory, versions[0])
+    with pytest.raises(ValueError):
+        vdb_versions.remove_version(directory, versions[0])
+    vdb_versions.remove_old_versions(directory, keep=2)
+    assert vdb_versions.get_versions(directory) == [
+        versions[0], versions[2], versions[3]
+    ]
+
+    vdb_versions.set_current_version(directory, versions[3])
+    vdb_versions.remove_old_versions(directory, keep=2)
+    assert vdb_versions.get_versions(directory) == versions[2:]
+
+
+def test_make_version_sorts_in_creation_order():
+    first = vdb_versions.make_version()
+    second = vdb_versions.make_version()
+    assert first <= second
+
+
+def test_update_stamp(tmp_path):
+    directory = str(tmp_path)
+    assert vdb_versions.get_update_stamp(directory) is None
+    vdb_versions.mark_updated(directory)
+    first = vdb_versions.get_update_stamp(directory)
+    assert first
+    vdb_versions.mark_updated(directory)
+    assert vdb_versions.get_update_stamp(directory) not in (None, first)
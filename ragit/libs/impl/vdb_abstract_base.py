@@ -1,6 +1,150 @@
 """Defines the abstract base class for a vectordb."""
 
 import abc
+import dataclasses
+import os
+import re
+
+import ragit.libs.impl.embeddings_retriever as embeddings_retriever
+import ragit.libs.impl.quantization as quantization
+
+# The fields of a filters dictionary (see validate_filters).
+FILTER_FIELDS = (
+    "source", "page", "source_prefix", "min_page", "max_page", "file_types"
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class SearchFilter:
+    """Restricts a search to the chunks with the matching metadata.
+
+    All the set conditions must be satisfied. The filter is compiled to the
+    native expression of each vector db so the search space is pruned by the
+    engine instead of post filtering the matches.
+
+    str source: The full path to the only document to search.
+    str source_prefix: The directory of the documents to search (like the
+    directory of a manual) including its subdirectories.
+    int min_page: The first page to search.
+    int max_page: The last page to search.
+    tuple[str] file_types: The extensions (lower case, without the leading
+    dot) of the original documents to search (see get_file_type).
+    """
+
+    source: str = None
+    source_prefix: str = None
+    min_page: int = None
+    max_page: int = None
+    file_types: tuple = ()
+
+    def __bool__(self):
+        """Returns True if any condition is set.
+
+        :returns: True if any condition is set.
+        :rtype: bool
+        """
+        return any(
+            getattr(self, field.name) not in (None, "", ())
+            for field in dataclasses.fields(self)
+        )
+
+
+def get_file_type(source):
+    """Returns the file type of the original document of a chunk.
+
+    The pdf files are chunked from the markdown of each of their pages (see
+    pdf_preprocessor), so the chunks of those markdowns are of the pdf type.
+
+    :param str source: The full path to the chunked document.
+
+    :returns: The lower case extension of the document without the dot.
+    :rtype: str
+    """
+    if _get_markdown_page(source) is not None:
+        return "pdf"
+    return os.path.splitext(source or "")[1].lstrip(".").lower()
+
+
+def get_page(source, page):
+    """Returns the page of the original document of a chunk.
+
+    The splitter does not know the page of the markdown of a pdf page, so
+    it is read from the name of the markdown (<name>-<page>.md).
+
+    :param str source: The full path to the chunked document.
+    :param page: The page found by the splitter (like n/a if unknown).
+
+    :returns: The page or 0 if it is unknown.
+    :rtype: int
+    """
+    markdown_page = _get_markdown_page(source)
+    if markdown_page is not None:
+        return markdown_page
+    try:
+        return int(page or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_prefix_directory(source_prefix):
+    """Returns the directory matched by a source prefix.
+
+    :param str source_prefix: The source prefix of a search filter.
+
+    :returns: The directory ending with a separator, so that it is a prefix
+    only of the full paths of the documents under it.
+    :rtype: str
+    """
+    return os.path.join(os.path.normpath(source_prefix), "")
+
+
+def validate_filters(filters):
+    """Validates the filters passed to a search.
+
+    The filters are either a SearchFilter or a dictionary of its fields; for
+    backwards compatibility the page key of a dictionary restricts the search
+    to a single page. A single file type can be passed as a string.
+
+    :param SearchFilter | dict filters: The filters to validate or None for
+    no filters.
+
+    :returns: The validated filters or None if there are no filters.
+    :rtype: SearchFilter | None
+
+    :raises: ValueError
+    """
+    if not filters:
+        return None
+    if isinstance(filters, SearchFilter):
+        values = dataclasses.asdict(filters)
+    else:
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Unsupported filter fields: {sorted(unknown)}; the supported "
+                f"fields are {list(FILTER_FIELDS)}"
+            )
+        values = dict(filters)
+        page = values.pop("page", None)
+        if page is not None:
+            values["min_page"] = page
+            values["max_page"] = page
+
+    try:
+        for name in ("min_page", "max_page"):
+            if values.get(name) is not None:
+                values[name] = int(values[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"The pages must be integers: {filters}") from None
+
+    file_types = values.get("file_types") or ()
+    if isinstance(file_types, str):
+        file_types = file_types.split(",")
+    values["file_types"] = tuple(
+        sorted({t.strip().lstrip(".").lower() for t in file_types} - {""})
+    )
+    search_filter = SearchFilter(**values)
+    return search_filter or None
 
 
 class AbstractVectorDb(abc.ABC):
@@ -60,7 +204,7 @@ class AbstractVectorDb(abc.ABC):
         return self.__dimension
 
     @abc.abstractmethod
-    def insert(self, chunks, embeddings, sources, pages):
+    def insert(self, chunks, embeddings, sources, pages, ids=None):
         """Inserts a list of chunks and their embeddings into the db.
 
         Subsequent calls to this method append new chunks to and existing
@@ -70,7 +214,27 @@ class AbstractVectorDb(abc.ABC):
         :param list[ list[float]] embeddings: The list of the embeddings.
         :param list[str] sources: The full paths to the documents.
         :param list[int] pages: The pages holding the chunks.
+        :param list[int] ids: The unique ids of the chunks (like their ids in
+        the chunks table); if None the provider assigns the ids.
+        """
+
+    def flush(self):
+        """Persists the records inserted since the last flush.
+
+        Providers that persist each insertion do not need to override it.
+        """
+
+    def needs_flush(self):
+        """Checks if the inserted records are persisted only by flush.
+
+        The records of the providers persisting each insertion must not be
+        inserted again (they would be duplicated), so the caller considers
+        them stored as soon as insert returns.
+
+        :return: True if the records are lost unless flush is called.
+        :rtype: bool
         """
+        return False
 
     @abc.abstractmethod
     def get_number_of_records(self):
@@ -80,14 +244,133 @@ class AbstractVectorDb(abc.ABC):
         :rtype: int
         """
 
-    @abc.abstractmethod
-    def query(self, query, k=3):
+    def query(self, query, k=3, filters=None):
         """Queries the vector database for matching chunks.
 
         :param str query: The string to find matching chunks.
         :param int k: The number of matches to return.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have (see validate_filters).
+
+        :return: The (text, distance, source, page) of each match.
+        :rtype: list[tuple]
         """
+        return self.query_batch([query], k, filters)[0]
+
+    def query_batch(self, queries, k=3, filters=None):
+        """Queries the vector database for many strings at once.
+
+        The embeddings of all the queries are retrieved by a single call and
+        then all of them are searched together by query_vectors.
+
+        :param list[str] queries: The strings to find matching chunks.
+        :param int k: The number of matches to return for each query.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+
+        :return: The (text, distance, source, page) of the matches of each
+        query in the order of the queries.
+        :rtype: list[list[tuple]]
+        """
+        if not queries:
+            return []
+        embeddings = embeddings_retriever.get_query_embeddings_batch(queries)
+        return self.query_vectors(embeddings, k, filters)
+
+    def search_by_vector(self, vector, k=3, filters=None):
+        """Searches the vector database using an already computed embedding.
+
+        Allows the caller to retrieve (and cache, batch or replace) the
+        embeddings of a query independently of the search.
+
+        :param list[float] vector: The embedding to find matching chunks for.
+        :param int k: The number of matches to return.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+
+        :return: The (text, distance, source, page) of each match.
+        :rtype: list[tuple]
+        """
+        return self.query_vectors([vector], k, filters)[0]
+
+    @abc.abstractmethod
+    def query_vectors(self, vectors, k=3, filters=None):
+        """Queries the vector database for many embeddings at once.
+
+        :param list[list[float]] vectors: The embeddings to find matching
+        chunks for (a list of lists or a 2 dimensional array).
+        :param int k: The number of matches to return for each embedding.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have (see validate_filters).
+
+        :return: The (text, distance, source, page) of the matches of each
+        embedding in the order of the embeddings.
+        :rtype: list[list[tuple]]
+        """
+
+    def warm_up(self):
+        """Loads the index so the first query does not pay for it.
+
+        Runs a search for a dummy embedding; the providers memory mapping
+        their files also read them to the page cache.
+        """
+        vector = [0.] * self.get_dimension()
+        vector[0] = 1.
+        self.search_by_vector(vector, 1)
+
+    def get_quantization(self):
+        """Returns the quantization of the stored embeddings.
+
+        :return: The quantization of the stored embeddings; NONE unless the
+        provider supports quantization.
+        :rtype: quantization.QuantizationType
+        """
+        return quantization.QuantizationType.NONE
+
+    def evaluate_recall(self, k=10, sample_size=100):
+        """Measures the recall@k of the search against the exact search.
+
+        Supported by the providers storing the embeddings locally (so the
+        exact search can be computed), see quantization.
+
+        :param int k: The number of matches to compare.
+        :param int sample_size: The number of queries to run.
+
+        :return: The average recall@k.
+        :rtype: float
+
+        :raises: NotImplementedError
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support evaluating the recall."
+        )
 
     @abc.abstractmethod
     def close(self):
         """Closes the milvus vector db."""
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The suffix of the directory holding the markdowns of the pages of a pdf
+# (see pdf_preprocessor.get_markdown_directory_name).
+_MARKDOWN_DIRECTORY_SUFFIX = "_markdown_"
+
+
+def _get_markdown_page(source):
+    """Returns the page of the markdown of a pdf page.
+
+    :param str source: The full path to a document.
+
+    :returns: The page or None if the document is not the markdown of a pdf
+    page.
+    :rtype: int | None
+    """
+    directory, filename = os.path.split(source or "")
+    stem = os.path.basename(directory)
+    if not stem.endswith(_MARKDOWN_DIRECTORY_SUFFIX):
+        return None
+    stem = stem[:-len(_MARKDOWN_DIRECTORY_SUFFIX)]
+    match = re.fullmatch(rf"{re.escape(stem)}-(\d+)\.md", filename)
+    return int(match.group(1)) if match else None
@@ -1,15 +1,33 @@
-"""Exports the Milvus vector db."""
+"""Exports the Chroma vector db.
 
+Chroma cannot match a prefix of a string, so the metadata of each record
+holds the directories of its source by their depth (like directory_3 for
+/docs/manuals) and a source prefix filter matches the one of its depth. The
+page and the file type of the original document of each record are derived
+when it is inserted (see vdb_abstract_base.get_page).
+
+The collections created before that must be rebuilt (see
+RagManager.rebuild_vector_db) for the source prefix, page and file type
+filters to match their records.
+"""
+
+import concurrent.futures
+import os
+import pathlib
 import uuid
 
 import chromadb
 
 import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
-import ragit.libs.impl.embeddings_retriever as embeddings_retriever
 
 
 class ChromaVectorDb(abstract_vector_db.AbstractVectorDb):
-    """Encapsulates a vector database using chroma."""
+    """Encapsulates a vector database using chroma.
+
+    :ivar chromadb.ClientAPI _chroma_client: The chroma client.
+    :ivar chromadb.Collection _collection: The collection, fetched once for
+    the lifetime of the client.
+    """
 
     def __init__(self, fullpath, collection_name, dimension):
         """Initializer..
@@ -34,43 +52,71 @@ class ChromaVectorDb(abstract_vector_db.AbstractVectorDb):
             path=fullpath,
             settings=client_settings
         )
+        self._collection = self._chroma_client.get_or_create_collection(
+            self.get_collection_name(),
+            metadata={"hnsw:space": "cosine"}
+        )
 
     def close(self):
-        """Closes the milvus vector db."""
-        print("close is not implemented..")
+        """Closes the chroma vector db."""
+        self._collection = None
+        self._chroma_client = None
 
-    def insert(self, chunks, embeddings, sources, pages):
+    def insert(self, chunks, embeddings, sources, pages, ids=None):
         """Inserts a list of chunks and their embeddings into the db.
 
         Subsequent calls to this method append new chunks to and existing
         collection, effectively incrementally updating the database.
 
+        The records are split to batches of the maximum size accepted by the
+        client which are written concurrently by a small pool of writers.
+
         :param list[str] chunks: The list of chunks to insert.
         :param list[ list[float]] embeddings: The list of the embeddings.
         :param list[str] sources: The full paths to the documents.
         :param list[int] pages: The pages holding the chunks.
+        :param list ids: The unique ids of the chunks; if None random ids are
+        generated.
         """
-        assert self._chroma_client, "Chroma Vector Collection is not open."
+        assert self._collection is not None, \
+            "Chroma Vector Collection is not open."
         assert len(chunks) == len(embeddings)
-        collection = self._chroma_client.get_or_create_collection(
-            self.get_collection_name(),
-            metadata={"hnsw:space": "cosine"}
-        )
-        ids = [str(uuid.uuid4()) for _ in range(len(chunks))]
-        sources = [source or "n/a" for source in sources]
-        pages = [page or 0 for page in pages]
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in range(len(chunks))]
+        else:
+            assert len(ids) == len(chunks)
+            ids = [str(i) for i in ids]
 
         meta_data = [
-            {"source": source, "page": page}
+            {
+                "source": source or "n/a",
+                "page": abstract_vector_db.get_page(source, page),
+                "file_type": abstract_vector_db.get_file_type(source),
+                **_get_directories(source)
+            }
             for source, page in zip(sources, pages)
         ]
 
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings,
-            ids=ids,
-            metadatas=meta_data
-        )
+        batch_size = self._get_max_batch_size()
+        batches = [
+            slice(start, start + batch_size)
+            for start in range(0, len(chunks), batch_size)
+        ]
+        if len(batches) <= 1:
+            for batch in batches:
+                self._add(batch, chunks, embeddings, ids, meta_data)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=_WRITERS_COUNT) as executor:
+            futures = [
+                executor.submit(
+                    self._add, batch, chunks, embeddings, ids, meta_data
+                )
+                for batch in batches
+            ]
+            for future in futures:
+                future.result()
 
     def get_number_of_records(self):
         """Returns the number of records in the collection.
@@ -78,40 +124,140 @@ class ChromaVectorDb(abstract_vector_db.AbstractVectorDb):
         :return: The number of records in the collection.
         :rtype: int
         """
-        assert self._chroma_client, "Chroma Vector Collection is not open."
+        assert self._collection is not None, \
+            "Chroma Vector Collection is not open."
+        return self._collection.count()
 
-        collection = self._chroma_client.get_or_create_collection(
-            self.get_collection_name()
+    def _get_max_batch_size(self):
+        """Returns the maximum number of records the client accepts at once.
+
+        :return: The maximum batch size.
+        :rtype: int
+        """
+        max_batch_size = getattr(self._chroma_client, "max_batch_size", None)
+        if max_batch_size is None:
+            max_batch_size = self._chroma_client.get_max_batch_size()
+        return max_batch_size
+
+    def _add(self, batch, chunks, embeddings, ids, meta_data):
+        """Adds a batch of records to the collection.
+
+        :param slice batch: The records of the batch.
+        :param list[str] chunks: All the chunks to insert.
+        :param list[list[float]] embeddings: All the embeddings.
+        :param list[str] ids: All the ids.
+        :param list[dict] meta_data: All the metadata.
+        """
+        self._collection.add(
+            documents=chunks[batch],
+            embeddings=embeddings[batch],
+            ids=ids[batch],
+            metadatas=meta_data[batch]
         )
-        count = collection.count()
-        return count
 
-    def query(self, query, k=3):
-        """Queries the vector database for matching chunks.
+    def query_vectors(self, vectors, k=3, filters=None):
+        """Queries the vector database for many embeddings at once.
 
-        :param str query: The string to find matching chunks.
-        :param int k: The number of matches to return.
+        :param list[list[float]] vectors: The embeddings to find matching
+        chunks for.
+        :param int k: The number of matches to return for each embedding.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
+
+        :return: The (text, distance, source, page) of the matches of each
+        embedding in the order of the embeddings.
+        :rtype: list[list[tuple]]
         """
-        assert self._chroma_client, "Chroma Vector Collection is not open."
+        assert self._collection is not None, \
+            "Chroma Vector Collection is not open."
 
-        query = query + " (do not consider upper lower case in the embeddings)"
-        query_embedding = embeddings_retriever.get_embeddings(query)
-        collection = self._chroma_client.get_or_create_collection(
-            self.get_collection_name()
-        )
+        query_embeddings = [[float(x) for x in vector] for vector in vectors]
+        if not query_embeddings:
+            return []
 
-        search_results = collection.query(
-            query_embeddings=query_embedding,
-            n_results=k
+        filters = abstract_vector_db.validate_filters(filters)
+        search_results = self._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=_make_where(filters)
         )
 
-        matches = []
-        for txt, distance, meta in zip(search_results["documents"][0],
-                                 search_results["distances"][0],
-                                 search_results["metadatas"][0]
-                                 ):
-            source = meta.get("source")
-            page = meta.get("page")
-            matches.append((txt, 1. - distance, source, page))
+        all_matches = []
+        for documents, distances, metadatas in zip(
+                search_results["documents"],
+                search_results["distances"],
+                search_results["metadatas"]):
+            matches = []
+            for txt, distance, meta in zip(documents, distances, metadatas):
+                source = meta.get("source")
+                page = meta.get("page")
+                matches.append((txt, 1. - distance, source, page))
+            all_matches.append(matches)
+
+        return all_matches
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The number of batches written concurrently.
+_WRITERS_COUNT = 4
+
+
+def _get_directories(source):
+    """Returns the metadata of the directories of a source.
+
+    :param str source: The full path to the chunked document.
+
+    :returns: The directories holding the source by their depth.
+    :rtype: dict[str, str]
+    """
+    if not source:
+        return {}
+    return {
+        _make_directory_key(directory): str(directory)
+        for directory in pathlib.PurePath(os.path.normpath(source)).parents
+    }
 
-        return matches
+
+def _make_directory_key(directory):
+    """Returns the metadata key of a directory.
+
+    :param pathlib.PurePath directory: The directory.
+
+    :returns: The key holding the directories of the same depth.
+    :rtype: str
+    """
+    return f"directory_{len(directory.parts)}"
+
+
+def _make_where(search_filter):
+    """Makes the chroma where clause for the passed in filter.
+
+    :param vdb_abstract_base.SearchFilter search_filter: The validated filter
+    or None.
+
+    :returns: The where clause or None for no filter.
+    :rtype: dict | None
+    """
+    if not search_filter:
+        return None
+    conditions = []
+    if search_filter.source is not None:
+        conditions.append({"source": search_filter.source})
+    if search_filter.source_prefix:
+        directory = pathlib.PurePath(
+            os.path.normpath(search_filter.source_prefix)
+        )
+        conditions.append({_make_directory_key(directory): str(directory)})
+    if search_filter.file_types:
+        conditions.append(
+            {"file_type": {"$in": list(search_filter.file_types)}}
+        )
+    if search_filter.min_page is not None:
+        conditions.append({"page": {"$gte": search_filter.min_page}})
+    if search_filter.max_page is not None:
+        conditions.append({"page": {"$lte": search_filter.max_page}})
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
@@ -3,7 +3,9 @@
 
 import ragit.libs.common as common
 import ragit.libs.impl.vdb_chroma as chroma_vector_db
+import ragit.libs.impl.vdb_faiss as faiss_vector_db
 import ragit.libs.impl.vdb_milvus as milvus_vector_db
+import ragit.libs.impl.vdb_numpy as numpy_vector_db
 
 
 def get_vector_db(fullpath, collection_name, dimension=1536):
@@ -27,6 +29,14 @@ def get_vector_db(fullpath, collection_name, dimension=1536):
         return chroma_vector_db.ChromaVectorDb(
             fullpath, collection_name, dimension
         )
+    elif vector_db_provider == common.VectorDbProviderEnum.FAISS:
+        return faiss_vector_db.FaissVectorDb(
+            fullpath, collection_name, dimension
+        )
+    elif vector_db_provider == common.VectorDbProviderEnum.NUMPY:
+        return numpy_vector_db.NumpyVectorDb(
+            fullpath, collection_name, dimension
+        )
 
     raise ValueError("Unsupported vector db provider.")
 
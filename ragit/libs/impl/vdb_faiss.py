@@ -0,0 +1,580 @@
+"""Exports the FAISS vector db.
+
+The vector db is stored in a directory holding the FAISS index file and a
+sidecar sqlite database with the text, source and page of each record; the
+position of an embedding in the index is the id of its record in the sidecar.
+
+The index file is memory mapped when opened so the front end only pages in
+the parts of the index it touches; the first insertion loads the index in
+memory and the following ones append to it, while the index file is
+atomically replaced once by flush (or close) after the last batch.
+
+The type of the index is selected by the FAISS_INDEX_TYPE environment
+variable when the vector db is created and is stored in the sidecar from then
+on. The supported types are:
+
+- FLAT: Exact search; the best choice for up to a few hundreds of thousands
+  of records.
+- IVF: Inverted file index; the embeddings are clustered in about sqrt(n)
+  lists and only a few of them are scanned per query. The clusters are
+  trained lazily once enough embeddings exist (until then the search is
+  exact) and retrained each time the number of records quadruples.
+- HNSW: Graph based index; fast queries with high recall at the cost of a
+  slower insertion and a larger index.
+
+The embeddings can also be stored quantized (see quantization) to SQ8 or PQ
+codes, selected by the VECTOR_QUANTIZATION environment variable when the
+vector db is created. The quantizer is trained lazily like the IVF clusters
+(until then the embeddings are stored in full precision) and retrained each
+time the number of records quadruples; the full precision embeddings are
+kept in a .npy file next to the index for the retraining and to measure the
+recall of the quantized search.
+
+The embeddings are normalized, thus the inner product used as the distance
+is the cosine similarity of the query to each match.
+"""
+
+import enum
+import math
+import os
+
+import faiss
+import numpy as np
+
+import ragit.libs.impl.npy_file as npy_file
+import ragit.libs.impl.quantization as quantization
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+import ragit.libs.impl.vdb_sidecar as vdb_sidecar
+
+
+class FaissIndexType(enum.Enum):
+    """Enumerates the supported FAISS index types."""
+
+    FLAT = 1
+    IVF = 2
+    HNSW = 3
+
+
+def get_index_type():
+    """Returns the index type to use for new vector dbs.
+
+    The index type is set by the FAISS_INDEX_TYPE environment variable;
+    defaults to FLAT.
+
+    :return: The index type to use.
+    :rtype: FaissIndexType
+
+    :raises: ValueError
+    """
+    index_type = os.environ.get("FAISS_INDEX_TYPE") or "FLAT"
+    index_type = index_type.strip().upper()
+    try:
+        return FaissIndexType[index_type]
+    except KeyError:
+        raise ValueError(
+            f"FAISS_INDEX_TYPE is not valid: {index_type}. The valid values "
+            f"are {[t.name for t in FaissIndexType]}"
+        ) from None
+
+
+class FaissVectorDb(abstract_vector_db.AbstractVectorDb):
+    """Encapsulates a vector database using FAISS.
+
+    :ivar FaissIndexType _index_type: The type of the index.
+    :ivar quantization.QuantizationType _quantization: The quantization of
+    the embeddings.
+    :ivar str _index_path: The full path to the index file.
+    :ivar str _vectors_path: The full path to the full precision embeddings
+    of a quantized index.
+    :ivar faiss.Index _index: The index or None if it is empty.
+    :ivar bool _writable: True if the index is loaded in memory (instead of
+    memory mapped read only).
+    :ivar bool _unsaved: True if the index holds records not yet written to
+    its file.
+    :ivar int _trained_count: The number of records the unsaved index was
+    trained on or None if it was not retrained.
+    :ivar vdb_sidecar.SidecarStore _sidecar: Holds the record payloads.
+    """
+
+    def __init__(self, fullpath, collection_name, dimension, index_type=None,
+                 quantization_type=None):
+        """Initializer.
+
+        :param str fullpath: The full path to the directory holding the
+        vector db.
+
+        :param str collection_name: The name of the collection.
+
+        :param int dimension: The length of the embeddings vector.
+
+        :param FaissIndexType index_type: The type of the index to create if
+        the vector db does not exist; if None it is read from the
+        environment. Ignored for an existing vector db.
+
+        :param quantization.QuantizationType quantization_type: The
+        quantization to use if the vector db does not exist; if None it is
+        read from the environment. Ignored for an existing vector db.
+        """
+        super().__init__(fullpath, collection_name, dimension)
+
+        assert self.get_fullpath() == fullpath
+        assert self.get_collection_name() == collection_name
+        assert self.get_dimension() == dimension
+
+        os.makedirs(fullpath, exist_ok=True)
+        self._index_path = os.path.join(fullpath, f"{collection_name}.faiss")
+        self._vectors_path = os.path.join(
+            fullpath, f"{collection_name}.vectors.npy"
+        )
+        self._sidecar = vdb_sidecar.SidecarStore(
+            os.path.join(fullpath, f"{collection_name}.sqlite")
+        )
+
+        stored_type = self._sidecar.get_setting("index_type")
+        if stored_type:
+            self._index_type = FaissIndexType[stored_type]
+        else:
+            self._index_type = index_type or get_index_type()
+            self._sidecar.set_setting("index_type", self._index_type.name)
+            quantization_type = \
+                quantization_type or quantization.get_quantization_type()
+            self._sidecar.set_setting("quantization", quantization_type.name)
+        # Vector dbs created before the quantization support are not
+        # quantized.
+        self._quantization = quantization.QuantizationType[
+            self._sidecar.get_setting("quantization", "NONE")
+        ]
+
+        self._index = self._load(mmap=True)
+        self._writable = False
+        self._unsaved = False
+        self._trained_count = None
+
+        # Drop the payload of records whose embeddings were never persisted.
+        count = self.get_number_of_records()
+        if self._sidecar.get_number_of_records() > count:
+            self._sidecar.truncate(count)
+
+    def close(self):
+        """Writes the unsaved records and closes the FAISS vector db."""
+        if self._sidecar:
+            self.flush()
+        self._index = None
+        if self._sidecar:
+            self._sidecar.close()
+            self._sidecar = None
+
+    def warm_up(self):
+        """Reads the memory mapped index (and vectors) to the page cache.
+
+        Then runs a dummy search.
+        """
+        for path in (self._index_path, self._vectors_path):
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                while f.read(_WARM_UP_READ_SIZE):
+                    pass
+        super().warm_up()
+
+    def get_index_type(self):
+        """Returns the type of the index.
+
+        :return: The type of the index.
+        :rtype: FaissIndexType
+        """
+        return self._index_type
+
+    def get_quantization(self):
+        """Returns the quantization of the embeddings.
+
+        :return: The quantization of the embeddings.
+        :rtype: quantization.QuantizationType
+        """
+        return self._quantization
+
+    def insert(self, chunks, embeddings, sources, pages, ids=None):
+        """Inserts a list of chunks and their embeddings into the db.
+
+        Subsequent calls to this method append new chunks to and existing
+        collection, effectively incrementally updating the database.
+
+        :param list[str] chunks: The list of chunks to insert.
+        :param list[list[float]] embeddings: The list of the embeddings.
+        :param list[str] sources: The full paths to the documents.
+        :param list[int] pages: The pages holding the chunks.
+        :param list[int] ids: Ignored; the records are identified by their
+        position.
+
+        :raises: ValueError
+        """
+        assert self._sidecar, "FAISS Vector Collection is not open."
+        assert len(chunks) == len(embeddings)
+        if not chunks:
+            return
+        vectors = self._to_vectors(embeddings)
+
+        index = self._index
+        if not self._writable:
+            # A memory mapped index is read only, load it fully once.
+            index = self._load(mmap=False)
+        first_id = index.ntotal if index is not None else 0
+        self._sidecar.insert(first_id, chunks, sources, pages)
+        try:
+            if self._quantization != quantization.QuantizationType.NONE:
+                npy_file.append(self._vectors_path, first_id, vectors)
+            index, trained_count = self._add(index, vectors)
+        except BaseException:
+            self._sidecar.rollback()
+            raise
+        # The payloads of records missing from the index file are dropped
+        # when the vector db is opened.
+        self._sidecar.commit()
+        if trained_count is not None:
+            self._trained_count = trained_count
+        self._index = index
+        self._writable = True
+        self._unsaved = True
+
+    def flush(self):
+        """Writes the records inserted since the last flush to the file."""
+        assert self._sidecar, "FAISS Vector Collection is not open."
+        if not self._unsaved:
+            return
+        temp_path = f"{self._index_path}.tmp"
+        faiss.write_index(self._index, temp_path)
+        os.replace(temp_path, self._index_path)
+        if self._trained_count is not None:
+            self._sidecar.set_setting("trained_count", self._trained_count)
+            self._trained_count = None
+        self._unsaved = False
+
+    def needs_flush(self):
+        """Checks if the inserted records are persisted only by flush.
+
+        :return: True since the index is written by flush.
+        :rtype: bool
+        """
+        return True
+
+    def get_number_of_records(self):
+        """Returns the number of records in the collection.
+
+        :return: The number of records in the collection.
+        :rtype: int
+        """
+        if self._index is None:
+            return 0
+        return self._index.ntotal
+
+    def evaluate_recall(self, k=10, sample_size=100):
+        """Measures the recall@k of the search against the exact search.
+
+        A sample of the stored embeddings is used as the queries.
+
+        :param int k: The number of matches to compare.
+        :param int sample_size: The number of queries to run.
+
+        :return: The average recall@k.
+        :rtype: float
+        """
+        assert self._sidecar, "FAISS Vector Collection is not open."
+        count = self.get_number_of_records()
+        if count == 0:
+            return 1.0
+        matrix = self._get_vectors(self._index)
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(count, min(sample_size, count), False))
+        queries = np.ascontiguousarray(matrix[rows], dtype=np.float32)
+        _, expected_ids = quantization.search(matrix, queries, k)
+        _, retrieved_ids = self._index.search(
+            queries, k, params=self._make_search_parameters(k)
+        )
+        return quantization.recall_at_k(
+            expected_ids, [[i for i in ids if i >= 0] for ids in retrieved_ids]
+        )
+
+    def query_vectors(self, vectors, k=3, filters=None):
+        """Queries the vector database for many embeddings at once.
+
+        When filtering, the ids of the matching records are passed to the
+        search as an id selector, so only those records are considered.
+
+        :param list[list[float]] vectors: The embeddings to find matching
+        chunks for.
+        :param int k: The number of matches to return for each embedding.
+        :param dict filters: The metadata the matches must have.
+
+        :return: The (text, distance, source, page) of the matches of each
+        embedding in the order of the embeddings.
+        :rtype: list[list[tuple]]
+        """
+        assert self._sidecar, "FAISS Vector Collection is not open."
+        if len(vectors) == 0:
+            return []
+        vectors = self._to_vectors(vectors)
+        filters = abstract_vector_db.validate_filters(filters)
+        if self._index is None or self._index.ntotal == 0 or k <= 0:
+            return [[] for _ in range(vectors.shape[0])]
+
+        selector = None
+        if filters:
+            ids = np.array(self._sidecar.find_ids(filters), dtype=np.int64)
+            if ids.size == 0:
+                return [[] for _ in range(vectors.shape[0])]
+            selector = faiss.IDSelectorBatch(ids)
+
+        distances, ids = self._index.search(
+            vectors, k, params=self._make_search_parameters(k, selector)
+        )
+        if self._index.metric_type == faiss.METRIC_L2:
+            # Some quantized indexes (like HNSW PQ) support only the L2
+            # distance; for normalized vectors it maps to the cosine.
+            distances = 1. - distances / 2.
+
+        unique_ids = sorted({int(i) for i in ids.flat if i >= 0})
+        records = dict(zip(unique_ids, self._sidecar.get_records(unique_ids)))
+
+        all_matches = []
+        for row_distances, row_ids in zip(distances, ids):
+            matches = []
+            for distance, i in zip(row_distances.tolist(), row_ids.tolist()):
+                record = records.get(i)
+                if record is None:
+                    continue
+                text, source, page = record
+                matches.append((text, distance, source, page))
+            all_matches.append(matches)
+        return all_matches
+
+    def _to_vectors(self, embeddings):
+        """Converts the passed in embeddings to normalized vectors.
+
+        :param list[list[float]] embeddings: The embeddings to convert.
+
+        :return: The normalized vectors.
+        :rtype: numpy.ndarray
+
+        :raises: ValueError
+        """
+        vectors = np.array(embeddings, dtype=np.float32, ndmin=2)
+        if vectors.shape[1] != self.get_dimension():
+            raise ValueError(
+                f"Expected embeddings of dimension {self.get_dimension()} "
+                f"but got {vectors.shape[1]}."
+            )
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _load(self, mmap):
+        """Loads the index from its file.
+
+        :param bool mmap: If True the index is memory mapped (read only).
+
+        :return: The index or None if it does not exist yet.
+        :rtype: faiss.Index
+        """
+        if not os.path.isfile(self._index_path):
+            return None
+        if mmap:
+            return faiss.read_index(
+                self._index_path,
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        return faiss.read_index(self._index_path)
+
+    def _add(self, index, vectors):
+        """Adds the passed in vectors to the index.
+
+        :param faiss.Index index: The index to add to or None to create it.
+        :param numpy.ndarray vectors: The normalized vectors to add.
+
+        :return: The index holding the vectors and the number of records it
+        was trained on if it was (re)built, otherwise None.
+        :rtype: tuple[faiss.Index, int | None]
+        """
+        total = vectors.shape[0] + (index.ntotal if index else 0)
+        if self._needs_training(index, total):
+            vectors = self._get_vectors(index, vectors)
+            index = self._make_trained_index(vectors)
+            index.add(vectors)
+            return index, total
+
+        if index is None:
+            index = self._make_index("Flat")
+        index.add(vectors)
+        return index, None
+
+    def _needs_training(self, index, total):
+        """Checks if the index needs to be (re)trained.
+
+        Until enough embeddings exist a full precision (and for IVF flat)
+        index is used; after that the index is retrained each time the
+        number of records quadruples (doubling the optimal number of lists).
+
+        :param faiss.Index index: The current index or None.
+        :param int total: The number of records after the insertion.
+
+        :return: True if a new index must be trained.
+        :rtype: bool
+        """
+        if self._quantization == quantization.QuantizationType.NONE and \
+                self._index_type != FaissIndexType.IVF:
+            return False
+        if total < self._get_min_training_size():
+            return False
+        # Retrained by an insertion that is not flushed yet.
+        trained_count = self._trained_count
+        if trained_count is None:
+            trained_count = int(
+                self._sidecar.get_setting("trained_count", 0)
+            )
+        if isinstance(index, faiss.IndexIVF) and not trained_count:
+            # Trained before the count was stored.
+            trained_count = index.nlist ** 2
+        if index is None or not trained_count:
+            return True
+        return total >= _RETRAIN_FACTOR * trained_count
+
+    def _get_min_training_size(self):
+        """Returns the number of records needed to train the index.
+
+        :return: The number of records needed to train the index.
+        :rtype: int
+        """
+        if self._quantization == quantization.QuantizationType.PQ:
+            return _MIN_PQ_TRAINING_SIZE
+        if self._index_type == FaissIndexType.IVF:
+            return _MIN_IVF_TRAINING_SIZE
+        return 1
+
+    def _get_vectors(self, index, vectors=None):
+        """Returns the full precision embeddings of the collection.
+
+        :param faiss.Index index: The current index or None.
+        :param numpy.ndarray vectors: The vectors being inserted (already
+        appended to the embeddings file of a quantized index) or None.
+
+        :return: The normalized embeddings.
+        :rtype: numpy.ndarray
+        """
+        if self._quantization != quantization.QuantizationType.NONE:
+            total = index.ntotal if index else 0
+            if vectors is not None:
+                total += vectors.shape[0]
+            return npy_file.load(self._vectors_path)[:total]
+        if index is None or index.ntotal == 0:
+            return vectors
+        stored = index.reconstruct_n(0, index.ntotal)
+        if vectors is None:
+            return stored
+        return np.vstack([stored, vectors])
+
+    def _make_trained_index(self, vectors):
+        """Creates an (empty) index trained on the passed in vectors.
+
+        :param numpy.ndarray vectors: The normalized vectors to train on.
+
+        :return: The trained index.
+        :rtype: faiss.Index
+        """
+        dimension = self.get_dimension()
+        if self._quantization == quantization.QuantizationType.SQ8:
+            encoding = "SQ8"
+        elif self._quantization == quantization.QuantizationType.PQ:
+            encoding = f"PQ{quantization.get_pq_codes_count(dimension)}"
+        else:
+            encoding = "Flat"
+        if self._index_type == FaissIndexType.IVF:
+            nlist = max(1, math.isqrt(vectors.shape[0]))
+            description = f"IVF{nlist},{encoding}"
+        else:
+            description = encoding
+        index = self._make_index(description)
+
+        sample = vectors
+        if vectors.shape[0] > _MAX_TRAINING_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = vectors[np.sort(
+                rng.choice(vectors.shape[0], _MAX_TRAINING_SAMPLE, False)
+            )]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        if isinstance(index, faiss.IndexIVF) and encoding == "Flat":
+            # Allows the reconstruction of the vectors on retraining.
+            index.make_direct_map()
+        return index
+
+    def _make_index(self, encoding):
+        """Creates an (empty) index of the type of the vector db.
+
+        :param str encoding: The FAISS factory description of the storage of
+        the vectors (like Flat, SQ8 or IVF100,PQ16).
+
+        :return: The index.
+        :rtype: faiss.Index
+        """
+        dimension = self.get_dimension()
+        if self._index_type != FaissIndexType.HNSW:
+            return faiss.index_factory(
+                dimension, encoding, faiss.METRIC_INNER_PRODUCT
+            )
+        description = f"HNSW{_HNSW_M}"
+        if encoding != "Flat":
+            description = f"{description}_{encoding}"
+        index = faiss.index_factory(
+            dimension, description, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+        return index
+
+    def _make_search_parameters(self, k, selector=None):
+        """Makes the search parameters for the current index.
+
+        :param int k: The number of matches to return.
+        :param faiss.IDSelector selector: Restricts the searched ids.
+
+        :return: The search parameters or None for the defaults.
+        :rtype: faiss.SearchParameters
+        """
+        if isinstance(self._index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(
+                nprobe=min(self._index.nlist, _IVF_NPROBE), sel=selector
+            )
+        if isinstance(self._index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(
+                efSearch=max(_HNSW_EF_SEARCH, k), sel=selector
+            )
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The minimum number of records to train an IVF index; with sqrt(n) lists
+# every list gets at least 39 training points as FAISS recommends.
+_MIN_IVF_TRAINING_SIZE = 1600
+
+# The minimum number of records to train a product quantizer; each of its
+# 256 centroids gets at least 39 training points.
+_MIN_PQ_TRAINING_SIZE = 10000
+
+# The maximum number of embeddings used to train an index.
+_MAX_TRAINING_SAMPLE = 65536
+
+# The index is retrained when the records grow by this factor.
+_RETRAIN_FACTOR = 4
+
+# The number of IVF lists scanned per query.
+_IVF_NPROBE = 16
+
+# The number of neighbours of each node of the HNSW graph.
+_HNSW_M = 32
+
+# The size of the candidates list while building and searching HNSW.
+_HNSW_EF_CONSTRUCTION = 80
+_HNSW_EF_SEARCH = 64
+
+# The bytes read at once when warming up.
+_WARM_UP_READ_SIZE = 1 << 20
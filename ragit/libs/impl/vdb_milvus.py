@@ -1,9 +1,17 @@
-"""Exports the Milvus vector db."""
+"""Exports the Milvus vector db.
+
+The page and the file type of the original document of each record are
+derived when it is inserted (see vdb_abstract_base.get_page) and stored as
+typed fields for the filters; the collections created before that must be
+rebuilt (see RagManager.rebuild_vector_db) for the page and file type
+filters to match their records.
+"""
+
+import json
 
 import pymilvus
 
 import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
-import ragit.libs.impl.embeddings_retriever as embeddings_retriever
 
 
 class MilvusVectorDb(abstract_vector_db.AbstractVectorDb):
@@ -37,7 +45,7 @@ class MilvusVectorDb(abstract_vector_db.AbstractVectorDb):
         if self._milvus_client:
             self._milvus_client.close()
 
-    def insert(self, chunks, embeddings, sources, pages):
+    def insert(self, chunks, embeddings, sources, pages, ids=None):
         """Inserts a list of chunks and their embeddings into the db.
 
         Subsequent calls to this method append new chunks to and existing
@@ -47,22 +55,26 @@ class MilvusVectorDb(abstract_vector_db.AbstractVectorDb):
         :param list[list[float]] embeddings: The list of the embeddings.
         :param list[str] sources: The full paths to the documents.
         :param list[int] pages: The pages holding the chunks.
+        :param list[int] ids: The unique ids of the chunks; if None the ids
+        continue from the number of the existing records.
         """
         assert self._milvus_client, "Milvus Vector Collection is not open."
+        if ids is None:
+            first_id = self.get_number_of_records()
+            ids = range(first_id, first_id + len(chunks))
         data = []
-        count = 0
-        for chunk, embedding, source, page in zip(chunks, embeddings,
-                                                  sources, pages):
+        for chunk, embedding, source, page, chunk_id in zip(
+                chunks, embeddings, sources, pages, ids):
             data.append(
                 {
-                    "id": count,
+                    "id": int(chunk_id),
                     "vector": embedding,
                     "text": chunk,
                     "source": source or "n/a",
-                    "page": page or 0
+                    "page": abstract_vector_db.get_page(source, page),
+                    "file_type": abstract_vector_db.get_file_type(source)
                 }
             )
-            count += 1
         self._milvus_client.insert(
             collection_name=self.get_collection_name(),
             data=data
@@ -82,33 +94,91 @@ class MilvusVectorDb(abstract_vector_db.AbstractVectorDb):
         counter = res[0]["count(*)"]
         return counter
 
-    def query(self, query, k=3):
-        """Queries the vector database for matching chunks.
+    def query_vectors(self, vectors, k=3, filters=None):
+        """Queries the vector database for many embeddings at once.
+
+        :param list[list[float]] vectors: The embeddings to find matching
+        chunks for.
+        :param int k: The number of matches to return for each embedding.
+        :param SearchFilter | dict filters: The metadata the matches must
+        have.
 
-        :param str query: The string to find matching chunks.
-        :param int k: The number of matches to return.
+        :return: The (text, distance, source, page) of the matches of each
+        embedding in the order of the embeddings.
+        :rtype: list[list[tuple]]
         """
         assert self._milvus_client, "Milvus Vector Collection is not open."
-        query = query + " (do not consider upper lower case in the embeddings)"
-        e = embeddings_retriever.get_embeddings(query)
+        data = [[float(x) for x in vector] for vector in vectors]
+        if not data:
+            return []
+        filters = abstract_vector_db.validate_filters(filters)
         search_res = self._milvus_client.search(
             collection_name=self.get_collection_name(),
-            data=[e],
+            data=data,
+            filter=_make_filter_expression(filters),
             limit=k,
             search_params={"metric_type": "IP", "params": {}},
             output_fields=["text", "source", "page"],
         )
 
-        matches = []
-
-        for res in search_res[0]:
-            matches.append(
-                (
-                    res["entity"]["text"],
-                    res["distance"],
-                    res["entity"]["source"],
-                    res["entity"]["page"]
+        all_matches = []
+        for hits in search_res:
+            matches = []
+            for res in hits:
+                matches.append(
+                    (
+                        res["entity"]["text"],
+                        res["distance"],
+                        res["entity"]["source"],
+                        res["entity"]["page"]
+                    )
                 )
-            )
+            all_matches.append(matches)
+
+        return all_matches
 
-        return matches
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+def _make_filter_expression(search_filter):
+    """Makes the milvus boolean expression for the passed in filter.
+
+    :param vdb_abstract_base.SearchFilter search_filter: The validated filter
+    or None.
+
+    :returns: The boolean expression (empty for no filter).
+    :rtype: str
+    """
+    if not search_filter:
+        return ""
+    conditions = []
+    if search_filter.source is not None:
+        conditions.append(f"source == {json.dumps(search_filter.source)}")
+    if search_filter.source_prefix:
+        directory = abstract_vector_db.get_prefix_directory(
+            search_filter.source_prefix
+        )
+        pattern = json.dumps(f"{_escape_like(directory)}%")
+        conditions.append(f"source like {pattern}")
+    if search_filter.min_page is not None:
+        conditions.append(f"page >= {search_filter.min_page}")
+    if search_filter.max_page is not None:
+        conditions.append(f"page <= {search_filter.max_page}")
+    if search_filter.file_types:
+        file_types = json.dumps(list(search_filter.file_types))
+        conditions.append(f"file_type in {file_types}")
+    return " and ".join(conditions)
+
+
+def _escape_like(value):
+    """Escapes the wildcards of a like pattern.
+
+    :param str value: The literal value.
+
+    :returns: The value with its wildcards escaped by a backslash.
+    :rtype: str
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace(
+        "_", "\\_"
+    )
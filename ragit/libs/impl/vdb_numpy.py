@@ -0,0 +1,406 @@
+"""Exports the NumPy vector db.
+
+Performs an exact (brute force) search over all the embeddings of the
+collection: the embeddings are normalized and kept in a contiguous float32
+matrix, so a query is a single matrix product followed by an argpartition to
+select the best matches. For collections of up to about a million chunks this
+is as fast as an approximate index while its recall is always perfect, which
+also makes it the ground truth to benchmark the other providers against.
+
+The vector db is stored in a directory holding the matrix as a .npy file and
+a sidecar sqlite database with the text, source and page of each record; the
+row of an embedding in the matrix is the id of its record in the sidecar.
+
+The matrix is memory mapped when opened, so starting up does not need to read
+the whole file. Inserting appends the new rows to the end of the file (see
+npy_file), thus an insertion costs only the size of the new rows.
+
+When the collection uses SQ8 quantization (see quantization) the searches
+scan a second matrix holding a byte per dimension, using 4x less memory; the
+full precision matrix stays on disk to measure the recall of the quantized
+search and to retrain the quantizer each time the collection quadruples.
+"""
+
+import os
+
+import numpy as np
+
+import ragit.libs.impl.npy_file as npy_file
+import ragit.libs.impl.quantization as quantization
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+import ragit.libs.impl.vdb_sidecar as vdb_sidecar
+
+
+class NumpyVectorDb(abstract_vector_db.AbstractVectorDb):
+    """Encapsulates an exact search vector database using NumPy.
+
+    :ivar quantization.QuantizationType _quantization: The quantization of
+    the embeddings.
+    :ivar str _matrix_path: The full path to the .npy file.
+    :ivar numpy.ndarray _matrix: The memory mapped embeddings or None if the
+    collection is empty.
+    :ivar numpy.ndarray _codes: The memory mapped quantized embeddings or
+    None if not quantized.
+    :ivar quantization.ScalarQuantizer _quantizer: The quantizer or None.
+    :ivar int _trained_count: The number of records the quantizer was
+    trained on; its codes and params are named after it.
+    :ivar vdb_sidecar.SidecarStore _sidecar: Holds the record payloads.
+    """
+
+    def __init__(self, fullpath, collection_name, dimension,
+                 quantization_type=None):
+        """Initializer.
+
+        :param str fullpath: The full path to the directory holding the
+        vector db.
+
+        :param str collection_name: The name of the collection.
+
+        :param int dimension: The length of the embeddings vector.
+
+        :param quantization.QuantizationType quantization_type: The
+        quantization to use if the vector db does not exist; if None it is
+        read from the environment. Ignored for an existing vector db.
+
+        :raises: ValueError
+        """
+        super().__init__(fullpath, collection_name, dimension)
+
+        assert self.get_fullpath() == fullpath
+        assert self.get_collection_name() == collection_name
+        assert self.get_dimension() == dimension
+
+        os.makedirs(fullpath, exist_ok=True)
+        self._matrix_path = os.path.join(fullpath, f"{collection_name}.npy")
+        self._matrix = None
+        self._codes = None
+        self._quantizer = None
+        self._trained_count = 0
+        self._sidecar = vdb_sidecar.SidecarStore(
+            os.path.join(fullpath, f"{collection_name}.sqlite")
+        )
+
+        stored_type = self._sidecar.get_setting("quantization")
+        if stored_type:
+            self._quantization = quantization.QuantizationType[stored_type]
+        elif self._sidecar.get_number_of_records():
+            # Created before the quantization support.
+            self._quantization = quantization.QuantizationType.NONE
+        else:
+            self._quantization = \
+                quantization_type or quantization.get_quantization_type()
+            if self._quantization == quantization.QuantizationType.PQ:
+                self.close()
+                raise ValueError(
+                    "Product quantization is supported by the FAISS vector "
+                    "db only."
+                )
+            self._sidecar.set_setting("quantization", self._quantization.name)
+
+        self._load()
+
+    def close(self):
+        """Closes the NumPy vector db."""
+        self._matrix = None
+        self._codes = None
+        if self._sidecar:
+            self._sidecar.close()
+            self._sidecar = None
+
+    def warm_up(self):
+        """Reads the memory mapped embeddings (and codes) to the page cache.
+
+        Then runs a dummy search.
+        """
+        for array in (self._matrix, self._codes):
+            if array is None:
+                continue
+            for start in range(0, array.shape[0], _ENCODE_BLOCK_ROWS):
+                array[start:start + _ENCODE_BLOCK_ROWS].max()
+        super().warm_up()
+
+    def get_quantization(self):
+        """Returns the quantization of the embeddings.
+
+        :return: The quantization of the embeddings.
+        :rtype: quantization.QuantizationType
+        """
+        return self._quantization
+
+    def insert(self, chunks, embeddings, sources, pages, ids=None):
+        """Inserts a list of chunks and their embeddings into the db.
+
+        Subsequent calls to this method append new chunks to and existing
+        collection, effectively incrementally updating the database.
+
+        :param list[str] chunks: The list of chunks to insert.
+        :param list[list[float]] embeddings: The list of the embeddings.
+        :param list[str] sources: The full paths to the documents.
+        :param list[int] pages: The pages holding the chunks.
+        :param list[int] ids: Ignored; the records are identified by their
+        position.
+
+        :raises: ValueError
+        """
+        assert self._sidecar, "NumPy Vector Collection is not open."
+        assert len(chunks) == len(embeddings)
+        if not chunks:
+            return
+        vectors = self._to_vectors(embeddings)
+
+        first_id = self.get_number_of_records()
+        trained_count = None
+        self._sidecar.insert(first_id, chunks, sources, pages)
+        try:
+            npy_file.append(self._matrix_path, first_id, vectors)
+            if self._quantization == quantization.QuantizationType.SQ8:
+                trained_count = self._append_codes(first_id, vectors)
+        except BaseException:
+            self._sidecar.rollback()
+            raise
+        self._sidecar.commit()
+        if trained_count is not None:
+            self._set_trained_count(trained_count)
+        self._load()
+
+    def get_number_of_records(self):
+        """Returns the number of records in the collection.
+
+        :return: The number of records in the collection.
+        :rtype: int
+        """
+        if self._matrix is None:
+            return 0
+        return self._matrix.shape[0]
+
+    def evaluate_recall(self, k=10, sample_size=100):
+        """Measures the recall@k of the search against the exact search.
+
+        A sample of the stored embeddings is used as the queries.
+
+        :param int k: The number of matches to compare.
+        :param int sample_size: The number of queries to run.
+
+        :return: The average recall@k (1.0 for full precision).
+        :rtype: float
+        """
+        assert self._sidecar, "NumPy Vector Collection is not open."
+        if self._matrix is None:
+            return 1.0
+        rng = np.random.default_rng(0)
+        count = self._matrix.shape[0]
+        rows = np.sort(rng.choice(count, min(sample_size, count), False))
+        queries = np.asarray(self._matrix[rows])
+        _, expected_ids = quantization.search(self._matrix, queries, k)
+        _, retrieved_ids = self._search(None, queries, k)
+        return quantization.recall_at_k(expected_ids, retrieved_ids)
+
+    def query_vectors(self, vectors, k=3, filters=None):
+        """Queries the vector database for many embeddings at once.
+
+        All the embeddings are scored by a single (blocked) matrix product;
+        when filtering, only the rows of the matching records are scored.
+
+        :param list[list[float]] vectors: The embeddings to find matching
+        chunks for.
+        :param int k: The number of matches to return for each embedding.
+        :param dict filters: The metadata the matches must have.
+
+        :return: The (text, distance, source, page) of the matches of each
+        embedding in the order of the embeddings.
+        :rtype: list[list[tuple]]
+        """
+        assert self._sidecar, "NumPy Vector Collection is not open."
+        if len(vectors) == 0:
+            return []
+        vectors = self._to_vectors(vectors)
+        filters = abstract_vector_db.validate_filters(filters)
+        if self._matrix is None or k <= 0:
+            return [[] for _ in range(vectors.shape[0])]
+
+        if filters:
+            rows = np.array(self._sidecar.find_ids(filters), dtype=np.int64)
+            rows = rows[rows < self._matrix.shape[0]]
+            if rows.size == 0:
+                return [[] for _ in range(vectors.shape[0])]
+        else:
+            rows = None
+        scores, ids = self._search(rows, vectors, k)
+        unique_ids = np.unique(ids).tolist()
+        records = dict(zip(unique_ids, self._sidecar.get_records(unique_ids)))
+
+        all_matches = []
+        for row_scores, row_ids in zip(scores, ids):
+            matches = []
+            for score, i in zip(row_scores.tolist(), row_ids.tolist()):
+                record = records.get(i)
+                if record is None:
+                    continue
+                text, source, page = record
+                matches.append((text, score, source, page))
+            all_matches.append(matches)
+        return all_matches
+
+    def _to_vectors(self, embeddings):
+        """Converts the passed in embeddings to normalized vectors.
+
+        :param list[list[float]] embeddings: The embeddings to convert.
+
+        :return: The normalized vectors.
+        :rtype: numpy.ndarray
+
+        :raises: ValueError
+        """
+        vectors = np.array(embeddings, dtype=np.float32, ndmin=2)
+        if vectors.shape[1] != self.get_dimension():
+            raise ValueError(
+                f"Expected embeddings of dimension {self.get_dimension()} "
+                f"but got {vectors.shape[1]}."
+            )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        vectors /= norms
+        return vectors
+
+    def _search(self, rows, vectors, k):
+        """Finds the top k rows for each of the vectors.
+
+        :param numpy.ndarray rows: The rows to search or None for all.
+        :param numpy.ndarray vectors: The normalized queries.
+        :param int k: The number of matches to return for each query.
+
+        :return: The scores and the row ids of the matches sorted by
+        descending score.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        if self._codes is not None:
+            codes = self._codes if rows is None else self._codes[rows]
+            scores, ids = self._quantizer.search(codes, vectors, k)
+        else:
+            matrix = self._matrix if rows is None else self._matrix[rows]
+            scores, ids = quantization.search(matrix, vectors, k)
+        if rows is not None:
+            ids = rows[ids]
+        return scores, ids
+
+    def _load(self):
+        """Memory maps the embeddings (and their codes).
+
+        The records count is the smallest among the matrix and the sidecar,
+        so rows written by an interrupted insertion are ignored (and then
+        overwritten by the next one); codes missing for the same reason are
+        encoded again.
+        """
+        matrix = npy_file.load(self._matrix_path)
+        count = self._sidecar.get_number_of_records()
+        if matrix is not None and matrix.shape[0] < count:
+            # Drop the payload of records whose embeddings were never
+            # persisted.
+            count = matrix.shape[0]
+            self._sidecar.truncate(count)
+        self._matrix = matrix[:count] if count else None
+        self._codes = None
+        if self._quantization != quantization.QuantizationType.SQ8 or \
+                self._matrix is None:
+            return
+
+        self._trained_count = int(
+            self._sidecar.get_setting("trained_count", 0)
+        )
+        codes_path, params_path = self._get_codes_paths(self._trained_count)
+        self._quantizer = quantization.ScalarQuantizer.load(params_path)
+        codes = npy_file.load(codes_path) if self._quantizer else None
+        codes_count = 0 if codes is None else codes.shape[0]
+        if codes_count < count:
+            trained_count = self._append_codes(
+                codes_count, np.asarray(self._matrix[codes_count:])
+            )
+            if trained_count is not None:
+                self._set_trained_count(trained_count)
+            codes_path, _ = self._get_codes_paths(self._trained_count)
+            codes = npy_file.load(codes_path)
+        self._codes = codes[:count]
+
+    def _append_codes(self, count, vectors):
+        """Quantizes the vectors appending them to the codes.
+
+        The quantizer is (re)trained on the full precision embeddings when
+        it does not exist or when the records quadrupled since its training;
+        the new quantizer and codes are written to new files which become
+        current by _set_trained_count.
+
+        :param int count: The number of codes already stored.
+        :param numpy.ndarray vectors: The normalized vectors to append; the
+        full precision matrix must already hold them.
+
+        :return: The number of records the quantizer was trained on if it
+        was (re)trained, otherwise None.
+        :rtype: int | None
+        """
+        total = count + vectors.shape[0]
+        if self._quantizer is not None and \
+                total < _RETRAIN_FACTOR * self._trained_count:
+            codes_path, _ = self._get_codes_paths(self._trained_count)
+            npy_file.append(codes_path, count, self._quantizer.encode(vectors))
+            return None
+
+        matrix = np.load(self._matrix_path, mmap_mode='r')[:total]
+        sample = matrix
+        if total > _MAX_TRAINING_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = matrix[
+                np.sort(rng.choice(total, _MAX_TRAINING_SAMPLE, False))
+            ]
+        quantizer = quantization.ScalarQuantizer.train(np.asarray(sample))
+        codes = np.empty(matrix.shape, dtype=np.uint8)
+        for start in range(0, total, _ENCODE_BLOCK_ROWS):
+            end = start + _ENCODE_BLOCK_ROWS
+            codes[start:end] = quantizer.encode(np.asarray(matrix[start:end]))
+
+        codes_path, params_path = self._get_codes_paths(total)
+        npy_file.save(codes_path, codes)
+        quantizer.save(params_path)
+        self._quantizer = quantizer
+        return total
+
+    def _set_trained_count(self, trained_count):
+        """Makes current the quantizer trained on the passed in count.
+
+        :param int trained_count: The number of records the quantizer was
+        trained on.
+        """
+        previous_count = self._trained_count
+        self._sidecar.set_setting("trained_count", trained_count)
+        self._trained_count = trained_count
+        if previous_count and previous_count != trained_count:
+            for path in self._get_codes_paths(previous_count):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def _get_codes_paths(self, trained_count):
+        """Returns the files of the quantizer trained on the passed in count.
+
+        :param int trained_count: The number of records the quantizer was
+        trained on.
+
+        :return: The full paths to the codes and to the quantizer params.
+        :rtype: tuple[str, str]
+        """
+        prefix = os.path.join(
+            self.get_fullpath(),
+            f"{self.get_collection_name()}.sq8-{trained_count}"
+        )
+        return f"{prefix}.npy", f"{prefix}-params.npy"
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The quantizer is retrained when the records grow by this factor.
+_RETRAIN_FACTOR = 4
+
+# The maximum number of embeddings used to train the quantizer.
+_MAX_TRAINING_SAMPLE = 100000
+
+# The number of rows to encode (or read when warming up) at once.
+_ENCODE_BLOCK_ROWS = 65536
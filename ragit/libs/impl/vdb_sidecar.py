@@ -0,0 +1,259 @@
+"""Exposes a sqlite store for the payload of the vector db records.
+
+Vector indexes like FAISS only hold the embeddings and address them by their
+sequential position, so the text, source and page of each record are kept in
+a sidecar sqlite database using the same position as the primary key.
+
+The page and the file type of the original document of each record are
+derived when it is inserted (see vdb_abstract_base.get_page), so the filters
+compare typed values.
+
+The store also holds a few key - value settings describing the index (like
+its type) so an existing vector db is always reopened the same way it was
+created, regardless of the current environment settings.
+"""
+
+import sqlite3
+import threading
+
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
+
+
+def make_filter_conditions(search_filter):
+    """Compiles a search filter to the conditions of an sqlite query.
+
+    Applies to any table holding the source, page and file type of its
+    records.
+
+    :param vdb_abstract_base.SearchFilter search_filter: The conditions
+    the records must satisfy or None.
+
+    :return: The conditions ("1" for no filter) and the values of their
+    placeholders.
+    :rtype: tuple[str, list]
+    """
+    conditions = []
+    values = []
+    if not search_filter:
+        return "1", values
+    if search_filter.source is not None:
+        conditions.append("source = ?")
+        values.append(search_filter.source)
+    if search_filter.source_prefix:
+        # A range instead of LIKE so the index of the source is used.
+        directory = abstract_vector_db.get_prefix_directory(
+            search_filter.source_prefix
+        )
+        conditions.append("source >= ? AND source < ?")
+        values.append(directory)
+        values.append(f"{directory}\U0010ffff")
+    if search_filter.min_page is not None:
+        conditions.append("page >= ?")
+        values.append(search_filter.min_page)
+    if search_filter.max_page is not None:
+        conditions.append("page <= ?")
+        values.append(search_filter.max_page)
+    if search_filter.file_types:
+        placeholders = ",".join("?" * len(search_filter.file_types))
+        conditions.append(f"file_type IN ({placeholders})")
+        values.extend(search_filter.file_types)
+    return " AND ".join(conditions) or "1", values
+
+
+def make_metadata(source, page):
+    """Returns the typed metadata stored for a record.
+
+    :param str source: The full path to the chunked document.
+    :param page: The page found by the splitter.
+
+    :return: The source, the page and the file type of the record.
+    :rtype: tuple[str, int, str]
+    """
+    return (
+        source or "n/a",
+        abstract_vector_db.get_page(source, page),
+        abstract_vector_db.get_file_type(source)
+    )
+
+
+class SidecarStore:
+    """Holds the text, source and page of each vector db record.
+
+    :ivar sqlite3.Connection _conn: The connection to the sqlite database.
+    :ivar threading.Lock _lock: Serializes the access to the connection.
+    """
+
+    def __init__(self, fullpath):
+        """Opens (creating it if needed) the sidecar store.
+
+        :param str fullpath: The full path to the sqlite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(fullpath, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SQL_CREATE_RECORDS)
+            self._conn.execute(_SQL_CREATE_SETTINGS)
+            self._conn.execute(_SQL_CREATE_SOURCE_INDEX)
+
+    def close(self):
+        """Closes the store."""
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def get_number_of_records(self):
+        """Returns the number of records in the store.
+
+        :return: The number of records in the store.
+        :rtype: int
+        """
+        with self._lock:
+            return self._conn.execute(_SQL_COUNT_RECORDS).fetchone()[0]
+
+    def insert(self, first_id, chunks, sources, pages):
+        """Inserts the payload of consecutive records without committing.
+
+        The caller must call commit (or rollback) when the matching
+        embeddings are persisted, so the store and the index never diverge.
+
+        :param int first_id: The id (position) of the first record.
+        :param list[str] chunks: The chunks to insert.
+        :param list[str] sources: The full paths to the documents.
+        :param list[int] pages: The pages holding the chunks.
+        """
+        rows = [
+            (first_id + i, chunk, *make_metadata(source, page))
+            for i, (chunk, source, page) in enumerate(
+                zip(chunks, sources, pages)
+            )
+        ]
+        with self._lock:
+            self._conn.executemany(_SQL_INSERT_RECORD, rows)
+
+    def commit(self):
+        """Commits the pending inserts."""
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self):
+        """Discards the pending inserts."""
+        with self._lock:
+            self._conn.rollback()
+
+    def truncate(self, count):
+        """Deletes the records with an id greater or equal to count.
+
+        Used to drop the payload of records whose embeddings were never
+        persisted to the index.
+
+        :param int count: The number of records to keep.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(_SQL_TRUNCATE_RECORDS, (count,))
+
+    def get_records(self, ids):
+        """Returns the payload for the passed in ids.
+
+        :param list[int] ids: The ids of the records to return.
+
+        :return: The (text, source, page) of each id in the order of the ids;
+        None for each unknown id.
+        :rtype: list[tuple[str, str, int] | None]
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        sql = _SQL_SELECT_RECORDS.format(placeholders=placeholders)
+        with self._lock:
+            rows = self._conn.execute(sql, ids).fetchall()
+        records = {row[0]: row[1:] for row in rows}
+        return [records.get(i) for i in ids]
+
+    def find_ids(self, search_filter):
+        """Returns the ids of the records matching the passed in filter.
+
+        The conditions are evaluated by sqlite using the index of the source
+        and page columns.
+
+        :param vdb_abstract_base.SearchFilter search_filter: The conditions
+        the records must satisfy.
+
+        :return: The sorted ids of the matching records.
+        :rtype: list[int]
+        """
+        conditions, values = make_filter_conditions(search_filter)
+        sql = _SQL_SELECT_IDS.format(conditions=conditions)
+        with self._lock:
+            rows = self._conn.execute(sql, values).fetchall()
+        return [row[0] for row in rows]
+
+    def get_setting(self, name, default=None):
+        """Returns the value of the passed in setting.
+
+        :param str name: The name of the setting.
+        :param str default: The value to return if the setting is missing.
+
+        :return: The value of the setting.
+        :rtype: str
+        """
+        with self._lock:
+            row = self._conn.execute(_SQL_SELECT_SETTING, (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_setting(self, name, value):
+        """Stores the value of the passed in setting.
+
+        :param str name: The name of the setting.
+        :param str value: The value to store.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(_SQL_UPSERT_SETTING, (name, str(value)))
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+_SQL_CREATE_RECORDS = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    source TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    file_type TEXT NOT NULL
+)
+"""
+
+_SQL_CREATE_SETTINGS = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+_SQL_CREATE_SOURCE_INDEX = """
+CREATE INDEX IF NOT EXISTS records_source ON records (source, page)
+"""
+
+_SQL_COUNT_RECORDS = "SELECT COUNT(*) FROM records"
+
+_SQL_INSERT_RECORD = """
+INSERT INTO records (id, text, source, page, file_type)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+_SQL_TRUNCATE_RECORDS = "DELETE FROM records WHERE id >= ?"
+
+_SQL_SELECT_RECORDS = \
+    "SELECT id, text, source, page FROM records WHERE id IN ({placeholders})"
+
+_SQL_SELECT_IDS = "SELECT id FROM records WHERE {conditions} ORDER BY id"
+
+_SQL_SELECT_SETTING = "SELECT value FROM settings WHERE name = ?"
+
+_SQL_UPSERT_SETTING = """
+INSERT INTO settings (name, value) VALUES (?, ?)
+ON CONFLICT(name) DO UPDATE SET value = excluded.value
+"""
+
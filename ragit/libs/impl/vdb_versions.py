@@ -0,0 +1,171 @@
+"""Manages the versions of the vector db of a collection.
+
+A rebuilt vector db is created in a new version directory under the
+versions subdirectory of the vectordb directory; once it is complete and
+validated the CURRENT file of the vectordb directory is atomically replaced
+to hold the name of the new version. Readers check the CURRENT file and
+switch to the new version without restarting, while the previous version
+stays available for the queries that are still using it.
+
+A vectordb directory without a CURRENT file holds an unversioned vector db
+directly under it (as created before the versioning support).
+
+Updating the records of the current version in place is recorded in the
+UPDATED file, so the readers caching results of the vector db can tell
+whether they are stale.
+"""
+
+import datetime
+import os
+import shutil
+
+
+def get_current_version(directory):
+    """Returns the current version of the vector db.
+
+    :param str directory: The vectordb directory.
+
+    :return: The name of the current version or None for the unversioned
+    vector db.
+    :rtype: str | None
+    """
+    try:
+        with open(os.path.join(directory, _CURRENT_FILE)) as fin:
+            return fin.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current_version(directory, version):
+    """Makes the passed in version current.
+
+    The pointer is replaced atomically, so a reader sees either the previous
+    or the new version.
+
+    :param str directory: The vectordb directory.
+    :param str version: The name of the version.
+
+    :raises: NotADirectoryError
+    """
+    version_dir = get_version_dir(directory, version)
+    if not os.path.isdir(version_dir):
+        raise NotADirectoryError(f"Not a directory {version_dir}")
+    fullpath = os.path.join(directory, _CURRENT_FILE)
+    temp_path = f"{fullpath}.tmp"
+    with open(temp_path, "w") as fout:
+        fout.write(version)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(temp_path, fullpath)
+
+
+def mark_updated(directory):
+    """Records that the records of the current version were updated.
+
+    :param str directory: The vectordb directory.
+    """
+    fullpath = os.path.join(directory, _UPDATED_FILE)
+    temp_path = f"{fullpath}.tmp"
+    with open(temp_path, "w") as fout:
+        fout.write(make_version())
+    os.replace(temp_path, fullpath)
+
+
+def get_update_stamp(directory):
+    """Returns the stamp of the last update of the vector db.
+
+    :param str directory: The vectordb directory.
+
+    :return: A value that changes when the vector db is updated or None if
+    it was never updated in place.
+    :rtype: str | None
+    """
+    try:
+        with open(os.path.join(directory, _UPDATED_FILE)) as fin:
+            return fin.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def make_version():
+    """Creates a new version directory name.
+
+    :return: The name of the version; later versions sort after.
+    :rtype: str
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime(
+        "%Y%m%d%H%M%S%f"
+    )
+
+
+def get_version_dir(directory, version):
+    """Returns the directory of the passed in version.
+
+    :param str directory: The vectordb directory.
+    :param str version: The name of the version or None for the unversioned
+    vector db.
+
+    :return: The directory holding the files of the version.
+    :rtype: str
+    """
+    if version is None:
+        return directory
+    return os.path.join(directory, _VERSIONS_DIR, version)
+
+
+def get_versions(directory):
+    """Returns all the versions of the vector db.
+
+    :param str directory: The vectordb directory.
+
+    :return: The names of the versions, oldest first.
+    :rtype: list[str]
+    """
+    versions_dir = os.path.join(directory, _VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(
+        entry.name for entry in os.scandir(versions_dir) if entry.is_dir()
+    )
+
+
+def remove_version(directory, version):
+    """Deletes the passed in version.
+
+    :param str directory: The vectordb directory.
+    :param str version: The name of the version.
+
+    :raises: ValueError
+    """
+    if version == get_current_version(directory):
+        raise ValueError(f"Cannot remove the current version {version}.")
+    shutil.rmtree(get_version_dir(directory, version), ignore_errors=True)
+
+
+def remove_old_versions(directory, keep=2):
+    """Deletes all but the latest versions.
+
+    The current version and the previous one are kept by default, so the
+    queries that started before the switch can complete.
+
+    :param str directory: The vectordb directory.
+    :param int keep: The number of the latest versions to keep.
+    """
+    current = get_current_version(directory)
+    versions = get_versions(directory)
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != current:
+            remove_version(directory, version)
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The file holding the name of the current version.
+_CURRENT_FILE = "CURRENT"
+
+# The file holding the stamp of the last update.
+_UPDATED_FILE = "UPDATED"
+
+# The subdirectory holding the versions.
+_VERSIONS_DIR = "versions"
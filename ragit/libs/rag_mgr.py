@@ -4,16 +4,29 @@ import dataclasses
 import datetime
 import logging
 import os
+import shutil
+import threading
 
 import ragit.libs.common as common
+import ragit.libs.executor_pools as executor_pools
 import ragit.libs.impl.chunks_mgr as chunks_mgr
+import ragit.libs.impl.context_packer as context_packer
+import ragit.libs.impl.conversion_scheduler as conversion_scheduler
+import ragit.libs.impl.doc_catalog as doc_catalog
+import ragit.libs.impl.lexical_index as lexical_index
 import ragit.libs.impl.metrics as metrics
-import ragit.libs.impl.pdf_preprocessor as pp
+import ragit.libs.impl.quantization as quantization
 import ragit.libs.impl.query_executor as query_executor
+import ragit.libs.impl.response_cache as response_cache
+import ragit.libs.impl.semantic_cache as semantic_cache
+import ragit.libs.impl.single_flight as single_flight
+import ragit.libs.impl.vdb_abstract_base as abstract_vector_db
 import ragit.libs.impl.vdb_factory as vector_db
+import ragit.libs.impl.vdb_versions as vdb_versions
 
 # Aliases.
 logger = logging.getLogger(__name__)
+PoolType = executor_pools.PoolType
 
 
 class RagManager:
@@ -40,7 +53,8 @@ class RagManager:
 
     - **documents**: Source files (PDF, DOCX, MD, etc.) for RAG creation.
 
-    - **vectordb: Stores the vector database.
+    - **vectordb: Stores the vector database; a rebuilt vector database is
+      stored under a new version (see vdb_versions).
 
     This class should be used as the high-level abstraction of all the
     lower level details that are implemented under the impl directory which
@@ -54,8 +68,39 @@ class RagManager:
     :ivar str _documents_dir: The root directory holding the documents for
     the collection.
 
+    :ivar str _vectordb_dir: The directory holding the versions of the
+    vectordb (see vdb_versions).
+
+    :ivar str _version: The version of the vectordb in use; None for the
+    unversioned vectordb.
+
     :ivar str _vectordb_fullpath: The full path to the vectordb database file.
 
+    :ivar str _lexical_index_fullpath: The full path to the lexical (BM25)
+    index of the chunks.
+
+    :ivar AsyncQueryExecutor _async_executor: Executes the async queries;
+    created by the first one.
+
+    :ivar SemanticCache _semantic_cache: Holds the answers of the recent
+    questions; None if the cache is disabled.
+
+    :ivar ResponseCache _response_cache: Holds the answers by the exact
+    question; opened by the first query.
+
+    :ivar threading.Lock _response_cache_lock: Serializes the opening of the
+    response cache by the threads of the DATABASE pool.
+
+    :ivar SingleFlight _single_flight: Coalesces the concurrent async
+    queries of the same question.
+
+    :ivar bool _async_only: True if the manager serves only the async
+    queries, leaving the (process wide) synchronous query executor to
+    another collection.
+
+    :ivar openai.AsyncOpenAI _async_client: The client to the LLM shared by
+    the collections or None for a client owned by the async executor.
+
     :cvar str _SHARED_DIR: The shared directory for documents.
 
     :cvar str _VECTOR_COLLECTION_NAME: The name of the collection inside the
@@ -67,16 +112,33 @@ class RagManager:
     _rag_name = None
     _base_dir = None
     _documents_dir = None
+    _vectordb_dir = None
+    _version = None
     _vectordb_fullpath = None
-
-    def __init__(self, rag_name):
+    _lexical_index_fullpath = None
+    _reload_lock = None
+    _async_executor = None
+    _semantic_cache = None
+    _response_cache = None
+    _response_cache_lock = None
+    _single_flight = None
+    _async_only = False
+    _async_client = None
+
+    def __init__(self, rag_name, async_only=False, async_client=None):
         """Initializer.
 
         :param str rag_name: The name of the RAG collection.
+        :param bool async_only: If True only the async queries are served,
+        so many collections can be served by the same process.
+        :param openai.AsyncOpenAI async_client: The client to the LLM shared
+        by the collections; if None the async executor creates its own.
 
         :raises: NotADirectoryError, ValueError
         """
         self._rag_name = rag_name
+        self._async_only = async_only
+        self._async_client = async_client
         self._base_dir = os.path.join(
             common.get_home_dir(),
             self._SHARED_DIR,
@@ -99,32 +161,164 @@ class RagManager:
         # Assign the vectordb directory.
         directory = os.path.join(homedir, self._base_dir, "vectordb")
         common.create_directory_if_not_exists(directory)
+        self._vectordb_dir = directory
+        self._reload_lock = threading.Lock()
+        self._response_cache_lock = threading.Lock()
+        self._single_flight = single_flight.SingleFlight()
+        self._set_version(vdb_versions.get_current_version(directory))
+
+        threshold = semantic_cache.get_similarity_threshold()
+        if threshold:
+            self._semantic_cache = semantic_cache.SemanticCache(
+                threshold, semantic_cache.get_ttl(),
+                semantic_cache.get_max_size()
+            )
+
+        if not async_only:
+            query_executor.initialize(
+                self._vectordb_fullpath,
+                self._VECTOR_COLLECTION_NAME,
+                lexical_index_fullpath=self._lexical_index_fullpath
+            )
+
+    def _set_version(self, version):
+        """Points the vector db and lexical index paths to the version.
+
+        :param str | None version: The version of the vector db; None for
+        the unversioned vector db.
+
+        :raises: ValueError
+        """
+        self._version = version
+        self._vectordb_fullpath, self._lexical_index_fullpath = \
+            self._get_index_paths(version)
+
+    def _get_index_paths(self, version):
+        """Returns the vector db and lexical index paths of the version.
+
+        :param str | None version: The version of the vector db.
+
+        :returns: The full paths to the vector db and the lexical index.
+        :rtype: tuple[str, str]
+
+        :raises: ValueError
+        """
+        directory = vdb_versions.get_version_dir(self._vectordb_dir, version)
+        rag_name = self._rag_name
 
         vector_db_provider = common.get_vector_db_provider()
 
         if vector_db_provider == common.VectorDbProviderEnum.MILVUS:
-            self._vectordb_fullpath = os.path.join(
+            vectordb_fullpath = os.path.join(
                 directory, f"{rag_name}-milvus-vector.db"
             )
         elif vector_db_provider == common.VectorDbProviderEnum.CHROMA:
-            self._vectordb_fullpath = os.path.join(
+            vectordb_fullpath = os.path.join(
                 directory, f"{rag_name}-chroma-vector.db"
             )
+        elif vector_db_provider == common.VectorDbProviderEnum.FAISS:
+            vectordb_fullpath = os.path.join(
+                directory, f"{rag_name}-faiss-vector.db"
+            )
+        elif vector_db_provider == common.VectorDbProviderEnum.NUMPY:
+            vectordb_fullpath = os.path.join(
+                directory, f"{rag_name}-numpy-vector.db"
+            )
         else:
             raise ValueError("Unsupported vector-db provider.")
 
-        query_executor.initialize(
-            self._vectordb_fullpath,
-            self._VECTOR_COLLECTION_NAME
+        lexical_index_fullpath = os.path.join(
+            directory, f"{rag_name}-lexical.sqlite"
         )
+        return vectordb_fullpath, lexical_index_fullpath
+
+    def _reload_if_needed(self):
+        """Switches the queries to the current version of the vector db.
+
+        Picks up a rebuild completed by another process without restarting.
+        """
+        version = vdb_versions.get_current_version(self._vectordb_dir)
+        if version == self._version:
+            return
+        with self._reload_lock:
+            if version == self._version:
+                return
+            logger.info("Switching to vector db version %s.", version)
+            self._set_version(version)
+            if not self._async_only:
+                query_executor.reload(
+                    self._vectordb_fullpath,
+                    lexical_index_fullpath=self._lexical_index_fullpath
+                )
+            if self._async_executor:
+                self._async_executor.reload(
+                    self._vectordb_fullpath,
+                    lexical_index_fullpath=self._lexical_index_fullpath
+                )
 
     def close(self):
-        """Closes all open connections."""
-        query_executor.close()
+        """Closes all open connections.
+
+        The async executor must be closed by close_async.
+        """
+        if not self._async_only:
+            query_executor.close()
         self._rag_name = None
         self._base_dir = None
         self._documents_dir = None
+        self._vectordb_dir = None
         self._vectordb_fullpath = None
+        self._lexical_index_fullpath = None
+        self._version = None
+        self._async_executor = None
+        self._semantic_cache = None
+        self._single_flight = None
+        if self._response_cache:
+            self._response_cache.close()
+            self._response_cache = None
+
+    async def close_async(self):
+        """Closes all open connections including the async executor."""
+        if self._async_executor:
+            await self._async_executor.close()
+            self._async_executor = None
+        self.close()
+
+    def get_memory_size(self):
+        """Returns the (approximate) memory used by the open collection.
+
+        :return: The bytes of the files of the vector db and the lexical
+        index, which are loaded (or memory mapped) by the queries.
+        :rtype: int
+        """
+        return sum(
+            common.get_disk_size(path)
+            for path in (self._vectordb_fullpath, self._lexical_index_fullpath)
+        )
+
+    def warm_up(self):
+        """Prepares the queries without querying the LLM.
+
+        Loads the vector db and the lexical index, opens the cache of the
+        answers and connects to the LLM.
+
+        :raises MyGenAIException
+        """
+        self._check_sync_queries()
+        self._reload_if_needed()
+        self._get_response_cache()
+        query_executor.warm_up()
+
+    async def warm_up_async(self):
+        """Prepares the async queries without querying the LLM.
+
+        See warm_up.
+        """
+        await executor_pools.run(PoolType.DATABASE, self._get_response_cache)
+        executor = await executor_pools.run(
+            PoolType.DATABASE, self._get_async_executor
+        )
+        await executor.warm_up()
 
     def get_rag_collection_name(self):
         """Returns the collection name.
@@ -134,20 +328,426 @@ class RagManager:
         """
         return self._rag_name
 
-    def query(self, question, k=None, temperature=None, max_tokens=None):
+    def query(self, question, k=None, temperature=None, max_tokens=None,
+              filters=None, format_code=True):
         """Uses the RAG collection to enhance the LLM to answer the question.
 
         :param str question: The question to answer.
         :param int k: The number of vector matches to use.
         :param float temperature: The temperature to use for the query.
         :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata (see validate_filters); a relative
+        source prefix is relative to the documents directory.
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
 
         :return: The LLM generated answer as an instance of the QueryResponse.
         :rtype: QueryResponse
 
         :raises MyGenAIException
         """
-        return query_executor.query(question, k, temperature, max_tokens)
+        self._check_sync_queries()
+        self._reload_if_needed()
+        filters = self._get_filters(filters)
+        key = self._get_cache_key(
+            k, temperature, max_tokens, query_executor.get_model_name(),
+            filters, format_code
+        )
+        response = self._get_exact_match(question, key)
+        if response is not None:
+            return response
+        embeddings = None
+        if self._semantic_cache:
+            embeddings = query_executor.get_query_embeddings(question)
+            response = self._semantic_cache.lookup(embeddings, key)
+            if response is not None:
+                return response
+        response = query_executor.query(
+            question, k, temperature, max_tokens, filters, embeddings,
+            format_code
+        )
+        self._cache_response(question, key, embeddings, response)
+        return response
+
+    def stream_query(self, question, k=None, temperature=None,
+                     max_tokens=None, filters=None, format_code=True):
+        """Streams the answer of the LLM to the question as it is generated.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata (see query).
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
+
+        :return: A generator yielding the text of the answer as it is
+        generated (str) and finally the complete QueryResponse.
+        :rtype: Iterator[str | QueryResponse]
+
+        :raises MyGenAIException
+        """
+        self._check_sync_queries()
+        self._reload_if_needed()
+        filters = self._get_filters(filters)
+        key = self._get_cache_key(
+            k, temperature, max_tokens, query_executor.get_model_name(),
+            filters, format_code
+        )
+        response = self._get_exact_match(question, key)
+        embeddings = None
+        if response is None and self._semantic_cache:
+            embeddings = query_executor.get_query_embeddings(question)
+            response = self._semantic_cache.lookup(embeddings, key)
+        if response is not None:
+            return iter([response.response, response])
+        stream = query_executor.stream_query(
+            question, k, temperature, max_tokens, filters, embeddings,
+            format_code
+        )
+        return self._cache_stream(stream, question, key, embeddings)
+
+    def _check_sync_queries(self):
+        """Verifies that the manager serves the synchronous queries.
+
+        :raises: ValueError
+        """
+        if self._async_only:
+            raise ValueError(
+                f"The collection {self._rag_name} serves only async queries."
+            )
+
+    def _cache_stream(self, stream, question, key, embeddings):
+        """Caches the answer of a stream when it completes.
+
+        :param Iterator stream: The stream of the answer.
+        :param str question: The question.
+        :param tuple key: The cache key of the question.
+        :param list[float] embeddings: The embeddings of the question or None.
+
+        :yield: The items of the stream.
+        """
+        for part in stream:
+            if not isinstance(part, str):
+                self._cache_response(question, key, embeddings, part)
+            yield part
+
+    async def query_async(self, question, k=None, temperature=None,
+                          max_tokens=None, filters=None, format_code=True):
+        """Answers the question without blocking the event loop.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata (see query).
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
+
+        :return: The LLM generated answer as an instance of the QueryResponse.
+        :rtype: QueryResponse
+        """
+        filters = self._get_filters(filters)
+        executor, key = await executor_pools.run(
+            PoolType.DATABASE, self._prepare_async_query, k, temperature,
+            max_tokens, filters, format_code
+        )
+        # The concurrent queries of the same question await the first one.
+        return await self._single_flight.run(
+            response_cache.make_key(question, key),
+            self._query_cached_async, executor, question, k, temperature,
+            max_tokens, filters, format_code, key
+        )
+
+    async def _query_cached_async(self, executor, question, k, temperature,
+                                  max_tokens, filters, format_code, key):
+        """Returns the cached answer or the answer of the LLM caching it.
+
+        :param AsyncQueryExecutor executor: The executor to use.
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter filters: The validated filters.
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
+        :param tuple key: The cache key of the question.
+
+        :return: The answer.
+        :rtype: QueryResponse
+        """
+        response = await executor_pools.run(
+            PoolType.DATABASE, self._get_exact_match, question, key
+        )
+        if response is not None:
+            return response
+        embeddings = None
+        if self._semantic_cache:
+            embeddings = await executor.get_query_embeddings(question)
+            response = self._semantic_cache.lookup(embeddings, key)
+            if response is not None:
+                return response
+        response = await executor.query(
+            question, k, temperature, max_tokens, filters, embeddings,
+            format_code
+        )
+        await executor_pools.run(
+            PoolType.DATABASE, self._cache_response, question, key,
+            embeddings, response
+        )
+        return response
+
+    def stream_query_async(self, question, k=None, temperature=None,
+                           max_tokens=None, filters=None, format_code=True):
+        """Streams the answer to the question without blocking the event loop.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter | dict filters: Restricts the matches to the
+        chunks with the matching metadata (see query).
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
+
+        :return: An async generator yielding the text of the answer as it is
+        generated (str) and finally the complete QueryResponse.
+        :rtype: AsyncIterator[str | QueryResponse]
+        """
+        filters = self._get_filters(filters)
+        return self._stream_query_cached_async(
+            question, k, temperature, max_tokens, filters, format_code
+        )
+
+    async def _stream_query_cached_async(self, question, k, temperature,
+                                         max_tokens, filters,
+                                         format_code=True):
+        """Streams the cached answer or the answer of the LLM caching it.
+
+        :param str question: The question to answer.
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter filters: The validated filters.
+        :param bool format_code: If False the python code of the answer is
+        not formatted.
+
+        :yield: The text of the answer (str) and finally the QueryResponse.
+        """
+        executor, key = await executor_pools.run(
+            PoolType.DATABASE, self._prepare_async_query, k, temperature,
+            max_tokens, filters, format_code
+        )
+        flight_key = response_cache.make_key(question, key)
+        response = await executor_pools.run(
+            PoolType.DATABASE, self._get_exact_match, question, key
+        )
+        if response is None:
+            # The same question is being answered for another request.
+            response = await self._single_flight.wait(flight_key)
+        embeddings = None
+        if response is None and self._semantic_cache:
+            embeddings = await executor.get_query_embeddings(question)
+            response = self._semantic_cache.lookup(embeddings, key)
+        if response is None:
+            response = await self._single_flight.wait(flight_key)
+        if response is not None:
+            yield response.response
+            yield response
+            return
+        flight = self._single_flight.lead(flight_key)
+        try:
+            async for part in executor.stream_query(
+                    question, k, temperature, max_tokens, filters, embeddings,
+                    format_code):
+                if not isinstance(part, str):
+                    await executor_pools.run(
+                        PoolType.DATABASE, self._cache_response, question,
+                        key, embeddings, part
+                    )
+                    flight.set_result(part)
+                yield part
+        except Exception as ex:
+            flight.set_exception(ex)
+            raise
+        finally:
+            # A stream closed before completing abandons the flight.
+            if not flight.done():
+                flight.cancel()
+
+    def _get_exact_match(self, question, key):
+        """Returns the cached answer of the same question.
+
+        :param str question: The question.
+        :param tuple key: The cache key of the question.
+
+        :return: The cached answer or None.
+        :rtype: QueryResponse | None
+        """
+        cache = self._get_response_cache()
+        if not cache:
+            return None
+        data = cache.get(response_cache.make_key(question, key))
+        if data is None:
+            return None
+        data = dict(data)
+        data["matches"] = [tuple(match) for match in data["matches"]]
+        return query_executor.QueryResponse(**data)
+
+    def _cache_response(self, question, key, embeddings, response):
+        """Caches the answer of a question.
+
+        :param str question: The question.
+        :param tuple key: The cache key of the question.
+        :param list[float] embeddings: The embeddings of the question or None.
+        :param QueryResponse response: The answer.
+        """
+        cache = self._get_response_cache()
+        if cache:
+            cache.put(
+                response_cache.make_key(question, key),
+                dataclasses.asdict(response)
+            )
+        if self._semantic_cache and embeddings is not None:
+            self._semantic_cache.insert(embeddings, key, response)
+
+    def _get_response_cache(self):
+        """Returns the exact match cache, opening it when first used.
+
+        The cache is stored in the registry directory of the collection. The
+        async queries call it in the DATABASE pool since it blocks on sqlite.
+
+        :return: The cache or None if it is disabled.
+        :rtype: ResponseCache | None
+        """
+        if self._response_cache is not None or \
+                not response_cache.is_enabled():
+            return self._response_cache
+        with self._response_cache_lock:
+            if self._response_cache is None:
+                directory = os.path.join(self._base_dir, "registry")
+                common.create_directory_if_not_exists(directory)
+                self._response_cache = response_cache.ResponseCache(
+                    os.path.join(
+                        directory,
+                        f"{self._rag_name}.response_cache.sqlite.db"
+                    )
+                )
+        return self._response_cache
+
+    def get_semantic_cache_metrics(self):
+        """Returns the usage of the semantic cache.
+
+        :return: The metrics of the cache or None if it is disabled.
+        :rtype: CacheMetrics | None
+        """
+        if not self._semantic_cache:
+            return None
+        return self._semantic_cache.get_metrics()
+
+    def get_single_flight_metrics(self):
+        """Returns the coalescing of the concurrent async queries.
+
+        :rtype: FlightMetrics
+        """
+        return self._single_flight.get_metrics()
+
+    def _get_cache_key(self, k, temperature, max_tokens, model_name,
+                       filters, format_code=True):
+        """Returns the settings a cached answer must match.
+
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param str model_name: The model of the executor answering it.
+        :param SearchFilter filters: The validated filters.
+        :param bool format_code: True if the python code of the answer is
+        formatted.
+
+        :return: The key of the answers of the query.
+        :rtype: tuple
+        """
+        return (
+            k, temperature, max_tokens, model_name, filters,
+            format_code, context_packer.get_token_budget(), self._version,
+            vdb_versions.get_update_stamp(self._vectordb_dir)
+        )
+
+    def _get_async_executor(self):
+        """Returns the async executor of the current vector db version.
+
+        Opens (or reloads) the vector db, so the async queries call it in
+        the DATABASE pool.
+
+        :return: The async executor.
+        :rtype: AsyncQueryExecutor
+        """
+        self._reload_if_needed()
+        with self._reload_lock:
+            if self._async_executor is None:
+                self._async_executor = query_executor.AsyncQueryExecutor(
+                    self._vectordb_fullpath,
+                    self._VECTOR_COLLECTION_NAME,
+                    lexical_index_fullpath=self._lexical_index_fullpath,
+                    client=self._async_client
+                )
+        return self._async_executor
+
+    def _prepare_async_query(self, k, temperature, max_tokens, filters,
+                             format_code):
+        """Returns the executor and the cache key of an async query.
+
+        Reads the version files of the vector db (reloading it after a
+        rebuild), so it runs in the DATABASE pool instead of the event loop.
+
+        :param int k: The number of vector matches to use.
+        :param float temperature: The temperature to use for the query.
+        :param float max_tokens: The max_tokens to use for the query.
+        :param SearchFilter filters: The validated filters.
+        :param bool format_code: True if the python code of the answer is
+        formatted.
+
+        :return: The async executor and the cache key of the query.
+        :rtype: tuple[AsyncQueryExecutor, tuple]
+        """
+        executor = self._get_async_executor()
+        key = self._get_cache_key(
+            k, temperature, max_tokens, executor.get_model_name(), filters,
+            format_code
+        )
+        return executor, key
+
+    def _get_filters(self, filters):
+        """Validates the filters of a query.
+
+        :param SearchFilter | dict filters: The filters to validate.
+
+        :return: The filters with a relative source prefix made relative to
+        the documents directory.
+        :rtype: SearchFilter | None
+
+        :raises: ValueError if the source prefix is not under the documents
+        directory.
+        """
+        filters = abstract_vector_db.validate_filters(filters)
+        if filters and filters.source_prefix:
+            documents_dir = os.path.normpath(self._documents_dir)
+            source_prefix = os.path.normpath(
+                os.path.join(documents_dir, filters.source_prefix)
+            )
+            if os.path.commonpath([documents_dir, source_prefix]) != \
+                    documents_dir:
+                raise ValueError(
+                    f"The source prefix {filters.source_prefix} is not "
+                    f"under the documents directory."
+                )
+            filters = dataclasses.replace(
+                filters, source_prefix=source_prefix
+            )
+        return filters
 
     def get_base_dir(self):
         """Returns the base directory for the RAG collection.
@@ -173,6 +773,14 @@ class RagManager:
         """
         return self._vectordb_fullpath
 
+    def get_lexical_index_fullpath(self):
+        """Returns the full path to the lexical index for the given RAG.
+
+        :return: The full path to the lexical index for the given RAG.
+        :rtype: str
+        """
+        return self._lexical_index_fullpath
+
     @classmethod
     def get_all_rag_collections(cls):
         """Returns a list with all the available RAG collection names.
@@ -186,12 +794,7 @@ class RagManager:
         :rtype: list [str]
         """
         base_dir = os.path.join(common.get_home_dir(), cls._SHARED_DIR)
-        rag_collections = []
-        for item in os.listdir(base_dir):
-            item_path = os.path.join(base_dir, item)
-            if os.path.isdir(item_path):
-                rag_collections.append(item)
-        return rag_collections
+        return doc_catalog.find_subdirectories(base_dir)
 
     def get_metrics(self, db):
         """Finds the metrics for the collection.
@@ -227,22 +830,76 @@ class RagManager:
             pdf_missing_markdowns=pdf_missing_markdowns
         )
 
-    def create_missing_markdowns(self):
+    def get_vector_db_recall(self, k=10, sample_size=100, dimension=1536):
+        """Measures the recall of the (possibly quantized) vector db search.
+
+        :param int k: The number of matches to compare.
+        :param int sample_size: The number of sample queries to run.
+        :param int dimension: The dimensions of the embeddings array.
+
+        :returns: The quantization, its memory and recall@k.
+        :rtype: VectorDbRecall
+
+        :raises NotImplementedError: The provider does not support it.
+        """
+        vdb = vector_db.get_vector_db(
+            fullpath=self.get_vector_db_fullpath(),
+            collection_name=self._VECTOR_COLLECTION_NAME,
+            dimension=dimension
+        )
+        try:
+            recall = vdb.evaluate_recall(k, sample_size)
+            vdb_quantization = vdb.get_quantization()
+            return VectorDbRecall(
+                quantization=vdb_quantization.name,
+                bytes_per_vector=quantization.get_bytes_per_vector(
+                    vdb_quantization, dimension
+                ),
+                records=vdb.get_number_of_records(),
+                k=k,
+                recall=round(recall, 4)
+            )
+        finally:
+            vdb.close()
+
+    def create_missing_markdowns(
+            self, parser=None,
+            concurrency=conversion_scheduler.DEFAULT_CONCURRENCY,
+            max_attempts=conversion_scheduler.DEFAULT_MAX_ATTEMPTS,
+            local_extraction=True):
         """Creates the missing markdowns.
 
         Applies to images that correspond to pdf(s) but still do not have been
         converted to markdowns.
+
+        :param parser: The parser to use for the conversion; if None the
+        default (remote) parser is used.
+        :param int concurrency: The maximum number of concurrent conversions.
+        :param int max_attempts: The maximum attempts for each pdf.
+        :param bool local_extraction: If True the text only pages are
+        extracted locally and only the complex pages are sent to the parser.
+
+        :returns: The results of the conversion for each pdf.
+        :rtype: list[ConversionResult]
         """
         paths = metrics.get_pdf_files_missing_markdowns(self._rag_name)
         total = len(paths)
-
-        for count, pdf_path in enumerate(paths,start=1):
-            print(f"{count}/{total}: Processing {pdf_path}")
-            t1 = datetime.datetime.now()
-            pp.create_markdowns_from_pdf(pdf_path)
-            t2 = datetime.datetime.now()
-            duration = (t2 - t1).total_seconds()
-            print(f" {count}/{total}  {pdf_path} took {duration:.2f} seconds")
+        print(f"Converting {total} pdf files using {concurrency} workers.")
+
+        t1 = datetime.datetime.now()
+        results = conversion_scheduler.convert_pdfs(
+            paths,
+            parser=parser,
+            concurrency=concurrency,
+            max_attempts=max_attempts,
+            local_extraction=local_extraction
+        )
+        t2 = datetime.datetime.now()
+        duration = (t2 - t1).total_seconds()
+        failed = sum(1 for result in results if not result.succeeded)
+        print(f"Converted {total - failed}/{total} pdf files "
+              f"in {duration:.2f} seconds.")
+        return results
 
     def insert_chunks_to_db(self, db, max_count=None, verbose=False):
         """Inserts the chunks to the database.
@@ -311,13 +968,51 @@ class RagManager:
             collection_name=self._VECTOR_COLLECTION_NAME,
             dimension=dimension
         )
+        lexical = lexical_index.LexicalIndex(self._lexical_index_fullpath)
+        try:
+            if lexical.get_number_of_records() == 0 and \
+                    vdb.get_number_of_records() > 0:
+                # Built after the vector db; index the existing chunks.
+                self._rebuild_lexical_index(db, lexical, batch_size)
+            count = self._update_vector_db(
+                db, vdb, lexical, max_count, batch_size, verbose
+            )
+        finally:
+            lexical.close()
+        if count:
+            # Invalidates the cached answers (of all the processes).
+            vdb_versions.mark_updated(self._vectordb_dir)
+            if self._semantic_cache:
+                self._semantic_cache.invalidate()
+        return count
+
+    def _update_vector_db(self, db, vdb, lexical, max_count, batch_size,
+                          verbose):
+        """Inserts the chunks missing from the vector and lexical indexes.
+
+        :param dbutil.SimpleSQL db: The database wrapper to use.
+        :param AbstractVectorDb vdb: The vector db to update.
+        :param lexical_index.LexicalIndex lexical: The lexical index.
+        :param int | None max_count: The maximum number of chunks to insert.
+        :param int batch_size: The size of each inserted batch.
+        :param bool verbose: If True then informative messages will be printed.
 
+        The chunks are marked as vectorized once they are persisted: after
+        each batch for the vector dbs persisting each insert and after the
+        flush for the rest (see AbstractVectorDb.needs_flush), so the
+        chunks of an interrupted update are inserted again only if they
+        were lost.
+
+        :returns: The number of chunks that were inserted to the vector db.
+        :rtype: int
+        """
         total_inserted_counter = 0
         chunks = []
         embeddings = []
         sources = []
         pages = []
         vectorized_chunk_ids = []
+        unflushed_chunk_ids = []
 
         for chunk_id in chunks_mgr.get_chunk_ids_to_insert_to_vector_db(db):
             if verbose:
@@ -331,25 +1026,164 @@ class RagManager:
             if max_count is not None and len(embeddings) >= max_count:
                 break
             if len(embeddings) > batch_size:
-                vdb.insert(chunks, embeddings, sources, pages)
+                vdb.insert(
+                    chunks, embeddings, sources, pages,
+                    ids=vectorized_chunk_ids
+                )
+                lexical.insert(vectorized_chunk_ids, chunks, sources, pages)
                 total_inserted_counter += len(embeddings)
-                chunks_mgr.set_vectorized(db, vectorized_chunk_ids)
+                if vdb.needs_flush():
+                    unflushed_chunk_ids.extend(vectorized_chunk_ids)
+                else:
+                    chunks_mgr.set_vectorized(db, vectorized_chunk_ids)
                 sources = []
+                pages = []
                 chunks = []
                 embeddings = []
                 vectorized_chunk_ids = []
 
         # Insert leftovers if needed.
         if len(embeddings):
-            vdb.insert(chunks, embeddings, sources, pages)
+            vdb.insert(
+                chunks, embeddings, sources, pages, ids=vectorized_chunk_ids
+            )
+            lexical.insert(vectorized_chunk_ids, chunks, sources, pages)
             total_inserted_counter += len(embeddings)
-            chunks_mgr.set_vectorized(db, vectorized_chunk_ids)
+            if vdb.needs_flush():
+                unflushed_chunk_ids.extend(vectorized_chunk_ids)
+            else:
+                chunks_mgr.set_vectorized(db, vectorized_chunk_ids)
+
+        vdb.flush()
+        for start in range(0, len(unflushed_chunk_ids), batch_size):
+            chunks_mgr.set_vectorized(
+                db, unflushed_chunk_ids[start:start + batch_size]
+            )
 
         if verbose:
             print(f"Totally inserted records: {total_inserted_counter}")
 
         return total_inserted_counter
 
+    def rebuild_vector_db(self, db, dimension=1536, shards=4,
+                          batch_size=2000, verbose=False):
+        """Rebuilds the vector db and lexical index into a new version.
+
+        All the chunks with embeddings are loaded concurrently by the shards
+        and inserted to a new version of the vector db while the current one
+        keeps serving queries; after validating the counts the new version
+        becomes current and it is picked up by the running queries without
+        restarting. The two latest versions are kept.
+
+        :param dbutil.SimpleSQL db: The database wrapper to use.
+        :param int dimension: The dimensions of the embeddings array.
+        :param int shards: The number of concurrent database loaders.
+        :param int batch_size: The number of chunks loaded by each query.
+        :param bool verbose: If True then informative messages will be printed.
+
+        :returns: The number of chunks in the new version.
+        :rtype: int
+
+        :raises MyGenAIException, RuntimeError
+        """
+        chunk_ids = sorted(chunks_mgr.find_chunks_with_embeddings(db))
+        version = vdb_versions.make_version()
+        version_dir = vdb_versions.get_version_dir(self._vectordb_dir, version)
+        os.makedirs(version_dir)
+        vectordb_fullpath, lexical_index_fullpath = \
+            self._get_index_paths(version)
+        if verbose:
+            print(f"rebuilding the vector db into version {version}.")
+        try:
+            vdb = vector_db.get_vector_db(
+                fullpath=vectordb_fullpath,
+                collection_name=self._VECTOR_COLLECTION_NAME,
+                dimension=dimension
+            )
+            lexical = lexical_index.LexicalIndex(lexical_index_fullpath)
+            try:
+                count = self._insert_shards(
+                    vdb, lexical, chunk_ids, shards, batch_size, verbose
+                )
+                counts = (
+                    count,
+                    vdb.get_number_of_records(),
+                    lexical.get_number_of_records()
+                )
+            finally:
+                lexical.close()
+                vdb.close()
+            if any(c != len(chunk_ids) for c in counts):
+                raise RuntimeError(
+                    f"Rebuilt version {version} is incomplete; expected "
+                    f"{len(chunk_ids)} chunks, loaded, vector db and lexical "
+                    f"index counts are {counts}."
+                )
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+
+        vdb_versions.set_current_version(self._vectordb_dir, version)
+        for start in range(0, len(chunk_ids), batch_size):
+            chunks_mgr.set_vectorized(db, chunk_ids[start:start + batch_size])
+        self._reload_if_needed()
+        if self._semantic_cache:
+            self._semantic_cache.invalidate()
+        vdb_versions.remove_old_versions(self._vectordb_dir)
+        if verbose:
+            print(f"Version {version} holds {len(chunk_ids)} records.")
+        return len(chunk_ids)
+
+    @staticmethod
+    def _insert_shards(vdb, lexical, chunk_ids, shards, batch_size, verbose):
+        """Inserts the chunks loaded by the shards to the passed in indexes.
+
+        :param AbstractVectorDb vdb: The vector db to insert to.
+        :param lexical_index.LexicalIndex lexical: The lexical index.
+        :param list[int] chunk_ids: The chunks to insert.
+        :param int shards: The number of concurrent database loaders.
+        :param int batch_size: The number of chunks loaded by each query.
+        :param bool verbose: If True then informative messages will be printed.
+
+        :returns: The number of inserted chunks.
+        :rtype: int
+        """
+        count = 0
+        for batch in chunks_mgr.load_embeddings_in_shards(
+                chunk_ids, batch_size, shards):
+            if not batch:
+                continue
+            ids = [chunk_id for chunk_id, _ in batch]
+            chunks = [info.get_chunk() for _, info in batch]
+            sources = [info.get_source() for _, info in batch]
+            pages = [info.get_page() for _, info in batch]
+            vdb.insert(
+                chunks, [info.get_embeddings() for _, info in batch],
+                sources, pages, ids=ids
+            )
+            lexical.insert(ids, chunks, sources, pages)
+            count += len(batch)
+            if verbose:
+                print(f"Inserted {count}/{len(chunk_ids)} records.")
+        return count
+
+    @staticmethod
+    def _rebuild_lexical_index(db, lexical, batch_size):
+        """Inserts all the vectorized chunks to the lexical index.
+
+        :param dbutil.SimpleSQL db: The database wrapper to use.
+        :param lexical_index.LexicalIndex lexical: The lexical index.
+        :param int batch_size: The size of each inserted batch.
+        """
+        batch = []
+        for row in chunks_mgr.get_vectorized_chunks(db):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                lexical.insert(*zip(*batch))
+                batch = []
+        if batch:
+            lexical.insert(*zip(*batch))
+
 
 @dataclasses.dataclass(frozen=True)
 class RagMetrics:
@@ -377,3 +1211,21 @@ class RagMetrics:
     to_insert_to_vector_db: int
     total_pdf_files: int
     pdf_missing_markdowns: int
+
+
+@dataclasses.dataclass(frozen=True)
+class VectorDbRecall:
+    """Represents the recall of the search of a vector db.
+
+    str quantization: The quantization of the stored embeddings.
+    int bytes_per_vector: The memory taken by each embedding.
+    int records: The number of records in the vector db.
+    int k: The number of matches compared.
+    float recall: The recall@k against the exact search.
+    """
+
+    quantization: str
+    bytes_per_vector: int
+    records: int
+    k: int
+    recall: float
@@ -0,0 +1,285 @@
+"""Serves many RAG collections from one process.
+
+The RagManager of a collection is opened by its first query and kept open
+while it is used; the open collections are kept in least recently used
+order and the idle ones are closed (releasing their vector db, lexical index
+and caches) when the open collections exceed the memory budget, so an idle
+collection costs nothing but its name. The collections share a single async
+OpenAI client (and so its kept alive connections).
+
+The memory of an open collection is approximated by the size of the files
+of its vector db and lexical index (which the queries load or memory map).
+The budget is set by the RAG_MEMORY_BUDGET_MB environment variable and the
+maximum number of open collections by the MAX_OPEN_COLLECTIONS environment
+variable.
+"""
+
+import collections
+import contextlib
+import dataclasses
+import logging
+import time
+
+import ragit.libs.common as common
+import ragit.libs.executor_pools as executor_pools
+import ragit.libs.impl.query_executor as query_executor
+import ragit.libs.impl.single_flight as single_flight
+import ragit.libs.rag_mgr as rag_mgr
+
+# Aliases.
+logger = logging.getLogger(__name__)
+PoolType = executor_pools.PoolType
+
+
+@dataclasses.dataclass(frozen=True)
+class CollectionMetrics:
+    """Represents an open collection.
+
+    str name: The name of the collection.
+    int memory_size: The approximate bytes used by the collection.
+    int users: The number of the requests using the collection.
+    float idle_seconds: The seconds since the collection was last used.
+    """
+
+    name: str
+    memory_size: int
+    users: int
+    idle_seconds: float
+
+
+def get_memory_budget():
+    """Returns the bytes the open collections can use.
+
+    :return: The RAG_MEMORY_BUDGET_MB environment variable (in megabytes)
+    or the default, in bytes.
+    :rtype: int
+
+    :raises: ValueError
+    """
+    megabytes = common.get_positive_number(
+        "RAG_MEMORY_BUDGET_MB", _DEFAULT_MEMORY_BUDGET_MB
+    )
+    return megabytes * 1024 * 1024
+
+
+def get_max_open_collections():
+    """Returns the maximum number of open collections.
+
+    :return: The MAX_OPEN_COLLECTIONS environment variable or the default.
+    :rtype: int
+
+    :raises: ValueError
+    """
+    return common.get_positive_number(
+        "MAX_OPEN_COLLECTIONS", _DEFAULT_MAX_OPEN_COLLECTIONS
+    )
+
+
+class RagRegistry:
+    """Holds the open collections.
+
+    Must be used from a single event loop.
+
+    :ivar callable _factory: Opens the RagManager of a collection.
+    :ivar callable _get_names: Returns the names of the collections.
+    :ivar int _memory_budget: The bytes the open collections can use.
+    :ivar int _max_open: The maximum number of open collections.
+    :ivar collections.OrderedDict _entries: The open collections by name,
+    the least recently used first.
+    :ivar SingleFlight _opening: Coalesces the concurrent openings of a
+    collection.
+    :ivar openai.AsyncOpenAI _client: The client shared by the collections.
+    """
+
+    def __init__(self, factory=None, get_names=None, memory_budget=None,
+                 max_open=None):
+        """Initializer.
+
+        :param callable factory: Opens the RagManager of a collection by
+        its name and the shared client; if None an async only RagManager.
+        :param callable get_names: Returns the names of the collections; if
+        None the collections of the shared directory.
+        :param int memory_budget: The bytes the open collections can use;
+        if None it is read from the environment.
+        :param int max_open: The maximum number of open collections; if None
+        it is read from the environment.
+        """
+        self._factory = factory or _open_rag_manager
+        self._get_names = get_names or _get_collection_names
+        self._memory_budget = memory_budget or get_memory_budget()
+        self._max_open = max_open or get_max_open_collections()
+        self._entries = collections.OrderedDict()
+        self._opening = single_flight.SingleFlight()
+        self._client = None
+
+    def get_async_client(self):
+        """Returns the async OpenAI client shared by the collections.
+
+        :rtype: openai.AsyncOpenAI
+        """
+        if self._client is None:
+            self._client = query_executor.make_async_client()
+        return self._client
+
+    async def get_names(self):
+        """Returns the names of the available collections.
+
+        :rtype: list[str]
+        """
+        return await executor_pools.run(PoolType.DATABASE, self._get_names)
+
+    @contextlib.asynccontextmanager
+    async def use(self, name):
+        """Opens (if needed) the collection for the duration of a request.
+
+        A collection in use is never closed.
+
+        :param str name: The name of the collection.
+
+        :yield: The RagManager of the collection.
+
+        :raises: KeyError
+        """
+        while True:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = await self._opening.run(name, self._open, name)
+            # Retried if closed by another request while opening.
+            if self._entries.get(name) is entry:
+                break
+        self._entries.move_to_end(name)
+        entry.users += 1
+        try:
+            yield entry.rag_manager
+        finally:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+            await self._evict()
+
+    def get_metrics(self):
+        """Returns the open collections.
+
+        :return: The metrics of the open collections, the least recently
+        used first.
+        :rtype: list[CollectionMetrics]
+        """
+        now = time.monotonic()
+        return [
+            CollectionMetrics(
+                name=name,
+                memory_size=entry.memory_size,
+                users=entry.users,
+                idle_seconds=round(now - entry.last_used, 3)
+            )
+            for name, entry in self._entries.items()
+        ]
+
+    async def close(self):
+        """Closes all the open collections and the shared client."""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for entry in entries:
+            await entry.rag_manager.close_async()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _open(self, name):
+        """Opens a collection.
+
+        :param str name: The name of the collection.
+
+        :return: The entry of the open collection.
+        :rtype: _Entry
+
+        :raises: KeyError
+        """
+        if name not in await self.get_names():
+            raise KeyError(f"There is no RAG collection {name}.")
+        rag_manager = await executor_pools.run(
+            PoolType.DATABASE, self._factory, name, self.get_async_client()
+        )
+        try:
+            await rag_manager.warm_up_async()
+            memory_size = await executor_pools.run(
+                PoolType.DATABASE, rag_manager.get_memory_size
+            )
+        except BaseException:
+            await rag_manager.close_async()
+            raise
+        entry = _Entry(rag_manager, memory_size)
+        self._entries[name] = entry
+        logger.info("Opened the collection %s (%d bytes).", name, memory_size)
+        await self._evict()
+        return entry
+
+    async def _evict(self):
+        """Closes the least recently used idle collections over the budget.
+
+        The most recently used collection is kept even if it exceeds the
+        budget by itself.
+        """
+        while len(self._entries) > 1:
+            total = sum(entry.memory_size for entry in self._entries.values())
+            if total <= self._memory_budget and \
+                    len(self._entries) <= self._max_open:
+                return
+            names = list(self._entries)[:-1]
+            name = next(
+                (n for n in names if self._entries[n].users == 0), None
+            )
+            if name is None:
+                return
+            entry = self._entries.pop(name)
+            logger.info("Closing the idle collection %s.", name)
+            await entry.rag_manager.close_async()
+
+
+# Whatever follows this line is private to the module and should not be
+# used from the outside.
+
+# The default megabytes the open collections can use.
+_DEFAULT_MEMORY_BUDGET_MB = 2048
+
+# The default maximum number of open collections.
+_DEFAULT_MAX_OPEN_COLLECTIONS = 8
+
+
+class _Entry:
+    """An open collection.
+
+    :ivar RagManager rag_manager: The manager of the collection.
+    :ivar int memory_size: The approximate bytes used by the collection.
+    :ivar int users: The number of the requests using the collection.
+    :ivar float last_used: The monotonic time the collection was last used.
+    """
+
+    def __init__(self, rag_manager, memory_size):
+        """Initializer.
+
+        :param RagManager rag_manager: The manager of the collection.
+        :param int memory_size: The approximate bytes used by the collection.
+        """
+        self.rag_manager = rag_manager
+        self.memory_size = memory_size
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+def _open_rag_manager(name, async_client):
+    """Opens the async only RagManager of a collection.
+
+    :param str name: The name of the collection.
+    :param openai.AsyncOpenAI async_client: The shared client.
+
+    :rtype: RagManager
+    """
+    return rag_mgr.RagManager(name, async_only=True, async_client=async_client)
+
+
+def _get_collection_names():
+    """Returns the names of the collections of the shared directory.
+
+    :rtype: list[str]
+    """
+    return rag_mgr.RagManager.get_all_rag_collections()
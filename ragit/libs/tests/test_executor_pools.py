@@ -0,0 +1,64 @@
+"""Tests the executor_pools module."""
+
+import asyncio
+import threading
+
+import pytest
+
+import ragit.libs.executor_pools as executor_pools
+
+PoolType = executor_pools.PoolType
+
+
+@pytest.fixture(autouse=True)
+def _shutdown_pools():
+    """Releases the pools created by each test."""
+    yield
+    executor_pools.shutdown()
+
+
+def test_get_pool_size(monkeypatch):
+    monkeypatch.delenv("CPU_POOL_SIZE", raising=False)
+    assert executor_pools.get_pool_size(PoolType.CPU) >= 1
+    monkeypatch.setenv("CPU_POOL_SIZE", "3")
+    assert executor_pools.get_pool_size(PoolType.CPU) == 3
+    for invalid in ("0", "many"):
+        monkeypatch.setenv("CPU_POOL_SIZE", invalid)
+        with pytest.raises(ValueError, match=f"not valid: {invalid}\\."):
+            executor_pools.get_pool_size(PoolType.CPU)
+
+
+def test_run_does_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "1")
+    release = threading.Event()
+
+    async def run():
+        blocked = asyncio.ensure_future(
+            executor_pools.run(PoolType.DATABASE, release.wait, 5)
+        )
+        queued = asyncio.ensure_future(
+            executor_pools.run(PoolType.DATABASE, sum, [1, 2], start=3)
+        )
+        await asyncio.sleep(0.05)
+        # The other pools and the event loop are still available.
+        assert await executor_pools.run(PoolType.CPU, len, "abc") == 3
+        metrics = {m.name: m for m in executor_pools.get_metrics()}
+        database = metrics["DATABASE"]
+        assert (database.size, database.active, database.queued) == (1, 1, 1)
+        release.set()
+        return await blocked, await queued
+
+    assert asyncio.run(run()) == (True, 6)
+    metrics = {m.name: m for m in executor_pools.get_metrics()}
+    assert metrics["DATABASE"].completed == 2
+    assert metrics["DATABASE"].queued == 0
+    assert metrics["CPU"].completed == 1
+
+
+def test_run_raises_the_exception_of_the_function():
+    async def run():
+        await executor_pools.run(PoolType.QUERY, int, "not a number")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert executor_pools.get_metrics()[0].active == 0
@@ -4,9 +4,16 @@ import os
 import shutil
 import unittest
 
+import numpy as np
+import pytest
+
 import ragit.libs.common as common
 import ragit.libs.dbutil as dbutil
+import ragit.libs.impl.chunks_mgr as chunks_mgr
+import ragit.libs.impl.embeddings_info as embeddings_info
+import ragit.libs.impl.lexical_index as lexical_index
 import ragit.libs.impl.metrics as metrics
+import ragit.libs.impl.vdb_numpy as vdb_numpy
 import ragit.libs.rag_mgr as rag_mgr
 import ragit.libs.impl.query_executor as query_executor
 
@@ -123,3 +130,63 @@ class TestRagManager(unittest.TestCase):
                 coll_metrics.total_chunks, coll_metrics.inserted_to_vectordb
             )
         ragger.close()
+
+
+def test_interrupted_update_is_not_duplicated(tmp_path, monkeypatch):
+    """Tests resuming an update interrupted after some inserted batches.
+
+    The numpy vector db persists each insert, so the chunks of the inserted
+    batches must not be inserted again.
+    """
+    monkeypatch.setattr(common, "get_home_dir", lambda: tmp_path)
+    monkeypatch.delenv("SEMANTIC_CACHE_THRESHOLD", raising=False)
+    monkeypatch.setenv("VECTOR_DB_PROVIDER", "NUMPY")
+    os.makedirs(tmp_path / "ragit-data" / "dummy")
+    ragger = rag_mgr.RagManager("dummy", async_only=True)
+
+    rng = np.random.default_rng(3)
+    stored = {i: rng.normal(size=8).tolist() for i in range(10)}
+    vectorized = set()
+    monkeypatch.setattr(
+        chunks_mgr, "get_chunk_ids_to_insert_to_vector_db",
+        lambda db: [i for i in stored if i not in vectorized]
+    )
+    monkeypatch.setattr(
+        chunks_mgr, "load_embeddings",
+        lambda db, i: embeddings_info.EmbeddingsInfo(
+            f"c{i}", stored[i], f"doc{i}.md", i
+        )
+    )
+    monkeypatch.setattr(
+        chunks_mgr, "set_vectorized", lambda db, ids: vectorized.update(ids)
+    )
+    vdb_path = str(tmp_path / "vector.db")
+    lexical = lexical_index.LexicalIndex(str(tmp_path / "lexical.sqlite"))
+
+    vdb = vdb_numpy.NumpyVectorDb(vdb_path, "dummy", 8)
+    insert = vdb.insert
+    calls = []
+
+    def interrupted_insert(*args, **kwargs):
+        """Fails the third batch."""
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("Interrupted.")
+        insert(*args, **kwargs)
+
+    vdb.insert = interrupted_insert
+    with pytest.raises(RuntimeError):
+        ragger._update_vector_db(None, vdb, lexical, None, 2, False)
+    # Each batch holds batch_size + 1 chunks.
+    assert vectorized == set(range(6))
+    vdb.close()
+
+    vdb = vdb_numpy.NumpyVectorDb(vdb_path, "dummy", 8)
+    assert ragger._update_vector_db(None, vdb, lexical, None, 2, False) == 4
+    assert vectorized == set(stored)
+    assert vdb.get_number_of_records() == len(stored)
+    matches = vdb.search_by_vector(stored[0], 4)
+    assert len({m[0] for m in matches}) == 4
+    vdb.close()
+    lexical.close()
+    ragger.close()
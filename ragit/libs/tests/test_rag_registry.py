@@ -0,0 +1,128 @@
+"""Tests the rag_registry module."""
+
+import asyncio
+
+import pytest
+
+import ragit.libs.executor_pools as executor_pools
+import ragit.libs.rag_registry as rag_registry
+
+
+@pytest.fixture(autouse=True)
+def _shutdown_pools(monkeypatch):
+    """Releases the pools created by each test."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    yield
+    executor_pools.shutdown()
+
+
+class _FakeRagManager:
+    """Stands for the RagManager of a collection."""
+
+    opened = []
+    closed = []
+
+    def __init__(self, name, async_client):
+        self.name = name
+        self.opened.append(name)
+
+    async def warm_up_async(self):
+        await asyncio.sleep(0.01)
+
+    def get_memory_size(self):
+        return 100
+
+    async def close_async(self):
+        self.closed.append(self.name)
+
+
+def _make_registry(memory_budget=250, max_open=8):
+    """Returns a registry of fake collections."""
+    _FakeRagManager.opened = []
+    _FakeRagManager.closed = []
+    return rag_registry.RagRegistry(
+        factory=_FakeRagManager,
+        get_names=lambda: ["a", "b", "c"],
+        memory_budget=memory_budget,
+        max_open=max_open
+    )
+
+
+def test_least_recently_used_are_closed():
+    registry = _make_registry()
+
+    async def run():
+        for name in ("a", "b", "a", "c"):
+            async with registry.use(name) as manager:
+                assert manager.name == name
+        return [m.name for m in registry.get_metrics()]
+
+    assert asyncio.run(run()) == ["a", "c"]
+    assert _FakeRagManager.opened == ["a", "b", "c"]
+    assert _FakeRagManager.closed == ["b"]
+
+
+def test_collections_in_use_are_not_closed():
+    registry = _make_registry(memory_budget=100)
+
+    async def run():
+        async with registry.use("a"):
+            async with registry.use("b"):
+                assert len(registry.get_metrics()) == 2
+            assert _FakeRagManager.closed == []
+        assert [m.name for m in registry.get_metrics()] == ["b"]
+        await registry.close()
+        assert registry.get_metrics() == []
+
+    asyncio.run(run())
+    assert _FakeRagManager.closed == ["a", "b"]
+
+
+def test_max_open_collections():
+    registry = _make_registry(memory_budget=1000, max_open=1)
+
+    async def run():
+        for name in ("a", "b", "c"):
+            async with registry.use(name):
+                pass
+
+    asyncio.run(run())
+    assert _FakeRagManager.closed == ["a", "b"]
+
+
+def test_concurrent_openings_are_coalesced():
+    registry = _make_registry()
+
+    async def use(name):
+        async with registry.use(name) as manager:
+            return manager
+
+    async def run():
+        return await asyncio.gather(*(use("a") for _ in range(4)))
+
+    managers = asyncio.run(run())
+    assert all(manager is managers[0] for manager in managers)
+    assert _FakeRagManager.opened == ["a"]
+
+
+def test_unknown_collection():
+    registry = _make_registry()
+
+    async def run():
+        with pytest.raises(KeyError):
+            async with registry.use("unknown"):
+                pass
+
+    asyncio.run(run())
+    assert _FakeRagManager.opened == []
+
+
+def test_settings(monkeypatch):
+    monkeypatch.delenv("RAG_MEMORY_BUDGET_MB", raising=False)
+    monkeypatch.setenv("MAX_OPEN_COLLECTIONS", "3")
+    assert rag_registry.get_memory_budget() == 2048 * 1024 * 1024
+    assert rag_registry.get_max_open_collections() == 3
+    for value in ("0", "many"):
+        monkeypatch.setenv("RAG_MEMORY_BUDGET_MB", value)
+        with pytest.raises(ValueError):
+            rag_registry.get_memory_budget()
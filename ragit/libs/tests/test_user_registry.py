@@ -2,6 +2,7 @@
 
 import datetime
 import os.path
+import sqlite3
 import unittest
 import unittest.mock as mock
 
@@ -140,6 +141,64 @@ class TestUserRegistry(unittest.TestCase):
         for query_info in queries:
             self.assertIsInstance(query_info, dict)
 
+    def test_messages_of_other_collections(self):
+        """Tests scoping the messages by the collection answering them."""
+        UserRegistry.create_db_if_needed()
+        UserRegistry.add_new_user("user", "someone@someserver.com", "pass")
+        shared_dir = common.get_shared_directory()
+        now = datetime.datetime.now()
+        for collection in (None, "other-collection"):
+            source = os.path.join(
+                shared_dir, collection or "some-rag-collection",
+                "documents", "a.pdf"
+            )
+            response = QueryResponse(
+                response=f"answered by {collection}",
+                temperature=0.6,
+                max_tokens=1000,
+                matches_count=1,
+                prompt="question",
+                matches=[("text", 0.9, source, 2)],
+                model_name="some_model"
+            )
+            UserRegistry.insert_message(
+                "user", now, "question", response, now, collection
+            )
+
+        for collection in (None, "other-collection"):
+            queries = UserRegistry.get_all_queries(collection)
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(
+                queries[0]["response"], f"answered by {collection}"
+            )
+            self.assertEqual(queries[0]["matches"][0]["source"], "a.pdf")
+            chats = UserRegistry.get_recent_chats("user", 10, collection)
+            self.assertEqual(
+                [chat["response"] for chat in chats],
+                [f"answered by {collection}"]
+            )
+
+    def test_collection_is_added_to_older_registry(self):
+        """Tests opening a registry created without the collections."""
+        fullpath = UserRegistry._get_full_path_to_db()
+        with sqlite3.connect(fullpath) as conn:
+            conn.execute(UserRegistry._SQL_CREATE_USER_TABLE)
+            conn.execute(
+                UserRegistry._SQL_CREATE_MSG_TABLE.replace(
+                    ",\n                    collection    TEXT    "
+                    "DEFAULT NULL", ""
+                )
+            )
+            conn.execute(UserRegistry._SQL_CREATE_MATCHES_TABLE)
+            conn.execute(
+                "INSERT INTO messages (question, received_at) "
+                "VALUES ('old', '2024-01-01')"
+            )
+        UserRegistry.create_db_if_needed()
+        queries = UserRegistry.get_all_queries()
+        self.assertEqual([q["question"] for q in queries], ["old"])
+        self.assertEqual(UserRegistry.get_all_queries("other-collection"), [])
+
     @mock.patch.object(user_registry, "common")
     def test_shorten_file_path_running_on_vagrant(self, mocked_common):
         """Tests _shorten_file_path on vagrant.
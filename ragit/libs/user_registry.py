@@ -30,6 +30,11 @@ class UserRegistry:
     default the shared directory will be used.
 
     :cvar str _rag_collection_name: The name of the RAG Collection.
+
+    The messages answered by the other collections of the front end (see
+    RagRegistry) are stored in the same registry along with the name of
+    their collection; the messages without a collection were answered by
+    the RAG Collection of the registry.
     """
     _DB_FILENAME = "{rag_collection}.user_registry.sqlite.db"
     _MAX_USER_NAME_LENGTH = 32
@@ -63,10 +68,19 @@ class UserRegistry:
                     responded_at  TEXT    DEFAULT NULL,
                     thumps_up     INTEGER DEFAULT NULL,
                     thumped_up_at TEXT    DEFAULT NULL,
-                    desired_response TEXT DEFAULT NULL
+                    desired_response TEXT DEFAULT NULL,
+                    collection    TEXT    DEFAULT NULL
         )
     """
 
+    _SQL_ADD_COLLECTION_COLUMN = """
+        ALTER TABLE messages ADD COLUMN collection TEXT DEFAULT NULL
+    """
+
+    _SQL_SELECT_MESSAGE_COLUMNS = """
+        SELECT name FROM pragma_table_info('messages')
+    """
+
     _SQL_CREATE_MATCHES_TABLE = """
         CREATE TABLE matches (
             match_id        INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -87,10 +101,10 @@ class UserRegistry:
     INSERT INTO messages
         (
             user_id, received_at, question, temperature, count_matches,
-            max_tokens, prompt, response, responded_at
+            max_tokens, prompt, response, responded_at, collection
             )
     values
-        (?, ?, ?, ?, ?, ?, ?, ?, ? )
+        (?, ?, ?, ?, ?, ?, ?, ?, ?, ? )
     """
 
     _SQL_INSERT_MATCH = """
@@ -131,6 +145,7 @@ class UserRegistry:
             received_at, desired_response
         FROM
             messages
+        WHERE IFNULL(collection, ?) = ?
         ORDER BY received_at DESC
     """
     _SQL_SELECT_MATCHES = """
@@ -150,7 +165,7 @@ class UserRegistry:
     _SQL_SELECT_RECENT_QUERIES_BY_USER = """
         SELECT msg_id, question, response, thumps_up
         FROM messages
-        WHERE user_id = ?
+        WHERE user_id = ? AND IFNULL(collection, ?) = ?
         ORDER BY received_at
         DESC LIMIT ?
     """
@@ -262,7 +277,7 @@ class UserRegistry:
     @classmethod
     @common.handle_exceptions
     def insert_message(cls, user_name, received_at,
-                       question, response, responded_at):
+                       question, response, responded_at, collection=None):
         """Inserts a new message in the message table.
 
         :param str user_name: The user name to insert the message for.
@@ -270,6 +285,8 @@ class UserRegistry:
         :param str question: The message to process.
         :param QueryResponse response: The response we got back from the LLM.
         :param datetime.datetime responded_at: When LLM responded.
+        :param str collection: The collection that answered the message; if
+        None the RAG Collection of the registry.
 
         :returns: The newly created message id.
         :rtype: int
@@ -294,7 +311,8 @@ class UserRegistry:
                     response.max_tokens,
                     response.prompt,
                     response.response,
-                    responded_at.isoformat()
+                    responded_at.isoformat(),
+                    collection or cls._rag_collection_name
                 )
                 cursor.execute(cls._SQL_INSERT_MSG, data)
 
@@ -372,21 +390,26 @@ class UserRegistry:
 
     @classmethod
     @common.handle_exceptions
-    def get_all_queries(cls):
+    def get_all_queries(cls, collection=None):
         """Returns all the available queries.
 
         Meant to be used from the UI to populate a list with the available
         queries that will allow the user to view the details of them.
 
+        :param str collection: The collection that answered the queries; if
+        None the RAG Collection of the registry.
+
         :returns: A list containing the queries using dicts.
         :rtype: [dict]
         """
+        collection = collection or cls._rag_collection_name
         queries = []
         with sqlite3.connect(cls._get_full_path_to_db()) as conn:
             cursor = None
             try:
                 cursor = conn.cursor()
-                for row in cursor.execute(cls._SQL_SELECT_QUERIES):
+                values = (cls._rag_collection_name, collection)
+                for row in cursor.execute(cls._SQL_SELECT_QUERIES, values):
                     query_info = {
                         "msg_id": row[0],
                         "question": row[1],
@@ -407,7 +430,9 @@ class UserRegistry:
                     matches = []
                     for row in cursor.execute(cls._SQL_SELECT_MATCHES, msg_id):
                         try:
-                            sorten_path = cls._shorten_file_path(row[2])
+                            sorten_path = cls._shorten_file_path(
+                                row[2], collection
+                            )
                         except common.MyGenAIException:
                             sorten_path = 'n/a'
 
@@ -474,7 +499,7 @@ class UserRegistry:
 
     @classmethod
     @common.handle_exceptions
-    def get_recent_chats(cls, user_name, count=None):
+    def get_recent_chats(cls, user_name, count=None, collection=None):
         """Returns the most recent chats for the user.
 
         :param str user_name: The user to return the email for.
@@ -482,6 +507,9 @@ class UserRegistry:
         :param int count: The number of chats to return; if None then
         the default value will be used.
 
+        :param str collection: The collection that answered the chats; if
+        None the RAG Collection of the registry.
+
         :returns: A json like dict containing the most recent questions asked
         for the passed in user.
 
@@ -502,9 +530,14 @@ class UserRegistry:
 
                 matching_queries = []
 
+                values = (
+                    user_id,
+                    cls._rag_collection_name,
+                    collection or cls._rag_collection_name,
+                    count
+                )
                 for row in cursor.execute(
-                        cls._SQL_SELECT_RECENT_QUERIES_BY_USER,
-                        (user_id, count)):
+                        cls._SQL_SELECT_RECENT_QUERIES_BY_USER, values):
                     matching_queries.append(
                         {
                             "msg_id": row[0],
@@ -527,6 +560,7 @@ class UserRegistry:
         """
         fullpath = cls._get_full_path_to_db()
         if os.path.exists(fullpath):
+            cls._add_collection_column_if_needed(fullpath)
             return
         with sqlite3.connect(fullpath) as conn:
             cursor = None
@@ -611,6 +645,20 @@ class UserRegistry:
         fullpath = os.path.join(root, filename)
         return fullpath
 
+    @classmethod
+    def _add_collection_column_if_needed(cls, fullpath):
+        """Adds the collection of the messages to an older registry.
+
+        :param str fullpath: The full path to the sqlite db file.
+        """
+        with sqlite3.connect(fullpath) as conn:
+            columns = {
+                row[0]
+                for row in conn.execute(cls._SQL_SELECT_MESSAGE_COLUMNS)
+            }
+            if "collection" not in columns:
+                conn.execute(cls._SQL_ADD_COLLECTION_COLUMN)
+
     @classmethod
     def _validate_email(cls, email_address):
         """Validates the passed in email address.
@@ -659,7 +707,7 @@ class UserRegistry:
 
     @classmethod
     @common.handle_exceptions
-    def _shorten_file_path(cls, file_path):
+    def _shorten_file_path(cls, file_path, collection=None):
         """Shortens the file path.
 
         Since all the documents will live under the <collection-name>/documents
@@ -669,6 +717,8 @@ class UserRegistry:
         See the tests for a better understanding.
 
         :param file_path: The original file path to be shortened.
+        :param str collection: The collection holding the document; if None
+        the RAG Collection of the registry.
 
         :return: A shortened path to the file path.
         :rtype: str
@@ -678,7 +728,7 @@ class UserRegistry:
         if not isinstance(file_path, str):
             raise ValueError(f"Invalid file path: {file_path}.")
         shared_dir = common.get_shared_directory()
-        collection = cls.get_rag_collection_name()
+        collection = collection or cls.get_rag_collection_name()
         documents_dir = os.path.join(shared_dir, collection, "documents")
         if file_path.startswith(documents_dir):
             shortened_path = file_path.replace(documents_dir, "")